@@ -25,6 +25,10 @@ docker build -t vision-flow-processor:latest -f Dockerfile.processor .
 
 docker buildx build --platform linux/amd64 -t madhavpandey33/vision-flow-processor:07-04-25_amd -f Dockerfile.processor .
 
+# Build combined worker image (alternative to running validator and processor separately)
+echo "Building worker image..."
+docker build -t vision-flow-worker:latest -f Dockerfile.worker .
+
 # Create Docker network if it doesn't exist
 docker network inspect document-net >/dev/null 2>&1 || \
     docker network create document-net
@@ -0,0 +1,279 @@
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from utils.mongo_utils import get_mongo_connection_settings
+from utils.profiling import profiling_configured
+from utils.report_tasks import subtask_result_update, parent_completion
+from utils.task_documents import (
+    service_result_field, pending_tasks_query, claim_task_update, task_document, task_status_fields,
+    task_started_update, document_hash_update, document_usage_update, number_of_checks_update
+)
+
+class AsyncBaseMongoService:
+    """Asyncio variant of BaseMongoService built on the motor driver"""
+
+    def __init__(self, mongo_uri=None, db_name=None, service_name="BaseService"):
+        """Create the MongoDB client; call connect() from the event loop before use"""
+        self.service_name = service_name
+        self.logger = logging.getLogger(f"{service_name}")
+        # Tasks share the event loop thread, so a CPU profile could not be attributed to one task
+        if profiling_configured():
+            raise ValueError("Per-task profiling (PROFILE_TASKS, PROFILE_SAMPLE_RATE) is not supported by the "
+                             "asyncio runtime; use the threaded service to profile tasks")
+
+        connection_uri, self.mongo_uri, self.db_name = get_mongo_connection_settings(mongo_uri, db_name)
+        self.client = AsyncIOMotorClient(connection_uri)
+        self.db = self.client[self.db_name]
+        self.task_collection = self.db['task']
+        self.file_document_collection = self.db['file_document']
+
+    async def connect(self):
+        """Verify the MongoDB connection"""
+        try:
+            await self.client.admin.command('ping')
+            self.logger.info(f"Successfully connected to MongoDB at {self.mongo_uri}")
+        except Exception as e:
+            self.logger.error(f"Failed to connect to MongoDB: {str(e)}")
+            raise
+
+    async def find_pending_tasks(self, task_type, document_category="bank_checks"):
+        """Find pending tasks with specified criteria"""
+        try:
+            tasks = await self.task_collection.find(pending_tasks_query(task_type, document_category)).to_list(length=None)
+            self.logger.info(f"Found {len(tasks)} pending {task_type} tasks")
+            return tasks
+
+        except Exception as e:
+            self.logger.error(f"Error finding pending tasks: {str(e)}")
+            return []
+
+    async def claim_next_task(self, task_type, document_category="bank_checks", worker_id=None):
+        """
+        Atomically move the oldest NOT_STARTED task of a queue to IN_PROGRESS.
+
+        Returns:
+            dict: The claimed task, or None when the queue is empty
+        """
+        try:
+            return await self.task_collection.find_one_and_update(
+                pending_tasks_query(task_type, document_category),
+                claim_task_update(worker_id, datetime.now(timezone.utc)),
+                sort=[("createdAt", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+
+        except Exception as e:
+            self.logger.error(f"Error claiming {task_type} task: {str(e)}")
+            return None
+
+    async def claim_pending_task(self):
+        """Claim the next task this service handles - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement claim_pending_task method")
+
+    async def get_file_document(self, document_id):
+        """Get file document by document ID"""
+        try:
+            file_doc = await self.file_document_collection.find_one({"_id": document_id})
+            if not file_doc:
+                self.logger.error(f"File document not found for documentId: {document_id}")
+                return None
+            return file_doc
+
+        except Exception as e:
+            self.logger.error(f"Error getting file document: {str(e)}")
+            return None
+
+    def new_task(self, document_id, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED",
+                 extra_fields=None, task_id=None):
+        """Build a task document without inserting it"""
+        return task_document(document_id, datetime.now(timezone.utc), document_category, task_type, status,
+                             extra_fields, task_id)
+
+    async def create_check_task(self, document_id, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED", extra_fields=None):
+        """Create a check report task"""
+        try:
+            task = self.new_task(document_id, document_category, task_type, status, extra_fields)
+
+            result = await self.task_collection.insert_one(task)
+            if result.inserted_id:
+                self.logger.info(f"Created check report task for document {document_id}")
+                return result.inserted_id
+            else:
+                self.logger.error(f"Failed to create check report task for document {document_id}")
+                return None
+
+        except Exception as e:
+            self.logger.error(f"Error creating check report task: {str(e)}")
+            return None
+
+    async def record_subtask_result(self, parent_task_id, success, number_of_checks=0):
+        """
+        Aggregate a finished subtask into its parent task (see BaseMongoService.record_subtask_result).
+
+        Returns:
+            dict: The finalized parent task if this call completed it, otherwise None
+        """
+        try:
+            parent = await self.task_collection.find_one_and_update(
+                {"_id": parent_task_id},
+                subtask_result_update(success, number_of_checks, datetime.now(timezone.utc)),
+                return_document=ReturnDocument.AFTER
+            )
+            if not parent:
+                self.logger.warning(f"Parent task {parent_task_id} not found")
+                return None
+
+            completion = parent_completion(parent, datetime.now(timezone.utc))
+            if completion is None:
+                return None
+            status, update = completion
+            finalized = await self.task_collection.update_one(
+                {"_id": parent_task_id, "status": "WAITING_FOR_SUBTASKS"}, update
+            )
+            if finalized.modified_count == 0:
+                return None
+
+            self.logger.info(f"Parent task {parent_task_id} {status}: {parent['numberOfChecks']} checks "
+                             f"from {parent['subtaskCount']} subtasks")
+            parent["status"] = status
+            return parent
+
+        except Exception as e:
+            self.logger.error(f"Error recording subtask result: {str(e)}")
+            return None
+
+    async def register_document_hash(self, document_id, number_of_checks):
+        """Record a fully processed document under its PDF content hash (see BaseMongoService.register_document_hash)"""
+        try:
+            file_doc = await self.file_document_collection.find_one({"_id": document_id}, {"contentHash": 1})
+            content_hash = (file_doc or {}).get("contentHash")
+            if not content_hash:
+                return
+
+            await self.db['document_hash'].update_one(
+                {"_id": content_hash},
+                document_hash_update(document_id, number_of_checks, datetime.now(timezone.utc)),
+                upsert=True
+            )
+
+        except Exception as e:
+            self.logger.error(f"Error registering document hash: {str(e)}")
+
+    def result_field(self):
+        """Task field holding this service's result"""
+        return service_result_field(self.service_name)
+
+    async def update_task_status(self, task_id, status, result=None):
+        """Update task status and add results"""
+        try:
+            result_update = await self.task_collection.update_one(
+                {"_id": task_id},
+                {"$set": task_status_fields(status, datetime.now(timezone.utc), self.result_field(), result)}
+            )
+
+            if result_update.modified_count > 0:
+                self.logger.info(f"Updated task {task_id} status to {status}")
+            else:
+                self.logger.warning(f"No task updated for ID: {task_id}")
+
+        except Exception as e:
+            self.logger.error(f"Error updating task status: {str(e)}")
+
+    async def record_document_usage(self, document_id, usage):
+        """Add a task's API usage counters to the running totals of its file document"""
+        try:
+            await self.file_document_collection.update_one(
+                {"_id": document_id}, document_usage_update(usage, datetime.now(timezone.utc))
+            )
+        except Exception as e:
+            self.logger.error(f"Error recording document usage: {str(e)}")
+
+    async def update_file_document(self, document_id, numberOfChecks):
+        """Update the file document collection with number of checks"""
+        try:
+            result = await self.file_document_collection.update_one(
+                {"_id": document_id}, number_of_checks_update(numberOfChecks, datetime.now(timezone.utc))
+            )
+
+            if result.modified_count > 0:
+                self.logger.info(f"Updated file document {document_id} with number of checks: {numberOfChecks}")
+            else:
+                self.logger.warning(f"No file document updated for ID: {document_id}")
+
+        except Exception as e:
+            self.logger.error(f"Error updating file document: {str(e)}")
+
+    async def mark_started(self, task):
+        """Record startedAt on a task about to be processed; a failed write only loses the timestamp"""
+        try:
+            await self.task_collection.update_one({"_id": task["_id"]}, task_started_update(datetime.now(timezone.utc)))
+        except Exception as e:
+            self.logger.warning(f"Could not record start of task {task['_id']}: {str(e)}")
+
+    async def _run_task(self, task, slots):
+        """Process one task and release its concurrency slot"""
+        try:
+            if task.get("profile"):
+                self.logger.warning(f"Task {task['_id']} asks to be profiled, which the asyncio runtime does not "
+                                    f"support; processing it without the profiler")
+            await self.mark_started(task)
+            await self.process_task(task)
+        except Exception as e:
+            self.logger.error(f"Error processing individual task: {str(e)}")
+        finally:
+            slots.release()
+
+    async def run_continuous_process(self, poll_interval=None, max_concurrent_tasks=None):
+        """Run continuous processing service with many tasks in flight on one event loop"""
+        # Use environment variables if not provided
+        poll_interval = poll_interval or int(os.getenv('POLL_INTERVAL', '30'))
+        max_concurrent_tasks = max_concurrent_tasks or int(os.getenv('MAX_CONCURRENT_TASKS', '16'))
+        self.logger.info(f"Starting continuous async {self.service_name} (polling every {poll_interval} seconds, "
+                         f"up to {max_concurrent_tasks} concurrent tasks)")
+
+        slots = asyncio.Semaphore(max_concurrent_tasks)
+        running = set()
+        try:
+            while True:
+                try:
+                    # Claim tasks (implemented by subclasses) while slots are free, until the queue is empty
+                    started = 0
+                    while True:
+                        # Wait for a free slot so claiming backs off when saturated
+                        await slots.acquire()
+                        task = await self.claim_pending_task()
+                        if task is None:
+                            slots.release()
+                            break
+                        running.add(asyncio.create_task(self._run_task(task, slots)))
+                        running = {t for t in running if not t.done()}
+                        started += 1
+
+                    if started:
+                        self.logger.info(f"Started {started} tasks")
+                    else:
+                        self.logger.debug("No pending tasks found")
+
+                    # Wait before next poll
+                    await asyncio.sleep(poll_interval)
+
+                except asyncio.CancelledError:
+                    self.logger.info("Received cancellation, shutting down...")
+                    break
+                except Exception as e:
+                    self.logger.error(f"Error in continuous process loop: {str(e)}")
+                    await asyncio.sleep(poll_interval)  # Continue despite errors
+
+        finally:
+            # Let in-flight tasks finish their status updates before closing
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+            self.client.close()
+            self.logger.info("MongoDB connection closed")
+
+    async def process_task(self, task):
+        """Process a single task - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement process_task method")
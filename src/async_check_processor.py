@@ -0,0 +1,192 @@
+import os
+import sys
+import asyncio
+import logging
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from utils.logger import configure_logging
+from async_process_checks import AsyncCheckProcessor
+from async_base_service import AsyncBaseMongoService
+from utils.page_cache import PageCache
+from utils.usage import UsageStats, track_usage
+from utils.progress import AsyncProgressPublisher, expected_checks
+from utils.batch_extraction import batch_writer_for
+from utils.report_tasks import finish_report_steps
+from utils.steps import run_steps_async
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+configure_logging('logs/check_processor.log')
+
+class AsyncCheckProcessorService(AsyncBaseMongoService):
+    def __init__(self, mongo_uri=None, db_name=None):
+        """Initialize MongoDB client and async check processor"""
+        super().__init__(mongo_uri, db_name, "CheckProcessor")
+        self.check_processor = AsyncCheckProcessor(page_cache=PageCache.from_env())
+
+    async def connect(self):
+        await super().connect()
+        await self.check_processor.connect()
+
+    async def find_pending_tasks(self):
+        """Find tasks with bank_checks category, NOT_STARTED status, and REPORT type"""
+        return await super().find_pending_tasks("REPORT", "bank_checks")
+
+    async def claim_pending_task(self):
+        """Claim the oldest NOT_STARTED REPORT task"""
+        return await self.claim_next_task("REPORT", "bank_checks")
+
+    async def process_pdf_file(self, pdf_path, page_range=None, stats=None, batch_writer=None, on_check=None):
+        """Process PDF file using the async CheckProcessor"""
+        try:
+            if not os.path.exists(pdf_path):
+                return False, f"PDF file not found: {pdf_path}"
+
+            success = await self.check_processor.process_pdf(pdf_path, page_range, stats, batch_writer, on_check)
+
+            if success:
+                return True, "PDF processing completed successfully"
+            else:
+                return False, "PDF processing failed"
+
+        except Exception as e:
+            self.logger.error(f"Error processing PDF: {str(e)}")
+            return False, f"Processing error: {str(e)}"
+
+    async def process_task(self, task):
+        """Process a single REPORT task"""
+        task_id = task["_id"]
+        document_id = task["documentId"]
+
+        self.logger.info(f"Processing REPORT task {task_id} for document {document_id}")
+
+        # Claimed tasks are already IN_PROGRESS
+        if task.get("status") != "IN_PROGRESS":
+            await self.update_task_status(task_id, "IN_PROGRESS", {"message": "Processing PDF"})
+        try:
+            # Get file document
+            file_doc = await self.get_file_document(document_id)
+            if not file_doc:
+                await self.update_task_status(task_id, "FAILED", {"error": "File document not found"})
+                await self.finish_report(task, False)
+                return False
+
+            # Get PDF path
+            pdf_path = file_doc.get("path")
+            if not pdf_path:
+                await self.update_task_status(task_id, "FAILED", {"error": "PDF path not found in file document"})
+                await self.finish_report(task, False)
+                return False
+
+            # Subtasks of a split document only cover a page range
+            page_range = task.get("pageRange")
+            if page_range:
+                page_range = (page_range["firstPage"], page_range["lastPage"])
+
+            # Low-priority tasks can defer LLM extraction to an offline batch
+            batch_writer = batch_writer_for(task)
+
+            # Publish checks and progress on the task while the document is processing
+            progress = AsyncProgressPublisher(self.task_collection, task, expected_checks(task, file_doc))
+            await progress.start()
+
+            # Process PDF
+            stats = {}
+            usage = UsageStats()
+            # Each asyncio task has its own context, so concurrent tasks count separately
+            with track_usage(usage):
+                success, message = await self.process_pdf_file(pdf_path, page_range, stats, batch_writer,
+                                                               progress.check_done)
+            await progress.flush()
+
+            # Prepare processing result
+            processing_result = {
+                "success": success,
+                "message": message,
+                "pdfPath": pdf_path,
+                "processedAt": datetime.now(timezone.utc).isoformat(),
+                "usage": usage.as_dict(),
+                **stats
+            }
+            # API calls are paid for whether or not the task succeeded
+            await self.record_document_usage(document_id, processing_result["usage"])
+            self.logger.info(f"Task {task_id} usage: {processing_result['usage']}")
+
+            # Update task status
+            if success and batch_writer is not None:
+                processing_result["batchRequestFile"] = str(batch_writer.requests_path)
+                processing_result["pendingFile"] = str(batch_writer.pending_path)
+                await self.update_task_status(task_id, "WAITING_FOR_BATCH", processing_result)
+                self.logger.info(f"Task {task_id} deferred {batch_writer.count} checks to batch file {batch_writer.requests_path}")
+                return True
+            elif success:
+                await self.update_task_status(task_id, "COMPLETED", processing_result)
+                await self.finish_report(task, True, stats.get("numberOfChecks", 0))
+                self.logger.info(f"Task {task_id} processed successfully")
+                return True
+            else:
+                await self.update_task_status(task_id, "FAILED", processing_result)
+                await self.finish_report(task, False)
+                self.logger.error(f"Task {task_id} processing failed: {message}")
+                return False
+
+        except Exception as e:
+            error_msg = f"Error processing task {task_id}: {str(e)}"
+            self.logger.error(error_msg)
+            await self.update_task_status(task_id, "FAILED", {"error": error_msg})
+            await self.finish_report(task, False)
+            return False
+
+    async def finish_report(self, task, success, number_of_checks=0):
+        """Roll a subtask up into its parent and drop cached pages once the whole document is finished"""
+        finished = await run_steps_async(self, finish_report_steps(task, success, number_of_checks))
+        # Rendered pages are no longer needed once the REPORT stage is done, successful or not
+        if finished and self.check_processor.page_cache is not None:
+            self.check_processor.page_cache.evict(task["documentId"])
+
+async def run_service(args):
+    processor = AsyncCheckProcessorService(args.mongo_uri, args.db_name)
+    try:
+        await processor.connect()
+        await processor.run_continuous_process(args.poll_interval, args.max_concurrent_tasks)
+    finally:
+        await processor.check_processor.close()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Continuous MongoDB-based check processing service (asyncio runtime)')
+    parser.add_argument('--mongo-uri',
+                       help='MongoDB connection URI (overrides MONGO_URI env var)')
+    parser.add_argument('--db-name',
+                       help='MongoDB database name (overrides MONGO_DB_NAME env var)')
+    parser.add_argument('--poll-interval', type=int,
+                       help='Polling interval in seconds (overrides POLL_INTERVAL env var)')
+    parser.add_argument('--max-concurrent-tasks', type=int,
+                       help='Maximum REPORT tasks in flight (overrides MAX_CONCURRENT_TASKS env var)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='Enable verbose logging')
+
+    args = parser.parse_args()
+
+    # Set log level
+    log_level = os.getenv('LOG_LEVEL', 'INFO')
+    if args.verbose:
+        log_level = 'DEBUG'
+    logging.getLogger().setLevel(getattr(logging, log_level.upper()))
+
+    # Create logs directory if it doesn't exist
+    os.makedirs('logs', exist_ok=True)
+
+    try:
+        asyncio.run(run_service(args))
+    except KeyboardInterrupt:
+        logging.info("Received interrupt signal, shutting down...")
+    except Exception as e:
+        logging.error(f"Failed to start processing service: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
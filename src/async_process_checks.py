@@ -0,0 +1,273 @@
+import os
+import time
+import uuid
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from openai import AsyncOpenAI
+from motor.motor_asyncio import AsyncIOMotorClient
+from process_checks import (
+    CheckProcessor, extraction_steps, estimate_request_tokens, record_completion_usage, EXTRACTION_MAX_TOKENS, logger
+)
+from utils.google_auth import setup_google_vision_async_auth
+from utils.image_analyzer import analyze_check_image_async, analyze_check_layout_async
+from utils.rate_limiter import get_rate_limiter
+from utils.path_utils import extract_document_id_from_path
+from utils.mongo_utils import get_mongo_connection_settings
+from utils.page_analysis import PageFilter, BLANK_PAGE_RESULT
+from utils.check_layout import crop_to_content, region_text
+from utils.usage import record_usage
+from utils.steps import run_steps_async
+from models.check import CheckDetails
+
+class AsyncCheckProcessor(CheckProcessor):
+    """
+    CheckProcessor driven by asyncio.
+
+    OCR, LLM and MongoDB calls are awaited on the event loop, while rendering,
+    clean_image and file writes run in a thread pool. The public processing
+    methods keep their names but are coroutines.
+    """
+
+    def __init__(self, page_cache=None, executor=None, max_checks_in_flight=None):
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=int(os.getenv('ASYNC_CPU_WORKERS', str(os.cpu_count() or 4)))
+        )
+        self.max_checks_in_flight = max_checks_in_flight or int(os.getenv('ASYNC_CHECKS_PER_DOCUMENT', '8'))
+        super().__init__(page_cache)
+
+    def _init_clients(self):
+        """Only the rate limiters; the async clients are created by connect() inside the event loop"""
+        self.vision_client = None
+        self.openai_client = None
+        self.client = None
+        # Process-local limiters; the MongoDB-backed shared budget needs a blocking client
+        self.vision_limiter = get_rate_limiter("vision")
+        self.openai_limiter = get_rate_limiter("openai")
+
+    async def connect(self):
+        """Create the async clients; must run inside the event loop"""
+        try:
+            self.vision_client = setup_google_vision_async_auth()
+            logger.info("Successfully initialized Google Vision async client")
+        except Exception as e:
+            logger.error(f"Failed to initialize Google Vision async client: {str(e)}")
+            raise
+
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable is not set")
+        self.openai_client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        logger.info("Async OpenAI client initialized successfully")
+
+        try:
+            connection_uri, mongo_uri, db_name = get_mongo_connection_settings()
+            self.client = AsyncIOMotorClient(connection_uri)
+            self.db = self.client[db_name]
+            self.check_collection = self.db['check']
+            await self.client.admin.command('ping')
+            logger.info(f"Successfully connected to MongoDB at {mongo_uri}")
+        except Exception as e:
+            logger.error(f"Failed to initialize MongoDB connection: {str(e)}")
+            raise
+
+    async def close(self):
+        """Close clients and the CPU executor"""
+        if self.client is not None:
+            self.client.close()
+        if self.openai_client is not None:
+            await self.openai_client.close()
+        self.executor.shutdown(wait=False)
+
+    async def _run_blocking(self, func, *args):
+        # Unlike asyncio tasks, executor threads do not inherit the caller's context
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+
+    async def create_check(self, check_details: CheckDetails):
+        """Create check in mongo db"""
+        try:
+            await self.check_collection.insert_one(check_details.model_dump())
+        except Exception as e:
+            logger.error(f"Error creating check in mongo db: {str(e)}")
+            raise
+
+    async def analyze_page(self, image):
+        """OCR one page with a single Vision request (see CheckProcessor.analyze_page)"""
+        if not self.roi_ocr:
+            is_front, text = await self.ocr_image(image)
+            return is_front, text, None
+        page = await self._run_blocking(crop_to_content, image)
+        is_front, text, blocks = await self.ocr_image(page, analyze_check_layout_async)
+        return is_front, text, region_text(blocks, page.width, page.height)
+
+    async def ocr_image(self, image, analyze=analyze_check_image_async):
+        """OCR one image with rate limiting, a deadline and optional hedging"""
+        start = time.monotonic()
+        try:
+            return await self.vision_limiter.call_hedged_async(
+                self.vision_hedger, analyze, image, self.vision_client, self.executor,
+                timeout=self.vision_hedger.timeout
+            )
+        finally:
+            record_usage(ocrSeconds=time.monotonic() - start)
+
+    async def create_chat_completion(self, messages, model=None, max_tokens=EXTRACTION_MAX_TOKENS, **kwargs):
+        """Send a chat completion with rate limiting, a deadline and optional hedging"""
+        model = model or self.model_router.primary_model
+        start = time.monotonic()
+        response = await self.openai_limiter.call_hedged_async(
+            self.openai_hedger,
+            self.openai_client.chat.completions.create,
+            model=model,
+            messages=messages,
+            temperature=0.0,
+            max_tokens=max_tokens,
+            timeout=self.openai_hedger.timeout,
+            token_cost=estimate_request_tokens(messages, max_tokens),
+            token_usage=lambda r: r.usage.total_tokens,
+            **kwargs
+        )
+        record_completion_usage(response, time.monotonic() - start, model == self.model_router.fast_model)
+        return response
+
+    async def ocr_page(self, image, page_filter=None):
+        """OCR one page, skipping blank pages and reusing results of duplicate pages"""
+        if page_filter is None:
+            return await self.analyze_page(image)
+        fingerprint, reused = await self._run_blocking(page_filter.inspect, image)
+        if reused is not None:
+            if reused is not BLANK_PAGE_RESULT:
+                record_usage(ocrCacheHits=1)
+            return reused
+        result = await self.analyze_page(image)
+        page_filter.remember(fingerprint, result)
+        return result
+
+    async def pair_check_images(self, first_image, second_image, check_number, page_filter=None):
+        """OCR a pair of pages concurrently and decide which one is the check front (None for a blank sheet)"""
+        if second_image is None:
+            result = await self.ocr_page(first_image, page_filter)
+            if result is BLANK_PAGE_RESULT:
+                logger.debug("Check %s: Single page is blank, skipping", check_number)
+                return None
+            is_front, text, regions = result
+            if not is_front:
+                logger.warning("Check %s: Single page appears to be a back - might miss front information", check_number)
+            return {'front': first_image, 'back': None, 'front_text': regions or text, 'front_raw_text': text,
+                    'back_text': None}
+
+        first_result, second_result = await asyncio.gather(
+            self.ocr_page(first_image, page_filter),
+            self.ocr_page(second_image, page_filter),
+        )
+        if first_result is BLANK_PAGE_RESULT and second_result is BLANK_PAGE_RESULT:
+            logger.debug("Check %s: Both pages are blank, skipping", check_number)
+            return None
+        (is_first_front, first_text, first_regions), (_, second_text, second_regions) = first_result, second_result
+        if is_first_front:
+            logger.debug("Check %s: First page is front", check_number)
+            return {'front': first_image, 'back': second_image, 'front_text': first_regions or first_text,
+                    'front_raw_text': first_text, 'back_text': second_text}
+        logger.debug("Check %s: Second page is front", check_number)
+        return {'front': second_image, 'back': first_image, 'front_text': second_regions or second_text,
+                'front_raw_text': second_text, 'back_text': first_text}
+
+    async def parse_check_details(self, front_text, back_text=None, front_raw_text=None):
+        """Parse check details using ChatGPT (see CheckProcessor.parse_check_details)"""
+        return await run_steps_async(self, extraction_steps(self.model_router, front_text, back_text, front_raw_text))
+
+    def _clean_and_save(self, check_pair, check_id, pack=None):
+        """Blocking part of a check: clean both sides and write the images"""
+        cleaned_front = self.clean_image(check_pair['front'])
+        cleaned_back = self.clean_image(check_pair['back']) if check_pair['back'] is not None else None
+        return self.save_check_image(cleaned_front, cleaned_back, check_id, pack)
+
+    async def _process_check(self, item, document_id, total_checks, page_filter=None, pack=None, on_check=None,
+                             batch_writer=None):
+        """Process one page pair; returns False when the pair was a blank sheet or its extraction was deferred"""
+        pair_index, first_image, second_image = item
+        check_pair = await self.pair_check_images(first_image, second_image, pair_index + 1, page_filter)
+        if check_pair is None:
+            if on_check is not None:
+                await on_check(None)
+            return False
+
+        check_id = str(uuid.uuid4())
+        logger.info("Processing check %s/%s (ID: %s)", pair_index + 1, total_checks, check_id,
+                    extra={"documentId": document_id, "checkId": check_id})
+        front_path, back_path = await self._run_blocking(self._clean_and_save, check_pair, check_id, pack)
+        if batch_writer is not None:
+            await self._run_blocking(self.defer_extraction, batch_writer, check_id, document_id, check_pair,
+                                     front_path, back_path)
+            return False
+
+        check_details = await self.parse_check_details(check_pair['front_text'], check_pair['back_text'],
+                                                       check_pair['front_raw_text'])
+        check_details.id = check_id
+        check_details.documentId = document_id
+        check_details.front_path = str(front_path) if front_path else None
+        check_details.back_path = str(back_path) if back_path else None
+
+        await self.create_check(check_details)
+        await self._run_blocking(self.add_to_csv, check_id, check_details)
+        logger.debug("Added check %s to CSV", check_id)
+        if on_check is not None:
+            await on_check(check_details)
+        return True
+
+    async def process_pdf(self, pdf_path, page_range=None, stats=None, batch_writer=None, on_check=None):
+        """
+        Process a PDF with up to max_checks_in_flight checks in progress at once
+        (see CheckProcessor.process_pdf for the arguments).
+
+        on_check is awaited like CheckProcessor.process_pdf calls it, so it must be a coroutine function.
+        """
+        stats = stats if stats is not None else {}
+        running = []
+        try:
+            document_id = extract_document_id_from_path(pdf_path)
+            page_count, page_pairs = await self._run_blocking(self.iter_page_pairs, pdf_path, document_id, page_range)
+            total_checks = (page_count + 1) // 2
+            logger.info(f"Found {total_checks} checks in PDF")
+            if page_range:
+                logger.info(f"Processing pages {page_range[0]}-{page_range[1]}")
+
+            slots = asyncio.Semaphore(self.max_checks_in_flight)
+            page_filter = PageFilter.from_env()
+            pack = self.open_image_pack(document_id, page_range)
+
+            async def run_check(item):
+                try:
+                    return await self._process_check(item, document_id, total_checks, page_filter, pack, on_check,
+                                                     batch_writer)
+                finally:
+                    slots.release()
+
+            while True:
+                # Only render the next pair once a slot is free, bounding memory use
+                await slots.acquire()
+                item = await self._run_blocking(next, page_pairs, None)
+                if item is None:
+                    slots.release()
+                    break
+                running.append(asyncio.create_task(run_check(item)))
+
+            processed = await asyncio.gather(*running)
+            stats["numberOfChecks"] = sum(1 for created in processed if created)
+            if batch_writer is not None:
+                stats["deferredChecks"] = batch_writer.count
+            if page_filter is not None:
+                stats.update(page_filter.stats())
+            if self.model_router.enabled:
+                logger.info(f"Model routing in this process so far: {self.model_router.stats()}")
+            logger.info("PDF processing completed successfully")
+            return True
+
+        except Exception as e:
+            import traceback
+            for task in running:
+                task.cancel()
+            logger.error(f"Error processing PDF: {str(e)}")
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            return False
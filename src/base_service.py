@@ -1,40 +1,30 @@
 import os
 import time
-import uuid
 import logging
 from datetime import datetime, timezone
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError
+from utils.mongo_utils import get_mongo_connection_settings
+from utils.profiling import should_profile, TaskProfiler
+from utils.report_tasks import subtask_result_update, parent_completion, finish_report_steps
+from utils.steps import run_steps
+from utils.task_documents import (
+    handoff_task_id, service_result_field, pending_tasks_query, claim_task_update, task_document,
+    task_started_update, task_status_fields, document_hash_update, document_usage_update, number_of_checks_update
+)
 
 class BaseMongoService:
     """Base class for MongoDB-based services"""
     
-    def __init__(self, mongo_uri=None, db_name=None, service_name="BaseService"):
-        """Initialize MongoDB connection"""
+    def __init__(self, mongo_uri=None, db_name=None, service_name="BaseService", client=None):
+        """Initialize MongoDB connection, or reuse client when the service is hosted by a shared worker"""
         self.service_name = service_name
         self.logger = logging.getLogger(f"{service_name}")
         
         try:
             # Use environment variables if not provided
-            self.mongo_uri = mongo_uri or os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-            self.db_name = db_name or os.getenv('MONGO_DB_NAME', 'pan-ocr')
-            
-            # Handle authentication if credentials are provided
-            mongo_username = os.getenv('MONGO_USERNAME')
-            mongo_password = os.getenv('MONGO_PASSWORD')
-            
-            # Check for password file (Docker secrets)
-            mongo_password_file = os.getenv('MONGO_PASSWORD_FILE')
-            if mongo_password_file and os.path.exists(mongo_password_file):
-                with open(mongo_password_file, 'r') as f:
-                    mongo_password = f.read().strip()
-            
-            if mongo_username and mongo_password:
-                # Create authenticated connection string
-                from urllib.parse import quote_plus
-                auth_uri = self.mongo_uri.replace('mongodb://', f'mongodb://{quote_plus(mongo_username)}:{quote_plus(mongo_password)}@')+self.db_name
-                self.client = MongoClient(auth_uri)
-            else:
-                self.client = MongoClient(self.mongo_uri)
+            connection_uri, self.mongo_uri, self.db_name = get_mongo_connection_settings(mongo_uri, db_name)
+            self.client = client or MongoClient(connection_uri)
                 
             self.db = self.client[self.db_name]
             self.task_collection = self.db['task']
@@ -51,13 +41,7 @@ class BaseMongoService:
     def find_pending_tasks(self, task_type, document_category="bank_checks"):
         """Find pending tasks with specified criteria"""
         try:
-            query = {
-                "documentCategory": document_category,
-                "type": task_type,
-                "status": "NOT_STARTED"
-            }
-            
-            tasks = list(self.task_collection.find(query))
+            tasks = list(self.task_collection.find(pending_tasks_query(task_type, document_category)))
             self.logger.info(f"Found {len(tasks)} pending {task_type} tasks")
             return tasks
             
@@ -65,6 +49,29 @@ class BaseMongoService:
             self.logger.error(f"Error finding pending tasks: {str(e)}")
             return []
 
+    def claim_next_task(self, task_type, document_category="bank_checks", worker_id=None):
+        """
+        Atomically move the oldest NOT_STARTED task of a queue to IN_PROGRESS.
+
+        Returns:
+            dict: The claimed task, or None when the queue is empty
+        """
+        try:
+            return self.task_collection.find_one_and_update(
+                pending_tasks_query(task_type, document_category),
+                claim_task_update(worker_id, datetime.now(timezone.utc)),
+                sort=[("createdAt", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+
+        except Exception as e:
+            self.logger.error(f"Error claiming {task_type} task: {str(e)}")
+            return None
+
+    def claim_pending_task(self):
+        """Claim the next task this service handles - to be implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement claim_pending_task method")
+
     def get_file_document(self, document_id):
         """Get file document by document ID"""
         try:
@@ -78,18 +85,16 @@ class BaseMongoService:
             self.logger.error(f"Error getting file document: {str(e)}")
             return None
 
-    def create_check_task(self, document_id, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED"):
+    def new_task(self, document_id, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED",
+                 extra_fields=None, task_id=None):
+        """Build a task document without inserting it"""
+        return task_document(document_id, datetime.now(timezone.utc), document_category, task_type, status,
+                             extra_fields, task_id)
+
+    def create_check_task(self, document_id, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED", extra_fields=None):
         """Create a check report task"""
         try:
-            task = {
-                "createdAt": datetime.now(timezone.utc),
-                "updatedAt": datetime.now(timezone.utc),
-                "_id": uuid.uuid4().hex,
-                "documentId": document_id,
-                "documentCategory": document_category,
-                "type": task_type,
-                "status": status
-            }
+            task = self.new_task(document_id, document_category, task_type, status, extra_fields)
 
             result = self.task_collection.insert_one(task)
             if result.inserted_id:
@@ -103,26 +108,144 @@ class BaseMongoService:
             self.logger.error(f"Error creating check report task: {str(e)}")
             return None
 
+    def build_report_subtasks(self, document_id, image_count, pages_per_subtask, document_category="bank_checks",
+                              source_task_id=None, extra_fields=None):
+        """
+        Split a large document into a parent REPORT task and page-range subtasks.
+
+        The parent waits in WAITING_FOR_SUBTASKS while any worker claims the
+        NOT_STARTED subtasks; record_subtask_result() completes it. The tasks are
+        returned for the caller to insert, e.g. with complete_task(). extra_fields
+        (e.g. priority) are set on the parent and every subtask.
+
+        Returns:
+            list: The parent task followed by its subtasks
+        """
+        # Keep front/back pairs together
+        pages_per_subtask = max(2, pages_per_subtask - pages_per_subtask % 2)
+        page_ranges = [
+            (first_page, min(first_page + pages_per_subtask - 1, image_count))
+            for first_page in range(1, image_count + 1, pages_per_subtask)
+        ]
+
+        parent = self.new_task(
+            document_id, document_category, "REPORT", "WAITING_FOR_SUBTASKS",
+            extra_fields={
+                **(extra_fields or {}),
+                "subtaskCount": len(page_ranges),
+                "completedSubtasks": 0,
+                "failedSubtasks": 0,
+                "numberOfChecks": 0,
+                "progress": {"checksDone": 0, "checksTotal": (image_count + 1) // 2, "checkIds": []}
+            },
+            task_id=handoff_task_id(source_task_id, "REPORT")
+        )
+        subtasks = [self.new_task(
+            document_id, document_category, "REPORT", "NOT_STARTED",
+            extra_fields={
+                **(extra_fields or {}),
+                "parentTaskId": parent["_id"],
+                "pageRange": {"firstPage": first_page, "lastPage": last_page}
+            },
+            task_id=handoff_task_id(source_task_id, f"REPORT:{first_page}")
+        ) for first_page, last_page in page_ranges]
+        return [parent, *subtasks]
+
+    def record_subtask_result(self, parent_task_id, success, number_of_checks=0):
+        """
+        Aggregate a finished subtask into its parent task.
+
+        Returns:
+            dict: The finalized parent task if this call completed it, otherwise None
+        """
+        try:
+            parent = self.task_collection.find_one_and_update(
+                {"_id": parent_task_id},
+                subtask_result_update(success, number_of_checks, datetime.now(timezone.utc)),
+                return_document=ReturnDocument.AFTER
+            )
+            if not parent:
+                self.logger.warning(f"Parent task {parent_task_id} not found")
+                return None
+
+            completion = parent_completion(parent, datetime.now(timezone.utc))
+            if completion is None:
+                return None
+            status, update = completion
+            # Only the worker that moves the parent out of WAITING_FOR_SUBTASKS finalizes it
+            finalized = self.task_collection.update_one(
+                {"_id": parent_task_id, "status": "WAITING_FOR_SUBTASKS"}, update
+            )
+            if finalized.modified_count == 0:
+                return None
+
+            self.logger.info(f"Parent task {parent_task_id} {status}: {parent['numberOfChecks']} checks "
+                             f"from {parent['subtaskCount']} subtasks")
+            parent["status"] = status
+            return parent
+
+        except Exception as e:
+            self.logger.error(f"Error recording subtask result: {str(e)}")
+            return None
+
+    def finish_report(self, task, success, number_of_checks=0, page_cache=None):
+        """Roll a finished REPORT (sub)task into its parent and drop cached pages once the whole document is finished"""
+        finished = run_steps(self, finish_report_steps(task, success, number_of_checks))
+        # Rendered pages are no longer needed once the REPORT stage is done, successful or not
+        if finished and page_cache is not None:
+            page_cache.evict(task["documentId"])
+
+    def register_document_hash(self, document_id, number_of_checks):
+        """Record a fully processed document under its PDF content hash so re-uploads can reuse its checks"""
+        try:
+            file_doc = self.file_document_collection.find_one({"_id": document_id}, {"contentHash": 1})
+            content_hash = (file_doc or {}).get("contentHash")
+            if not content_hash:
+                return
+
+            self.db['document_hash'].update_one(
+                {"_id": content_hash},
+                document_hash_update(document_id, number_of_checks, datetime.now(timezone.utc)),
+                upsert=True
+            )
+
+        except Exception as e:
+            self.logger.error(f"Error registering document hash: {str(e)}")
+
+    def find_processed_document(self, content_hash):
+        """
+        Look up an already processed document with the same PDF content hash.
+
+        Returns:
+            dict: The document_hash entry, or None when there is no usable match
+        """
+        try:
+            entry = self.db['document_hash'].find_one({"_id": content_hash})
+            if not entry:
+                return None
+
+            # Ignore the entry if the original checks have been removed since
+            stored = self.db['check'].count_documents({"documentId": entry["documentId"]})
+            if stored != entry["numberOfChecks"]:
+                self.logger.warning(f"Stale document hash entry for {content_hash}: expected "
+                                    f"{entry['numberOfChecks']} checks, found {stored}")
+                return None
+            return entry
+
+        except Exception as e:
+            self.logger.error(f"Error looking up document hash: {str(e)}")
+            return None
+
+    def result_field(self):
+        """Task field holding this service's result"""
+        return service_result_field(self.service_name)
+
     def update_task_status(self, task_id, status, result=None):
         """Update task status and add results"""
         try:
-            update_data = {
-                "status": status,
-                "updatedAt": datetime.now(timezone.utc)
-            }
-            
-            if result:
-                # Use different field names based on service type
-                if self.service_name == "CheckValidator":
-                    update_data["validationResult"] = result
-                elif self.service_name == "CheckProcessor":
-                    update_data["processingResult"] = result
-                else:
-                    update_data["result"] = result
-            
             result_update = self.task_collection.update_one(
                 {"_id": task_id},
-                {"$set": update_data}
+                {"$set": task_status_fields(status, datetime.now(timezone.utc), self.result_field(), result)}
             )
             
             if result_update.modified_count > 0:
@@ -133,17 +256,107 @@ class BaseMongoService:
         except Exception as e:
             self.logger.error(f"Error updating task status: {str(e)}")
 
+    def use_transactions(self):
+        """
+        Whether complete_task() writes in a transaction: TASK_TRANSACTIONS is
+        'true', 'false' or 'auto' (only on replica sets and sharded clusters).
+        """
+        if not hasattr(self, '_use_transactions'):
+            setting = os.getenv('TASK_TRANSACTIONS', 'auto').lower()
+            if setting == 'auto':
+                topology = self.client.topology_description.topology_type_name
+                self._use_transactions = topology in ('ReplicaSetWithPrimary', 'Sharded')
+            else:
+                self._use_transactions = setting in ('1', 'true', 'yes')
+        return self._use_transactions
+
+    def complete_task(self, task_id, status, result=None, new_tasks=None, document_id=None, document_update=None,
+                      new_documents=None):
+        """
+        Move a task to its final status together with its handoff: the documents
+        it creates, the follow-up tasks it queues and the update of its file document.
+
+        In a transaction all of it commits or none does. Without transactions the
+        writes are ordered so a crash cannot lose work: new documents and
+        follow-up tasks go first (with IDs derived from task_id, so a retry does
+        not insert them twice), the task status last. An interrupted task stays
+        IN_PROGRESS; use fail_unfinished_task() rather than marking it FAILED.
+
+        Args:
+            new_documents (dict): Collection name -> documents to insert, e.g. copied checks
+
+        Returns:
+            bool: True when every write succeeded
+        """
+        now = datetime.now(timezone.utc)
+        task_update = task_status_fields(status, now, self.result_field(), result)
+
+        def insert(collection, documents, session):
+            try:
+                collection.insert_many(documents, ordered=False, session=session)
+            except BulkWriteError as e:
+                # Documents already inserted by an interrupted earlier attempt (duplicate key)
+                if session is not None or any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                    raise
+
+        def write(session=None):
+            for collection_name, documents in (new_documents or {}).items():
+                if documents:
+                    insert(self.db[collection_name], documents, session)
+            if new_tasks:
+                insert(self.task_collection, new_tasks, session)
+            if document_id and document_update:
+                self.file_document_collection.update_one(
+                    {"_id": document_id}, {"$set": {**document_update, "updatedAt": now}}, session=session
+                )
+            self.task_collection.update_one({"_id": task_id}, {"$set": task_update}, session=session)
+
+        try:
+            if self.use_transactions():
+                with self.client.start_session() as session:
+                    session.with_transaction(write)
+            else:
+                write()
+            self.logger.info(f"Task {task_id} {status}"
+                             + (f", queued {len(new_tasks)} follow-up tasks" if new_tasks else ""))
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error completing task {task_id}: {str(e)}")
+            return False
+
+    def fail_unfinished_task(self, task_id, new_tasks, result):
+        """
+        Mark a task FAILED after complete_task() returned False, unless its
+        follow-up tasks were already queued: then the next stage owns the
+        document and the task is left IN_PROGRESS.
+        """
+        try:
+            queued = new_tasks and self.task_collection.count_documents(
+                {"_id": {"$in": [task["_id"] for task in new_tasks]}}
+            )
+        except Exception as e:
+            self.logger.error(f"Could not check the handoff of task {task_id}, leaving it IN_PROGRESS: {str(e)}")
+            return
+        if queued:
+            self.logger.error(f"Task {task_id} left IN_PROGRESS: its follow-up tasks are already queued")
+            return
+        self.update_task_status(task_id, "FAILED", result)
+
+    def record_document_usage(self, document_id, usage):
+        """Add a task's API usage counters to the running totals of its file document"""
+        try:
+            self.file_document_collection.update_one(
+                {"_id": document_id}, document_usage_update(usage, datetime.now(timezone.utc))
+            )
+        except Exception as e:
+            self.logger.error(f"Error recording document usage: {str(e)}")
+
     def update_file_document(self, document_id, numberOfChecks):
         """Update the file document collection with number of checks"""
         try:
-            update_data = {
-                "numberOfChecks": numberOfChecks,
-                "updatedAt": datetime.now(timezone.utc)
-            }
-            
             result = self.file_document_collection.update_one(
-                {"_id": document_id},
-                {"$set": update_data}
+                {"_id": document_id}, number_of_checks_update(numberOfChecks, datetime.now(timezone.utc))
             )
             
             if result.modified_count > 0:
@@ -163,21 +376,20 @@ class BaseMongoService:
         try:
             while True:
                 try:
-                    # Find pending tasks (implemented by subclasses)
-                    pending_tasks = self.find_pending_tasks()
-                    
-                    if pending_tasks:
-                        self.logger.info(f"Processing {len(pending_tasks)} pending tasks")
-                        
-                        for task in pending_tasks:
-                            try:
-                                if process_task_func:
-                                    process_task_func(task)
-                                else:
-                                    self.process_task(task)
-                            except Exception as e:
-                                self.logger.error(f"Error processing individual task: {str(e)}")
-                                continue
+                    # Claim tasks one at a time (implemented by subclasses) until the queue is empty
+                    processed = 0
+                    while True:
+                        task = self.claim_pending_task()
+                        if task is None:
+                            break
+                        try:
+                            self.run_task(task, process_task_func)
+                        except Exception as e:
+                            self.logger.error(f"Error processing individual task: {str(e)}")
+                        processed += 1
+
+                    if processed:
+                        self.logger.info(f"Processed {processed} tasks")
                     else:
                         self.logger.debug("No pending tasks found")
                     
@@ -195,6 +407,27 @@ class BaseMongoService:
             self.client.close()
             self.logger.info("MongoDB connection closed")
 
+    def run_task(self, task, process_task_func=None):
+        """Process one task, under the profiler when should_profile() selects it"""
+        process = process_task_func or self.process_task
+        self.mark_started(task)
+        if not should_profile(task):
+            return process(task)
+
+        profiler = TaskProfiler(task["_id"])
+        with profiler:
+            result = process(task)
+        if profiler.summary:
+            self.task_collection.update_one({"_id": task["_id"]}, {"$set": {"profiling": profiler.summary}})
+        return result
+
+    def mark_started(self, task):
+        """Record startedAt on a task about to be processed; a failed write only loses the timestamp"""
+        try:
+            self.task_collection.update_one({"_id": task["_id"]}, task_started_update(datetime.now(timezone.utc)))
+        except Exception as e:
+            self.logger.warning(f"Could not record start of task {task['_id']}: {str(e)}")
+
     def process_task(self, task):
         """Process a single task - to be implemented by subclasses"""
         raise NotImplementedError("Subclasses must implement process_task method") 
\ No newline at end of file
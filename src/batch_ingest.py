@@ -0,0 +1,188 @@
+import os
+import sys
+import logging
+import pandas as pd
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from utils.logger import configure_logging
+from pymongo.errors import BulkWriteError
+from base_service import BaseMongoService
+from process_checks import parse_extraction_response, PROCESSED_CHECKS_CSV
+from utils.batch_extraction import read_jsonl, read_batch_results, write_stub_results
+from utils.page_cache import PageCache
+from utils.progress import ProgressPublisher
+from utils.usage import UsageStats, estimate_cost
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+configure_logging()
+
+class BatchIngestService(BaseMongoService):
+    """Finishes REPORT tasks parked in WAITING_FOR_BATCH once their batch results are available"""
+
+    def __init__(self, mongo_uri=None, db_name=None):
+        # Same service name as the processor so results land in processingResult
+        super().__init__(mongo_uri, db_name, "CheckProcessor")
+        self.check_collection = self.db['check']
+        self.page_cache = PageCache.from_env()
+
+    def find_waiting_tasks(self):
+        """Find REPORT tasks waiting for batch extraction results"""
+        return list(self.task_collection.find({"type": "REPORT", "status": "WAITING_FOR_BATCH"}))
+
+    def persist_checks(self, checks):
+        """Insert checks in one bulk write and append them to the CSV in one go"""
+        if not checks:
+            return
+        try:
+            self.check_collection.insert_many([c.model_dump() for c in checks], ordered=False)
+        except BulkWriteError as e:
+            # A previous interrupted ingestion may already have inserted some of them
+            errors = [err for err in e.details.get("writeErrors", []) if err.get("code") != 11000]
+            if errors:
+                raise
+
+        pd.DataFrame([{"check_id": c.id, **c.model_dump()} for c in checks]).to_csv(
+            PROCESSED_CHECKS_CSV, mode='a', header=False, index=False
+        )
+
+    def ingest_task(self, task, results):
+        """
+        Build and persist the checks of one waiting task.
+
+        Returns:
+            bool: True if the task was finished, False if results are still missing
+        """
+        task_id = task["_id"]
+        pending_file = (task.get("processingResult") or {}).get("pendingFile")
+        if not pending_file or not os.path.exists(pending_file):
+            self.update_task_status(task_id, "FAILED", {"error": f"Pending batch file not found: {pending_file}"})
+            self.finish_report(task, False, page_cache=self.page_cache)
+            return True
+
+        pending = read_jsonl(pending_file)
+        missing = [p["custom_id"] for p in pending if p["custom_id"] not in results]
+        if missing:
+            self.logger.info(f"Task {task_id}: {len(missing)} of {len(pending)} batch results still missing")
+            return False
+
+        checks = []
+        failures = []
+        batch_usage = UsageStats()
+        for entry in pending:
+            content, error, usage = results[entry["custom_id"]]
+            if usage:
+                batch_usage.add(
+                    llmRequests=1,
+                    promptTokens=usage.get("prompt_tokens", 0),
+                    completionTokens=usage.get("completion_tokens", 0)
+                )
+            if error:
+                failures.append({"checkId": entry["custom_id"], "error": str(error)})
+                continue
+            try:
+                check_details = parse_extraction_response(content, entry["front_text"], entry["back_text"],
+                                                          entry.get("front_raw_text"))
+            except Exception as e:
+                failures.append({"checkId": entry["custom_id"], "error": str(e)})
+                continue
+            check_details.id = entry["custom_id"]
+            check_details.documentId = entry["documentId"]
+            check_details.front_path = entry["front_path"]
+            check_details.back_path = entry["back_path"]
+            checks.append(check_details)
+
+        self.persist_checks(checks)
+
+        # Deferred checks were not counted while the task was processing
+        progress = task.get("progress") or {}
+        publisher = ProgressPublisher(self.task_collection, task, progress.get("checksTotal"),
+                                      done=progress.get("checksDone", 0))
+        for check_details in checks:
+            publisher.check_done(check_details)
+        for _ in failures:
+            publisher.check_done()
+        publisher.flush()
+
+        # Add the deferred extraction's tokens to what the OCR pass already recorded
+        delta = batch_usage.as_dict()
+        delta.pop("estimatedCostUsd")
+        task_usage = dict((task.get("processingResult") or {}).get("usage") or {})
+        for name, amount in delta.items():
+            task_usage[name] = task_usage.get(name, 0) + amount
+        task_usage["estimatedCostUsd"] = round(estimate_cost(task_usage), 6)
+        delta["estimatedCostUsd"] = round(estimate_cost(delta), 6)
+        self.record_document_usage(task["documentId"], delta)
+
+        processing_result = {
+            **(task.get("processingResult") or {}),
+            "usage": task_usage,
+            "success": not failures,
+            "numberOfChecks": len(checks),
+            "failedChecks": failures,
+            "ingestedAt": datetime.now(timezone.utc).isoformat()
+        }
+        status = "COMPLETED" if not failures else "FAILED"
+        self.update_task_status(task_id, status, processing_result)
+        self.finish_report(task, not failures, len(checks), self.page_cache)
+        self.logger.info(f"Task {task_id} ingested {len(checks)} checks from batch results ({len(failures)} failed)")
+        return True
+
+    def ingest(self, results_paths=None, use_stub_results=False):
+        """
+        Ingest batch results for all waiting tasks.
+
+        Args:
+            results_paths (list): Batch API output files to read
+            use_stub_results (bool): Generate a local stand-in result file per task instead
+
+        Returns:
+            int: Number of tasks finished
+        """
+        results = {}
+        for path in results_paths or []:
+            results.update(read_batch_results(path))
+
+        finished = 0
+        for task in self.find_waiting_tasks():
+            try:
+                if use_stub_results:
+                    requests_file = task["processingResult"]["batchRequestFile"]
+                    stub_path = requests_file.replace(".requests.jsonl", ".results.jsonl")
+                    write_stub_results(requests_file, stub_path)
+                    results.update(read_batch_results(stub_path))
+                if self.ingest_task(task, results):
+                    finished += 1
+            except Exception as e:
+                self.logger.error(f"Error ingesting batch results for task {task['_id']}: {str(e)}")
+        return finished
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Ingest offline batch extraction results and finish waiting REPORT tasks')
+    parser.add_argument('--results', nargs='*', default=[],
+                       help='Batch API output JSONL file(s)')
+    parser.add_argument('--stub-results', action='store_true',
+                       help='Answer every pending request with a local stand-in result (offline testing)')
+    parser.add_argument('--mongo-uri',
+                       help='MongoDB connection URI (overrides MONGO_URI env var)')
+    parser.add_argument('--db-name',
+                       help='MongoDB database name (overrides MONGO_DB_NAME env var)')
+
+    args = parser.parse_args()
+    if not args.results and not args.stub_results:
+        parser.error("provide --results or --stub-results")
+
+    try:
+        service = BatchIngestService(args.mongo_uri, args.db_name)
+        finished = service.ingest(args.results, args.stub_results)
+        logging.info(f"Finished {finished} waiting tasks")
+    except Exception as e:
+        logging.error(f"Batch ingestion failed: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
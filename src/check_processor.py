@@ -3,40 +3,42 @@ import sys
 import logging
 from datetime import datetime, timezone
 from dotenv import load_dotenv
+from utils.logger import configure_logging
 from process_checks import CheckProcessor
 from base_service import BaseMongoService
+from utils.page_cache import PageCache
+from utils.batch_extraction import batch_writer_for
+from utils.usage import UsageStats, track_usage
+from utils.progress import ProgressPublisher, expected_checks
 
 # Load environment variables
 load_dotenv()
 
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/check_processor.log'),
-        logging.StreamHandler()
-    ]
-)
+configure_logging('logs/check_processor.log')
 
 class CheckProcessorService(BaseMongoService):
-    def __init__(self, mongo_uri=None, db_name=None):
+    def __init__(self, mongo_uri=None, db_name=None, client=None):
         """Initialize MongoDB connection and check processor"""
-        super().__init__(mongo_uri, db_name, "CheckProcessor")
-        self.check_processor = CheckProcessor()
+        super().__init__(mongo_uri, db_name, "CheckProcessor", client)
+        self.check_processor = CheckProcessor(page_cache=PageCache.from_env())
 
     def find_pending_tasks(self):
         """Find tasks with bank_checks category, NOT_STARTED status, and REPORT type"""
         return super().find_pending_tasks("REPORT", "bank_checks")
 
-    def process_pdf_file(self, pdf_path):
+    def claim_pending_task(self):
+        """Claim the oldest NOT_STARTED REPORT task"""
+        return self.claim_next_task("REPORT", "bank_checks")
+
+    def process_pdf_file(self, pdf_path, page_range=None, stats=None, batch_writer=None, on_check=None):
         """Process PDF file using the existing CheckProcessor"""
         try:
             if not os.path.exists(pdf_path):
                 return False, f"PDF file not found: {pdf_path}"
             
             # Use the existing process_pdf method
-            success = self.check_processor.process_pdf(pdf_path)
+            success = self.check_processor.process_pdf(pdf_path, page_range, stats, batch_writer, on_check)
             
             if success:
                 return True, "PDF processing completed successfully"
@@ -54,39 +56,71 @@ class CheckProcessorService(BaseMongoService):
         
         self.logger.info(f"Processing REPORT task {task_id} for document {document_id}")
         
-        # update task status
-        self.update_task_status(task_id, "IN_PROGRESS", {"message": "Processing PDF"})
+        # Claimed tasks are already IN_PROGRESS
+        if task.get("status") != "IN_PROGRESS":
+            self.update_task_status(task_id, "IN_PROGRESS", {"message": "Processing PDF"})
         try:
             # Get file document
             file_doc = self.get_file_document(document_id)
             if not file_doc:
                 self.update_task_status(task_id, "FAILED", {"error": "File document not found"})
+                self.finish_report(task, False, page_cache=self.check_processor.page_cache)
                 return False
             
             # Get PDF path
             pdf_path = file_doc.get("path")
             if not pdf_path:
                 self.update_task_status(task_id, "FAILED", {"error": "PDF path not found in file document"})
+                self.finish_report(task, False, page_cache=self.check_processor.page_cache)
                 return False
             
+            # Subtasks of a split document only cover a page range
+            page_range = task.get("pageRange")
+            if page_range:
+                page_range = (page_range["firstPage"], page_range["lastPage"])
+            
+            # Low-priority tasks can defer LLM extraction to an offline batch
+            batch_writer = batch_writer_for(task)
+            
+            # Publish checks and progress on the task while the document is processing
+            progress = ProgressPublisher(self.task_collection, task, expected_checks(task, file_doc))
+            progress.start()
+
             # Process PDF
-            success, message = self.process_pdf_file(pdf_path)
+            stats = {}
+            usage = UsageStats()
+            with track_usage(usage):
+                success, message = self.process_pdf_file(pdf_path, page_range, stats, batch_writer, progress.check_done)
+            progress.flush()
             
             # Prepare processing result
             processing_result = {
                 "success": success,
                 "message": message,
                 "pdfPath": pdf_path,
-                "processedAt": datetime.now(timezone.utc).isoformat()
+                "processedAt": datetime.now(timezone.utc).isoformat(),
+                "usage": usage.as_dict(),
+                **stats
             }
+            # API calls are paid for whether or not the task succeeded
+            self.record_document_usage(document_id, processing_result["usage"])
+            self.logger.info(f"Task {task_id} usage: {processing_result['usage']}")
 
             # Update task status
-            if success:
+            if success and batch_writer is not None:
+                processing_result["batchRequestFile"] = str(batch_writer.requests_path)
+                processing_result["pendingFile"] = str(batch_writer.pending_path)
+                self.update_task_status(task_id, "WAITING_FOR_BATCH", processing_result)
+                self.logger.info(f"Task {task_id} deferred {batch_writer.count} checks to batch file {batch_writer.requests_path}")
+                return True
+            elif success:
                 self.update_task_status(task_id, "COMPLETED", processing_result)
+                self.finish_report(task, True, stats.get("numberOfChecks", 0), self.check_processor.page_cache)
                 self.logger.info(f"Task {task_id} processed successfully")
                 return True
             else:
                 self.update_task_status(task_id, "FAILED", processing_result)
+                self.finish_report(task, False, page_cache=self.check_processor.page_cache)
                 self.logger.error(f"Task {task_id} processing failed: {message}")
                 return False
                 
@@ -94,6 +128,7 @@ class CheckProcessorService(BaseMongoService):
             error_msg = f"Error processing task {task_id}: {str(e)}"
             self.logger.error(error_msg)
             self.update_task_status(task_id, "FAILED", {"error": error_msg})
+            self.finish_report(task, False, page_cache=self.check_processor.page_cache)
             return False
 
 def main():
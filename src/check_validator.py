@@ -3,39 +3,39 @@ import sys
 import logging
 from datetime import datetime, timezone
 from dotenv import load_dotenv
+from utils.logger import configure_logging
 from validation_checks import PDFValidator
-from base_service import BaseMongoService
+from base_service import BaseMongoService, handoff_task_id
+from utils.page_cache import PageCache
+from utils.hashing import file_sha256
 
 # Load environment variables
 load_dotenv()
 
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/check_validator.log'),
-        logging.StreamHandler()
-    ]
-)
+configure_logging('logs/check_validator.log')
 
 class CheckValidator(BaseMongoService):
-    def __init__(self, mongo_uri=None, db_name=None):
+    def __init__(self, mongo_uri=None, db_name=None, client=None):
         """Initialize MongoDB connection and validator"""
-        super().__init__(mongo_uri, db_name, "CheckValidator")
-        self.validator = PDFValidator()
+        super().__init__(mongo_uri, db_name, "CheckValidator", client)
+        self.validator = PDFValidator(page_cache=PageCache.from_env())
 
     def find_pending_tasks(self):
         """Find tasks with bank_checks category and NOT_STARTED status"""
         return super().find_pending_tasks("VALIDATE", "bank_checks")
 
-    def validate_pdf_file(self, pdf_path):
+    def claim_pending_task(self):
+        """Claim the oldest NOT_STARTED VALIDATE task"""
+        return self.claim_next_task("VALIDATE", "bank_checks")
+
+    def validate_pdf_file(self, pdf_path, document_id=None, pdf_hash=None):
         """Validate PDF file using the existing validator"""
         try:
             if not os.path.exists(pdf_path):
                 return False, 0, f"PDF file not found: {pdf_path}"
             
-            is_valid, image_count, message = self.validator.validate_pdf_images(pdf_path)
+            is_valid, image_count, message = self.validator.validate_pdf_images(pdf_path, document_id, pdf_hash)
             return is_valid, image_count, message
             
         except Exception as e:
@@ -49,8 +49,9 @@ class CheckValidator(BaseMongoService):
         
         self.logger.info(f"Processing task {task_id} for document {document_id}")
 
-        # update task status
-        self.update_task_status(task_id, "IN_PROGRESS", {"message": "Validating PDF"})
+        # Claimed tasks are already IN_PROGRESS
+        if task.get("status") != "IN_PROGRESS":
+            self.update_task_status(task_id, "IN_PROGRESS", {"message": "Validating PDF"})
         
         try:
             # Get file document
@@ -65,8 +66,17 @@ class CheckValidator(BaseMongoService):
                 self.update_task_status(task_id, "FAILED", {"error": "PDF path not found in file document"})
                 return False
             
+            # Re-uploads of an already processed PDF reuse its checks instead of going through REPORT again
+            pdf_hash = None
+            if os.getenv('DOCUMENT_DEDUP_ENABLED', 'true').lower() in ('1', 'true', 'yes') and os.path.exists(pdf_path):
+                pdf_hash = file_sha256(pdf_path)
+                self.file_document_collection.update_one({"_id": document_id}, {"$set": {"contentHash": pdf_hash}})
+                original = self.find_processed_document(pdf_hash)
+                if original and original["documentId"] != document_id:
+                    return self.reuse_processed_document(task, pdf_path, pdf_hash, original)
+
             # Validate PDF
-            is_valid, image_count, message = self.validate_pdf_file(pdf_path)
+            is_valid, image_count, message = self.validate_pdf_file(pdf_path, document_id, pdf_hash)
             
             # Prepare validation result
             validation_result = {
@@ -74,20 +84,37 @@ class CheckValidator(BaseMongoService):
                 "imageCount": image_count,
                 "message": message,
                 "pdfPath": pdf_path,
+                "contentHash": pdf_hash,
                 "validatedAt": datetime.now(timezone.utc).isoformat()
             }
 
             # Update task status
             if is_valid:
-                self.update_task_status(task_id, "COMPLETED", validation_result)
-                self.create_check_task(document_id, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED")
-                
-                # Update the file document collection with number of checks 
-                self.update_file_document(document_id, image_count//2)
+                # Large documents fan out into page-range subtasks any worker can claim
+                pages_per_subtask = int(os.getenv('REPORT_SPLIT_PAGES', '0'))
+                # REPORT workers read the priority from their own task, e.g. to defer low-priority extraction
+                priority = task.get("priority") or file_doc.get("priority")
+                handoff_fields = {"priority": priority} if priority else None
+                if pages_per_subtask and image_count > pages_per_subtask:
+                    report_tasks = self.build_report_subtasks(document_id, image_count, pages_per_subtask,
+                                                              source_task_id=task_id, extra_fields=handoff_fields)
+                else:
+                    report_tasks = [self.new_task(document_id, "bank_checks", "REPORT", "NOT_STARTED",
+                                                  extra_fields=handoff_fields,
+                                                  task_id=handoff_task_id(task_id, "REPORT"))]
+
+                # Completion, the REPORT handoff and the number of checks are written together
+                if not self.complete_task(task_id, "COMPLETED", validation_result, report_tasks,
+                                          document_id, {"numberOfChecks": image_count // 2}):
+                    self.fail_unfinished_task(task_id, report_tasks, {"error": "Failed to record validation result"})
+                    return False
                 self.logger.info(f"Task {task_id} validated successfully: {image_count} images")
                 return True
             else:
                 self.update_task_status(task_id, "VALIDATION_FAILED", validation_result)
+                # No REPORT task will follow, so the rendered pages are not needed
+                if self.validator.page_cache is not None:
+                    self.validator.page_cache.evict(document_id)
                 self.logger.error(f"Task {task_id} validation failed: {message}")
                 return False
                 
@@ -97,6 +124,54 @@ class CheckValidator(BaseMongoService):
             self.update_task_status(task_id, "FAILED", {"error": error_msg})
             return False
 
+    def reuse_processed_document(self, task, pdf_path, pdf_hash, original):
+        """Copy the checks of an identical, already processed document and skip the REPORT stage"""
+        task_id = task["_id"]
+        document_id = task["documentId"]
+        original_id = original["documentId"]
+
+        now = datetime.now(timezone.utc)
+        checks = []
+        for check in self.db['check'].find({"documentId": original_id}):
+            # Derived IDs make a retried copy a duplicate instead of a second set of checks
+            check["_id"] = handoff_task_id(task_id, f"check:{check['_id']}")
+            check["documentId"] = document_id
+            check["createdAt"] = now
+            check["updatedAt"] = now
+            checks.append(check)
+
+        number_of_checks = len(checks)
+        validation_result = {
+            "isValid": True,
+            "imageCount": number_of_checks * 2,
+            "message": f"Duplicate of already processed document {original_id}",
+            "pdfPath": pdf_path,
+            "contentHash": pdf_hash,
+            "dedupOf": original_id,
+            "validatedAt": now.isoformat()
+        }
+        # Keep the REPORT task for consumers that look for it, but already completed
+        report_task = self.new_task(
+            document_id, "bank_checks", "REPORT", "COMPLETED",
+            extra_fields={"processingResult": {
+                "success": True,
+                "message": f"Reused {number_of_checks} checks from document {original_id}",
+                "pdfPath": pdf_path,
+                "numberOfChecks": number_of_checks,
+                "dedupOf": original_id,
+                "processedAt": now.isoformat()
+            }},
+            task_id=handoff_task_id(task_id, "REPORT")
+        )
+        # The copies are written in the same step as the completion and the REPORT task
+        if not self.complete_task(task_id, "COMPLETED", validation_result, [report_task],
+                                  document_id, {"numberOfChecks": number_of_checks}, {"check": checks}):
+            self.fail_unfinished_task(task_id, [report_task], {"error": "Failed to record validation result"})
+            return False
+        self.logger.info(f"Task {task_id}: document {document_id} is a duplicate of {original_id}, "
+                         f"reused {number_of_checks} checks")
+        return True
+
 def main():
     import argparse
     
@@ -0,0 +1,505 @@
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import shutil
+import signal
+import logging
+import multiprocessing
+from pathlib import Path
+from collections import Counter
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from utils.logger import configure_logging
+from utils.mongo_utils import TERMINAL_STATUSES
+from utils.stub_backends import install_stub_backends, write_synthetic_pdf
+from base_service import BaseMongoService
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+configure_logging('logs/load_test.log')
+
+# One entry per process_task() call made by a load test worker
+EXECUTION_COLLECTION = 'load_test_execution'
+
+def percentiles(values):
+    """count, mean, p50/p90/p95/p99 and max of a list of seconds"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 3)
+
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": pick(50), "p90": pick(90), "p95": pick(95), "p99": pick(99),
+        "max": round(ordered[-1], 3)
+    }
+
+def read_rss_mb(pid):
+    """Resident memory of a process in MB from /proc (Linux), or None when unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+def _record_executions(service, collection):
+    """Log every process_task() call of a service, so tasks processed more than once show up"""
+    process = service.process_task
+
+    def recorded(task):
+        started = datetime.now(timezone.utc)
+        result = None
+        try:
+            result = process(task)
+            return result
+        finally:
+            collection.insert_one({
+                "taskId": task["_id"],
+                "type": task.get("type"),
+                "documentId": task.get("documentId"),
+                "pid": os.getpid(),
+                "startedAt": started,
+                "finishedAt": datetime.now(timezone.utc),
+                "success": bool(result)
+            })
+
+    service.process_task = recorded
+
+def _run_service(role, work_dir, backends, poll_interval):
+    """Worker process: install the stub backends, then run the service's own polling loop"""
+    # The CSV export and relative paths of the services land in the work directory
+    os.chdir(work_dir)
+    os.makedirs('data', exist_ok=True)
+    install_stub_backends(**backends)
+
+    if role == 'worker':
+        from worker import MultiQueueWorker
+        from check_validator import CheckValidator
+        from check_processor import CheckProcessorService
+        service = MultiQueueWorker()
+        for task_type, handler in (("VALIDATE", CheckValidator(client=service.client)),
+                                   ("REPORT", CheckProcessorService(client=service.client))):
+            _record_executions(handler, service.db[EXECUTION_COLLECTION])
+            service.register("bank_checks", task_type, handler)
+        service.run(poll_interval)
+        return
+
+    if role == 'validator':
+        from check_validator import CheckValidator
+        service = CheckValidator()
+    else:
+        from check_processor import CheckProcessorService
+        service = CheckProcessorService()
+    _record_executions(service, service.db[EXECUTION_COLLECTION])
+    service.run_continuous_process(poll_interval)
+
+class LoadTest(BaseMongoService):
+    """
+    End-to-end load and soak test against a dedicated MongoDB database.
+
+    Seeds file documents and VALIDATE tasks pointing at synthetic PDFs, starts
+    validator, processor and combined worker processes whose OCR and LLM calls go
+    to stub backends with tunable latency and error rates, and measures
+    end-to-end document latency, per-stage latency, throughput, duplicate
+    processing and worker memory while the backlog drains.
+    """
+
+    def __init__(self, mongo_uri=None, db_name=None, work_dir=None):
+        super().__init__(mongo_uri, db_name or os.getenv('LOAD_TEST_DB_NAME', 'vision_flow_load_test'), "LoadTest")
+        self.work_dir = Path(work_dir or os.getenv('LOAD_TEST_DIR', 'data/load_test')).resolve()
+        self.executions = self.db[EXECUTION_COLLECTION]
+        self.check_collection = self.db['check']
+        self.expected_checks = {}
+        self.processes = []
+        self.samples = []
+        self._rng = random.Random()
+
+    def prepare(self, reset=False):
+        """Make sure the database holds nothing but load test data, dropping it first when reset is set"""
+        foreign = self.file_document_collection.count_documents({"loadTest": {"$ne": True}}, limit=1)
+        if foreign:
+            raise RuntimeError(f"Database {self.db_name} holds documents not created by a load test")
+        if reset:
+            self.client.drop_database(self.db_name)
+            shutil.rmtree(self.work_dir / "repository", ignore_errors=True)
+            self.logger.info(f"Dropped database {self.db_name} and synthetic files in {self.work_dir}")
+        elif self.task_collection.estimated_document_count():
+            raise RuntimeError(f"Database {self.db_name} already holds tasks, use --reset to start over")
+        self.task_collection.create_index([("documentCategory", 1), ("type", 1), ("status", 1), ("createdAt", 1)])
+        self.check_collection.create_index([("documentId", 1)])
+        self.executions.create_index([("taskId", 1)])
+
+    def seed(self, count, min_checks=1, max_checks=10, batch_size=500):
+        """Write count synthetic PDFs and insert their file documents and VALIDATE tasks in bulk"""
+        file_docs, tasks = [], []
+        for _ in range(count):
+            document_id = uuid.uuid4().hex
+            checks = self._rng.randint(min_checks, max_checks)
+            path = write_synthetic_pdf(
+                self.work_dir / "repository" / "bank_checks" / document_id / f"{document_id}.pdf",
+                checks * 2, seed=document_id
+            )
+            now = datetime.now(timezone.utc)
+            file_docs.append({
+                "_id": document_id,
+                "name": path.name,
+                "path": str(path),
+                "documentCategory": "bank_checks",
+                "loadTest": True,
+                "createdAt": now,
+                "updatedAt": now
+            })
+            tasks.append(self.new_task(document_id, "bank_checks", "VALIDATE"))
+            self.expected_checks[document_id] = checks
+
+            if len(tasks) >= batch_size:
+                self.file_document_collection.insert_many(file_docs)
+                self.task_collection.insert_many(tasks)
+                file_docs, tasks = [], []
+        if tasks:
+            self.file_document_collection.insert_many(file_docs)
+            self.task_collection.insert_many(tasks)
+        return count
+
+    def start_workers(self, validators=0, processors=0, workers=0, backends=None, poll_interval=1):
+        """Start the service processes; they inherit the environment prepared by run()"""
+        context = multiprocessing.get_context('spawn')
+        for role, count in (("validator", validators), ("processor", processors), ("worker", workers)):
+            for index in range(count):
+                process = context.Process(
+                    target=_run_service, name=f"{role}-{index + 1}",
+                    args=(role, str(self.work_dir), backends or {}, poll_interval)
+                )
+                process.start()
+                self.processes.append(process)
+        self.logger.info(f"Started {validators} validators, {processors} processors and {workers} combined workers")
+
+    def stop_workers(self, timeout=30):
+        """Interrupt the workers like Ctrl+C would, killing any that do not exit in time"""
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGINT)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                self.logger.warning(f"{process.name} did not stop within {timeout} seconds, terminating it")
+                process.terminate()
+                process.join()
+
+    def documents_finished(self):
+        """Documents whose pipeline is over: a final top-level REPORT task, or a failed VALIDATE task"""
+        return self.task_collection.count_documents({"$or": [
+            {"type": "REPORT", "parentTaskId": {"$exists": False}, "status": {"$in": list(TERMINAL_STATUSES)}},
+            {"type": "VALIDATE", "status": {"$in": ["FAILED", "VALIDATION_FAILED"]}}
+        ]})
+
+    def documents_failed(self):
+        """Finished documents that did not succeed: a FAILED top-level REPORT task, or a failed VALIDATE task"""
+        return self.task_collection.count_documents({"$or": [
+            {"type": "REPORT", "parentTaskId": {"$exists": False}, "status": "FAILED"},
+            {"type": "VALIDATE", "status": {"$in": ["FAILED", "VALIDATION_FAILED"]}}
+        ]})
+
+    def sample(self, elapsed):
+        """Record queue depths, finished documents and worker memory at one point in time"""
+        statuses = {
+            f"{row['_id']['type']}:{row['_id']['status']}": row["count"]
+            for row in self.task_collection.aggregate([
+                {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+            ])
+        }
+        rss = {process.name: read_rss_mb(process.pid) for process in self.processes if process.is_alive()}
+        sample = {
+            "elapsedSeconds": round(elapsed, 1),
+            "documentsFinished": self.documents_finished(),
+            "documentsFailed": self.documents_failed(),
+            "tasksByStatus": statuses,
+            "workerRssMb": rss
+        }
+        self.samples.append(sample)
+        self.logger.info(
+            f"[{elapsed:.0f}s] {sample['documentsFinished']}/{len(self.expected_checks)} documents finished "
+            f"({sample['documentsFailed']} failed), "
+            f"backlog VALIDATE {statuses.get('VALIDATE:NOT_STARTED', 0)} REPORT {statuses.get('REPORT:NOT_STARTED', 0)}, "
+            f"in progress {statuses.get('VALIDATE:IN_PROGRESS', 0) + statuses.get('REPORT:IN_PROGRESS', 0)}, "
+            f"worker RSS {sum(v for v in rss.values() if v):.0f} MB"
+        )
+        return sample
+
+    def run(self, documents=1000, duration=600, arrival_rate=0.0, min_checks=1, max_checks=10,
+            validators=2, processors=2, workers=0, backends=None, poll_interval=1, sample_interval=10,
+            dedup=False, worker_log_level="WARNING"):
+        """
+        Seed the backlog, run the workers until every document is finished (or for
+        duration seconds when documents keep arriving) and build the report.
+        """
+        # Workers read their settings from the environment they are started with
+        os.environ.update({
+            "MONGO_URI": self.mongo_uri,
+            "MONGO_DB_NAME": self.db_name,
+            "DOCUMENT_DEDUP_ENABLED": "true" if dedup else "false",
+            "IMAGE_STORE_DIR": str(self.work_dir / "repository" / "processed_checks"),
+            "PAGE_CACHE_DIR": str(self.work_dir / "repository" / "page_cache"),
+            "LOG_LEVEL": worker_log_level
+        })
+        os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+        self.logger.info(f"Seeding {documents} documents with {min_checks}-{max_checks} checks each")
+        self.seed(documents, min_checks, max_checks)
+        started_at = datetime.now(timezone.utc)
+        start = time.monotonic()
+        self.start_workers(validators, processors, workers, backends, poll_interval)
+
+        arrived = 0
+        next_sample = start
+        try:
+            while True:
+                now = time.monotonic()
+                elapsed = now - start
+                if elapsed >= duration:
+                    break
+                # Soak runs keep documents arriving at a steady rate
+                due = int(arrival_rate * elapsed) - arrived
+                if due > 0:
+                    arrived += self.seed(due, min_checks, max_checks)
+                if now >= next_sample:
+                    sample = self.sample(elapsed)
+                    next_sample = now + sample_interval
+                    if not arrival_rate and sample["documentsFinished"] >= len(self.expected_checks):
+                        break
+                    if not any(process.is_alive() for process in self.processes):
+                        self.logger.error("All workers exited, stopping the load test")
+                        break
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.logger.info("Received interrupt signal, stopping the load test...")
+        finally:
+            self.stop_workers()
+
+        elapsed = time.monotonic() - start
+        self.sample(elapsed)
+        return self.report(started_at, elapsed)
+
+    def report(self, started_at, elapsed):
+        """
+        Summarize the run.
+
+        Returns:
+            dict: Outcomes with the failure rate of finished documents, end-to-end
+                and per-stage latency, throughput, duplicate processing and worker memory
+        """
+        tasks = list(self.task_collection.find({}, {
+            "type": 1, "status": 1, "documentId": 1, "parentTaskId": 1,
+            "createdAt": 1, "claimedAt": 1, "startedAt": 1, "finishedAt": 1
+        }))
+        submitted = {task["documentId"]: task["createdAt"] for task in tasks if task["type"] == "VALIDATE"}
+
+        outcomes = Counter()
+        end_to_end = []
+        waits, runs = {}, {}
+        for task in tasks:
+            if task.get("claimedAt"):
+                waits.setdefault(task["type"], []).append((task["claimedAt"] - task["createdAt"]).total_seconds())
+            if task.get("startedAt") and task.get("finishedAt"):
+                runs.setdefault(task["type"], []).append((task["finishedAt"] - task["startedAt"]).total_seconds())
+
+            if task["type"] == "REPORT" and not task.get("parentTaskId") and task["status"] in TERMINAL_STATUSES:
+                outcomes[f"REPORT {task['status']}"] += 1
+                if task.get("finishedAt") and task["documentId"] in submitted:
+                    end_to_end.append((task["finishedAt"] - submitted[task["documentId"]]).total_seconds())
+            elif task["type"] == "VALIDATE" and task["status"] in ("FAILED", "VALIDATION_FAILED"):
+                outcomes[f"VALIDATE {task['status']}"] += 1
+        unfinished = Counter(f"{task['type']} {task['status']}" for task in tasks if task["status"] not in TERMINAL_STATUSES)
+
+        # The same task processed more than once, and documents that got more checks than they contain
+        repeated = list(self.executions.aggregate([
+            {"$group": {"_id": "$taskId", "runs": {"$sum": 1}}},
+            {"$match": {"runs": {"$gt": 1}}}
+        ]))
+        stored = {row["_id"]: row["count"] for row in self.check_collection.aggregate([
+            {"$group": {"_id": "$documentId", "count": {"$sum": 1}}}
+        ])}
+        extra_checks = {
+            document_id: stored[document_id] - expected
+            for document_id, expected in self.expected_checks.items()
+            if stored.get(document_id, 0) > expected
+        }
+
+        finished = sum(outcomes.values())
+        failed = finished - outcomes["REPORT COMPLETED"]
+        checks = sum(stored.get(document_id, 0) for document_id in self.expected_checks)
+        minutes = max(elapsed / 60, 1e-9)
+        return {
+            "startedAt": started_at.isoformat(),
+            "elapsedSeconds": round(elapsed, 1),
+            "documentsSubmitted": len(self.expected_checks),
+            "documentsFinished": finished,
+            "documentsSucceeded": finished - failed,
+            "documentsFailed": failed,
+            "failureRate": round(failed / finished, 4) if finished else 0.0,
+            "outcomes": dict(outcomes),
+            "unfinishedTasks": dict(unfinished),
+            "throughput": {
+                "documentsPerMinute": round(finished / minutes, 2),
+                "checksPerMinute": round(checks / minutes, 2)
+            },
+            "endToEndSeconds": percentiles(end_to_end),
+            "stages": {
+                task_type: {"waitSeconds": percentiles(waits.get(task_type, [])),
+                            "processingSeconds": percentiles(runs.get(task_type, []))}
+                for task_type in sorted(set(waits) | set(runs))
+            },
+            "duplicates": {
+                "tasksProcessedMoreThanOnce": len(repeated),
+                "extraRuns": sum(row["runs"] - 1 for row in repeated),
+                "documentsWithExtraChecks": len(extra_checks),
+                "extraChecks": sum(extra_checks.values())
+            },
+            "memory": self.memory_summary(),
+            "samples": self.samples
+        }
+
+    def memory_summary(self):
+        """First, peak and last RSS per worker, and the growth rate between first and last sample"""
+        summary = {}
+        for process in self.processes:
+            series = [(s["elapsedSeconds"], s["workerRssMb"][process.name]) for s in self.samples
+                      if s["workerRssMb"].get(process.name) is not None]
+            if not series:
+                continue
+            (first_at, first), (last_at, last) = series[0], series[-1]
+            hours = (last_at - first_at) / 3600
+            summary[process.name] = {
+                "firstMb": first,
+                "peakMb": max(rss for _, rss in series),
+                "lastMb": last,
+                "growthMbPerHour": round((last - first) / hours, 1) if hours else 0.0
+            }
+        return summary
+
+def _fmt_latency(stats):
+    if not stats.get("count"):
+        return "-"
+    return f"p50 {stats['p50']:.2f}s  p95 {stats['p95']:.2f}s  p99 {stats['p99']:.2f}s  max {stats['max']:.2f}s"
+
+def print_report(report):
+    """Print a load test report as plain text"""
+    print(f"Load test: {report['documentsFinished']}/{report['documentsSubmitted']} documents finished "
+          f"in {report['elapsedSeconds']:.0f}s, {report['documentsSucceeded']} succeeded, "
+          f"{report['documentsFailed']} failed ({report['failureRate']:.1%})")
+    print(f"  Outcomes:      {report['outcomes'] or '-'}")
+    if report["unfinishedTasks"]:
+        print(f"  Unfinished:    {report['unfinishedTasks']}")
+    print(f"  Throughput:    {report['throughput']['documentsPerMinute']} documents/min, "
+          f"{report['throughput']['checksPerMinute']} checks/min")
+    print(f"  End to end:    {_fmt_latency(report['endToEndSeconds'])}")
+    for task_type, stage in report["stages"].items():
+        print(f"  {task_type} wait:".ljust(17) + _fmt_latency(stage["waitSeconds"]))
+        print(f"  {task_type} run:".ljust(17) + _fmt_latency(stage["processingSeconds"]))
+    duplicates = report["duplicates"]
+    print(f"  Duplicates:    {duplicates['tasksProcessedMoreThanOnce']} tasks processed more than once, "
+          f"{duplicates['extraChecks']} extra checks in {duplicates['documentsWithExtraChecks']} documents")
+    for name, memory in report["memory"].items():
+        print(f"  {name}:".ljust(17) + f"RSS {memory['firstMb']:.0f} -> {memory['lastMb']:.0f} MB "
+              f"(peak {memory['peakMb']:.0f} MB, {memory['growthMbPerHour']:+.1f} MB/h)")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='End-to-end load and soak test with stub OCR and LLM backends')
+    parser.add_argument('--documents', type=int, default=1000,
+                       help='Documents seeded before the workers start (default: 1000)')
+    parser.add_argument('--arrival-rate', type=float, default=0.0,
+                       help='Documents added per second while the test runs, for soak tests (default: 0)')
+    parser.add_argument('--duration', type=float, default=600,
+                       help='Maximum run time in seconds; without arrivals the test ends once every document '
+                            'is finished (default: 600)')
+    parser.add_argument('--min-checks', type=int, default=1,
+                       help='Fewest checks per synthetic document (default: 1)')
+    parser.add_argument('--max-checks', type=int, default=10,
+                       help='Most checks per synthetic document (default: 10)')
+    parser.add_argument('--validators', type=int, default=2,
+                       help='Validator processes (default: 2)')
+    parser.add_argument('--processors', type=int, default=2,
+                       help='Check processor processes (default: 2)')
+    parser.add_argument('--workers', type=int, default=0,
+                       help='Combined worker processes serving both queues (default: 0)')
+    parser.add_argument('--ocr-latency', type=float, default=0.3,
+                       help='Mean stub OCR latency in seconds (default: 0.3)')
+    parser.add_argument('--llm-latency', type=float, default=1.5,
+                       help='Mean stub LLM latency in seconds (default: 1.5)')
+    parser.add_argument('--jitter', type=float, default=0.3,
+                       help='Standard deviation of stub latencies as a fraction of the mean (default: 0.3)')
+    parser.add_argument('--ocr-error-rate', type=float, default=0.0,
+                       help='Share of stub OCR calls failing with a server error (default: 0)')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0,
+                       help='Share of stub LLM calls failing with a server error (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                       help='Share of stub OCR and LLM calls answered with a 429 (default: 0)')
+    parser.add_argument('--poll-interval', type=int, default=1,
+                       help='Worker polling interval in seconds (default: 1)')
+    parser.add_argument('--sample-interval', type=float, default=10,
+                       help='Seconds between progress and memory samples (default: 10)')
+    parser.add_argument('--dedup', action='store_true',
+                       help='Keep document deduplication on (off by default so every document is processed)')
+    parser.add_argument('--worker-log-level', default='WARNING',
+                       help='Log level of the worker processes (default: WARNING)')
+    parser.add_argument('--work-dir',
+                       help='Directory for synthetic PDFs and worker output (overrides LOAD_TEST_DIR, data/load_test)')
+    parser.add_argument('--reset', action='store_true',
+                       help='Drop the load test database and synthetic files from an earlier run first')
+    parser.add_argument('--max-failure-rate', type=float, default=0.01,
+                       help='Exit with status 1 when a larger share of finished documents failed (default: 0.01)')
+    parser.add_argument('--output',
+                       help='Also write the full report, including samples, to this JSON file')
+    parser.add_argument('--mongo-uri',
+                       help='MongoDB connection URI (overrides MONGO_URI env var)')
+    parser.add_argument('--db-name',
+                       help='Dedicated load test database (overrides LOAD_TEST_DB_NAME, vision_flow_load_test)')
+    args = parser.parse_args()
+
+    backends = {
+        "ocr": {"latency": args.ocr_latency, "jitter": args.jitter,
+                "error_rate": args.ocr_error_rate, "throttle_rate": args.throttle_rate},
+        "llm": {"latency": args.llm_latency, "jitter": args.jitter,
+                "error_rate": args.llm_error_rate, "throttle_rate": args.throttle_rate}
+    }
+    try:
+        load_test = LoadTest(args.mongo_uri, args.db_name, args.work_dir)
+        load_test.prepare(args.reset)
+        report = load_test.run(
+            documents=args.documents, duration=args.duration, arrival_rate=args.arrival_rate,
+            min_checks=args.min_checks, max_checks=args.max_checks,
+            validators=args.validators, processors=args.processors, workers=args.workers,
+            backends=backends, poll_interval=args.poll_interval, sample_interval=args.sample_interval,
+            dedup=args.dedup, worker_log_level=args.worker_log_level
+        )
+    except Exception as e:
+        logging.error(f"Load test failed: {str(e)}")
+        sys.exit(1)
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, default=str, indent=2)
+    print_report(report)
+
+    if report["failureRate"] > args.max_failure_rate:
+        logging.error(f"{report['documentsFailed']} of {report['documentsFinished']} documents failed, "
+                      f"above the allowed failure rate of {args.max_failure_rate:.1%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
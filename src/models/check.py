@@ -19,8 +19,8 @@ class CheckDetails(BaseModel):
     raw_text: str = Field(..., description="Raw text from the check")
     createdAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(), description="Creation date")
     updatedAt: Optional[datetime] = Field(default_factory=lambda: datetime.now(), description="Last update date")
-    front_path: Optional[str] = Field(None, description="Path to the check front image")
-    back_path: Optional[str] = Field(None, description="Path to the check back image")
+    front_path: Optional[str] = Field(None, description="Image store key of the check front image")
+    back_path: Optional[str] = Field(None, description="Image store key of the check back image")
 
     class Config:
         # Allow population by field name or alias
@@ -40,4 +40,36 @@ class CheckDetails(BaseModel):
         # If id exists and _id doesn't, set _id to id
         if 'id' in data and '_id' not in data:
             data['_id'] = data.pop('id')
-        return data
\ No newline at end of file
+        return data
+
+# Fields the LLM extracts from the OCR text, in prompt order
+EXTRACTION_FIELDS = [
+    "payee_name", "amount", "date", "check_number", "check_transit_number",
+    "check_institution_number", "check_bank_account_number", "bank", "company_name_address"
+]
+
+def extraction_response_format(fields=None):
+    """
+    Strict JSON-schema response_format for an extraction, derived from CheckDetails.
+
+    Args:
+        fields (list): Subset of EXTRACTION_FIELDS to ask for (defaults to all)
+    """
+    fields = fields or EXTRACTION_FIELDS
+    properties = {
+        name: {"type": "string", "description": CheckDetails.model_fields[name].description}
+        for name in fields
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "check_details",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(fields),
+                "additionalProperties": False
+            }
+        }
+    }
@@ -1,19 +1,34 @@
 import os
+import re
+import sys
+import time
 import uuid
-import cv2
+import threading
 import json
 import numpy as np
 import pandas as pd
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from google.cloud import vision
 from openai import OpenAI
 from dotenv import load_dotenv
 from pathlib import Path
 from utils.logger import setup_logger
 from utils.google_auth import setup_google_vision_auth
-from utils.image_analyzer import analyze_check_image
+from utils.image_analyzer import analyze_check_image, analyze_check_layout
+from utils.rate_limiter import get_rate_limiter
+from utils.hedging import get_hedged_caller
 from utils.path_utils import extract_document_id_from_path
-from models.check import CheckDetails
+from utils.mongo_utils import get_mongo_connection_settings
+from utils.page_cache import load_page_image
+from utils.page_analysis import PageFilter, BLANK_PAGE_RESULT, clean_check_image
+from utils.process_pool import get_page_pool
+from utils.image_store import ImageStore
+from utils.check_layout import roi_ocr_enabled, crop_to_content, region_text
+from utils.pipeline import Pipeline, Stage
+from utils.usage import record_usage
+from utils.model_router import ModelRouter
+from utils.steps import run_steps
+from models.check import CheckDetails, EXTRACTION_FIELDS, extraction_response_format
 
 # Load environment variables
 load_dotenv()
@@ -21,8 +36,268 @@ load_dotenv()
 # Setup logger
 logger = setup_logger()
 
+# Output token budgets for a check extraction and for a repair of a few fields
+EXTRACTION_MAX_TOKENS = 300
+REPAIR_MAX_TOKENS = 120
+
+NOT_FOUND = "Not Found"
+
+# Expected shape of extracted values; fields not listed only need to be non-empty
+FIELD_PATTERNS = {
+    "amount": re.compile(r"^\$?\d{1,3}(,?\d{3})*\.\d{2}$"),
+    "date": re.compile(r"^\d{2}/\d{2}/\d{4}$"),
+    "check_number": re.compile(r"^\d+$"),
+    "check_transit_number": re.compile(r"^\d+$"),
+    "check_institution_number": re.compile(r"^\d+$"),
+    "check_bank_account_number": re.compile(r"^[\d\- ]+$"),
+}
+
+# Where the CSV export is written (check images go to the ImageStore, IMAGE_STORE_DIR)
+PROCESSED_CHECKS_CSV = Path("data/processed_checks.csv")
+
+def build_extraction_messages(front_text, back_text=None):
+    """Build the chat messages asking the LLM to extract check fields from OCR text"""
+    # Clean up the text for the prompt
+    front_text_cleaned = front_text.replace('\n', ' ').replace('"', '\\"')
+    back_text_cleaned = back_text.replace('\n', ' ').replace('"', '\\"') if back_text else ""
+
+    prompt = (
+        "Extract the following fields from the provided check text. For each field, follow the specific extraction rules and return the result in a JSON object with these exact keys:\n\n"
+        '{"payee_name": "", "amount": "", "date": "", "check_number": "", "check_transit_number": "", "check_institution_number": "", "check_bank_account_number": "", "bank": "", "company_name_address": ""}'
+        "\n\n"
+        "Check Text:\n"
+        f"{front_text_cleaned}\n"
+        f"{back_text_cleaned}\n"
+        "\n\nExtraction Rules:\n"
+        "1. payee_name\n"
+        "   - The payee is the person or business being paid.\n"
+        "   - Look for the line(s) immediately following 'PAY TO THE ORDER OF' or 'PAY to the order of'.\n"
+        "   - If there are multiple lines (e.g., a numbered company and a service name), the payee is the last name or business before the address or amount.\n"
+        "   - If you see a numbered company (like '1894837 ONTARIO INC') followed by a service name (like 'ERIKA DIAZ SERVICE'), the service name is the payee.\n"
+        "   - Ignore lines that look like addresses, phone numbers, or company registration numbers.\n"
+        "   - Example:\n"
+        "     PAY to the order of\n"
+        "     1894837 ONTARIO INC\n"
+        "     523 GARDENVIEW SQUARE\n"
+        "     PICKERING ONTARIO L1V4R7\n"
+        "     T: 647 298 4145\n"
+        "     ERIKA DIAZ SERVICE\n"
+        "     payee_name: ERIKA DIAZ SERVICE\n"
+        "2. amount\n"
+        "   - Extract the amount in dollars and cents, e.g., '$1,234.56'.\n"
+        "   - Prefer the numeric value if both words and numbers are present.\n"
+        "   - Ignore any non-amount numbers.\n"
+        "   - Example: '$550.00'\n"
+        "3. date\n"
+        "   - Extract the date in DD/MM/YYYY format.\n"
+        "   - If a date format indicator is present (e.g., YYYYMMDD, MMDDYYYY), use it to interpret the date.\n"
+        "   - Example: '31/10/2024'\n"
+        "4. check_number\n"
+        "   - Extract from the MICR line, between the first pair of ⑈ symbols.\n"
+        "   - Example: '004921'\n"
+        "5. check_transit_number\n"
+        "   - Extract from the MICR line, between ⑆ and ⑉ symbols.\n"
+        "   - Example: '06222'\n"
+        "6. check_institution_number\n"
+        "   - Extract from the MICR line, between ⑉ and ⑆ symbols.\n"
+        "   - Example: '003'\n"
+        "7. check_bank_account_number\n"
+        "   - Extract from the MICR line, after the last ⑆, may contain ⑉ symbols (e.g., '102-813-3').\n"
+        "   - Example: '102-813-3'\n"
+        "8. bank\n"
+        "   - Extract the complete bank name and branch information.\n"
+        "   - Example: 'RBC ROYAL BANK 972 BLOOR STREET WEST TORONTO, ONTARIO M6H 1L6'\n"
+        "9. company_name_address\n"
+        "   - Extract the full company name, address, and contact information if available.\n"
+        "   - This is typically the detailed business information that follows the payee name.\n"
+        "   - Example: '523 GARDENVIEW SQUARE PICKERING ONTARIO L1V4R7 T: 647 298 4145'\n"
+        "\nSpecial Instructions:\n"
+        "- If a field is missing, return 'Not Found'.\n"
+        "- Do not include any line breaks in the field values; replace them with spaces.\n"
+        "- Return ONLY the JSON object, with no extra formatting or explanation.\n"
+        "\nReturn Format:\n"
+        "Return only the JSON object, e.g.:\n"
+        '{"payee_name": "ERIKA DIAZ SERVICE", "amount": "$550.00", "date": "31/10/2024", "check_number": "004921", "check_transit_number": "06222", "check_institution_number": "003", "check_bank_account_number": "102-813-3", "bank": "RBC ROYAL BANK 972 BLOOR STREET WEST TORONTO, ONTARIO M6H 1L6", "company_name_address": "523 GARDENVIEW SQUARE PICKERING ONTARIO L1V4R7 T: 647 298 4145"}'
+    )
+
+    return [
+        {"role": "system", "content": "You are a precise check parser that returns ONLY raw JSON objects. Never use markdown formatting or code blocks. Your response must start with { and end with } with no other characters."},
+        {"role": "user", "content": prompt}
+    ]
+
+def build_extraction_request(front_text, back_text, model):
+    """Chat completion request body for a check extraction, as sent in a batch file"""
+    return {
+        "model": model,
+        "messages": build_extraction_messages(front_text, back_text),
+        "temperature": 0.0,
+        "max_tokens": EXTRACTION_MAX_TOKENS,
+        "response_format": extraction_response_format()
+    }
+
+def build_repair_messages(front_text, back_text, fields, invalid_fields):
+    """Build a short follow-up asking the LLM to re-extract only the invalid fields"""
+    current = {name: fields.get(name) for name in invalid_fields}
+    rules = {
+        "amount": "dollars and cents, e.g. '$1,234.56'",
+        "date": "DD/MM/YYYY",
+        "check_number": "digits only",
+        "check_transit_number": "digits only",
+        "check_institution_number": "digits only",
+        "check_bank_account_number": "digits and dashes, e.g. '102-813-3'",
+    }
+    expected = "\n".join(f"- {name}: {rules.get(name, 'non-empty text')}" for name in invalid_fields)
+    front_text_cleaned = front_text.replace('\n', ' ')
+    back_text_cleaned = back_text.replace('\n', ' ') if back_text else ""
+    prompt = (
+        "These fields extracted from a check are missing or badly formatted:\n"
+        f"{json.dumps(current)}\n\n"
+        f"Expected formats:\n{expected}\n\n"
+        "Check Text:\n"
+        f"{front_text_cleaned}\n"
+        f"{back_text_cleaned}\n\n"
+        f"Return a JSON object with only these keys. If a field is missing, return '{NOT_FOUND}'."
+    )
+    return [
+        {"role": "system", "content": "You are a precise check parser that returns ONLY raw JSON objects."},
+        {"role": "user", "content": prompt}
+    ]
+
+def load_extraction_fields(response_content):
+    """Decode an LLM answer into a dict of fields, or an empty dict when it is not a JSON object"""
+    try:
+        response_text = (response_content or "").strip()
+        # Remove any markdown formatting if present
+        if response_text.startswith("```"):
+            response_text = response_text.split("```")[1]
+            if response_text.startswith("json"):
+                response_text = response_text[4:]
+        fields = json.loads(response_text.strip())
+    except (json.JSONDecodeError, IndexError) as e:
+        logger.error(f"JSON parsing error: {str(e)}")
+        logger.error(f"Raw response: {response_content}")
+        return {}
+    return fields if isinstance(fields, dict) else {}
+
+def find_invalid_fields(fields):
+    """Names of extraction fields that are missing, empty or do not match their expected format"""
+    invalid = []
+    for name in EXTRACTION_FIELDS:
+        value = fields.get(name)
+        if not isinstance(value, str) or not value.strip():
+            invalid.append(name)
+        elif value != NOT_FOUND and name in FIELD_PATTERNS and not FIELD_PATTERNS[name].match(value.strip()):
+            invalid.append(name)
+    return invalid
+
+def merge_repaired_fields(fields, response_content, invalid_fields):
+    """Overlay the fields returned by a repair request onto the original answer"""
+    repaired = load_extraction_fields(response_content)
+    merged = dict(fields)
+    for name in invalid_fields:
+        if name in repaired:
+            merged[name] = repaired[name]
+    return merged
+
+def build_check_details(fields, front_text, back_text=None, front_raw_text=None):
+    """
+    Build a CheckDetails from extracted fields.
+
+    Missing or non-text values fall back to 'Not Found' so one bad field never
+    fails the whole check; badly formatted text is kept and logged. raw_text
+    keeps the whole-page front text when extraction read only its key regions.
+    """
+    combined_text = (front_raw_text or front_text) + ("\n" + back_text if back_text else "")
+    values = {}
+    for name in EXTRACTION_FIELDS:
+        value = fields.get(name)
+        values[name] = value.strip() if isinstance(value, str) and value.strip() else NOT_FOUND
+    still_invalid = find_invalid_fields(values)
+    if still_invalid:
+        logger.warning(f"Keeping badly formatted check fields: {', '.join(still_invalid)}")
+    return CheckDetails(**values, raw_text=combined_text)
+
+def estimate_request_tokens(messages, max_tokens):
+    """Rough token cost of a chat request (about 4 characters per token) for rate limiting"""
+    return sum(len(m["content"]) for m in messages) // 4 + max_tokens
+
+def record_completion_usage(response, seconds, fast=False):
+    """Count one returned chat completion and its token usage for the current task"""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    if fast:
+        record_usage(llmRequests=1, fastPromptTokens=prompt_tokens, fastCompletionTokens=completion_tokens,
+                     llmSeconds=seconds)
+    else:
+        record_usage(llmRequests=1, promptTokens=prompt_tokens, completionTokens=completion_tokens,
+                     llmSeconds=seconds)
+
+def extraction_steps(model_router, front_text, back_text=None, front_raw_text=None):
+    """
+    Steps of a check extraction, for utils.steps.run_steps(): the routed request,
+    an escalation to the primary model when the fast model's answer fails
+    validation, and one repair request for fields that are still invalid.
+
+    Returns:
+        CheckDetails: The extracted check
+    """
+    messages = build_extraction_messages(front_text, back_text)
+    model, score = model_router.choose(front_text)
+    response = yield "create_chat_completion", (messages,), {
+        "model": model, "response_format": extraction_response_format()
+    }
+    fields = load_extraction_fields(response.choices[0].message.content)
+    invalid_fields = find_invalid_fields(fields)
+
+    if model == model_router.fast_model:
+        reason = model_router.escalation_reason(fields, invalid_fields, front_text, NOT_FOUND)
+        model_router.record(model, escalated=reason is not None)
+        if reason:
+            logger.info(f"Escalating check extraction (OCR score {score:.2f}) to {model_router.primary_model}: {reason}")
+            response = yield "create_chat_completion", (messages,), {"response_format": extraction_response_format()}
+            fields = load_extraction_fields(response.choices[0].message.content)
+            invalid_fields = find_invalid_fields(fields)
+    else:
+        model_router.record(model)
+
+    if invalid_fields:
+        logger.info(f"Repairing check fields: {', '.join(invalid_fields)}")
+        try:
+            repair = yield "create_chat_completion", (build_repair_messages(front_text, back_text, fields, invalid_fields),), {
+                "max_tokens": REPAIR_MAX_TOKENS,
+                "response_format": extraction_response_format(invalid_fields)
+            }
+            fields = merge_repaired_fields(fields, repair.choices[0].message.content, invalid_fields)
+        except Exception as e:
+            logger.warning(f"Repair request failed, falling back to '{NOT_FOUND}': {str(e)}")
+
+    return build_check_details(fields, front_text, back_text, front_raw_text)
+
+def parse_extraction_response(response_content, front_text, back_text=None, front_raw_text=None):
+    """Parse the LLM JSON answer into a CheckDetails object, without a repair round trip"""
+    return build_check_details(load_extraction_fields(response_content), front_text, back_text, front_raw_text)
+
 class CheckProcessor:
-    def __init__(self):
+    def __init__(self, page_cache=None, use_page_pool=True):
+        # Optional PageCache filled by the VALIDATE stage
+        self.page_cache = page_cache
+        # Optional process pool for image cleaning (CPU_POOL_ENABLED)
+        self.page_pool = get_page_pool() if use_page_pool else None
+        self._init_clients()
+
+        # Per-call deadlines and optional hedging against slow responses
+        self.vision_hedger = get_hedged_caller("vision", default_timeout=30.0)
+        self.openai_hedger = get_hedged_caller("openai", default_timeout=60.0)
+        # Give the LLM only the text of a check front's key regions
+        self.roi_ocr = roi_ocr_enabled()
+        # Send checks with clean OCR text to a smaller model
+        self.model_router = ModelRouter()
+        
+        self._init_storage()
+
+    def _init_clients(self):
+        """Create the Vision, OpenAI and MongoDB clients and the rate limiters"""
         # Initialize Google Vision client with proper authentication
         try:
             self.vision_client = setup_google_vision_auth()
@@ -38,7 +313,8 @@ class CheckProcessor:
         
         # Initialize OpenAI client
         try:
-            self.openai_client = OpenAI(api_key=api_key)
+            # Throttling is retried by our rate limiter, which needs to see the 429s
+            self.openai_client = OpenAI(api_key=api_key, max_retries=0)
             logger.info("OpenAI client initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {str(e)}")
@@ -47,24 +323,8 @@ class CheckProcessor:
         # Initialize MongoDB connection
         try:
             from pymongo import MongoClient
-            mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-            db_name = os.getenv('MONGO_DB_NAME', 'pan-ocr')
-            
-            # Handle authentication if credentials are provided
-            mongo_username = os.getenv('MONGO_USERNAME')
-            mongo_password = os.getenv('MONGO_PASSWORD')
-            mongo_password_file = os.getenv('MONGO_PASSWORD_FILE')
-            if mongo_password_file and os.path.exists(mongo_password_file):
-                with open(mongo_password_file, 'r') as f:
-                    mongo_password = f.read().strip()
-            
-            if mongo_username and mongo_password:
-                # Create authenticated connection string
-                from urllib.parse import quote_plus
-                auth_uri = mongo_uri.replace('mongodb://', f'mongodb://{quote_plus(mongo_username)}:{quote_plus(mongo_password)}@')+db_name
-                self.client = MongoClient(auth_uri)
-            else:
-                self.client = MongoClient(mongo_uri)
+            connection_uri, mongo_uri, db_name = get_mongo_connection_settings()
+            self.client = MongoClient(connection_uri)
                 
             self.db = self.client[db_name]
             self.check_collection = self.db['check']
@@ -77,11 +337,16 @@ class CheckProcessor:
             logger.error(f"Failed to initialize MongoDB connection: {str(e)}")
             raise
         
-        self.checks_dir = Path("repository/processed_checks")
-        self.csv_file = Path("data/processed_checks.csv")
-        
-        # Create directories if they don't exist
-        self.checks_dir.mkdir(parents=True, exist_ok=True)
+        # Process-wide limiters shared by all pipeline threads (and workers, via RATE_LIMIT_SHARED)
+        self.vision_limiter = get_rate_limiter("vision", self.db)
+        self.openai_limiter = get_rate_limiter("openai", self.db)
+
+    def _init_storage(self):
+        """Set up the processed check image store and CSV output"""
+        self.image_store = ImageStore()
+        self.checks_dir = self.image_store.root
+        self.csv_file = PROCESSED_CHECKS_CSV
+        self._csv_lock = threading.Lock()
         
         # Initialize CSV if it doesn't exist
         if not self.csv_file.exists():
@@ -105,90 +370,206 @@ class CheckProcessor:
         ]
         pd.DataFrame(columns=headers).to_csv(self.csv_file, index=False)
 
-    def extract_images_from_pdf(self, pdf_path):
-        """Extract images from PDF and determine front/back for each check"""
-        logger.info(f"Converting PDF to images: {pdf_path}")
-        images = convert_from_path(pdf_path)
-        
-        # Process images in pairs
-        check_images = []
-        for i in range(0, len(images), 2):
-            if i + 1 < len(images):
-                # testing logic for a single image
-                # if i > 3:
-                #     break
-                # Analyze both images to determine which is front/back
-                first_image = images[i]
-                second_image = images[i + 1]
-                
-                # Get text from both images in one pass
-                is_first_front, first_text = analyze_check_image(first_image, self.vision_client)
-                is_second_front, second_text = analyze_check_image(second_image, self.vision_client)
-                
-                if is_first_front:
-                    check_pair = {
-                        'front': first_image,
-                        'back': second_image,
-                        'front_text': first_text,
-                        'back_text': second_text
-                    }
-                    logger.info(f"Check {len(check_images)+1}: First page is front")
-                else:
-                    check_pair = {
-                        'front': second_image,
-                        'back': first_image,
-                        'front_text': second_text,
-                        'back_text': first_text
-                    }
-                    logger.info(f"Check {len(check_images)+1}: Second page is front")
+    def iter_page_pairs(self, pdf_path, document_id=None, page_range=None):
+        """
+        Lazily yield the pages of a PDF two at a time.
+
+        Pages come from the page cache when the VALIDATE stage filled it, otherwise
+        each pair is rendered on demand so later stages can start before the whole
+        document has been rasterized.
+
+        Args:
+            page_range (tuple): Optional 1-based inclusive (first_page, last_page) to restrict to;
+                first_page must be odd so pairs stay aligned with the whole document
+
+        Returns:
+            tuple: (page_count of the whole PDF, iterator of (pair_index, first_image, second_image_or_None))
+        """
+        page_paths = None
+        if self.page_cache is not None and document_id:
+            page_paths = self.page_cache.get_page_paths(pdf_path, document_id)
+
+        if page_paths is not None:
+            logger.info(f"Using {len(page_paths)} cached pages for document {document_id}")
+            page_count = len(page_paths)
+
+            def load_pages(first_page, last_page):
+                # Keep the entry pinned against eviction by other workers while it is read
+                self.page_cache.mark_in_use(page_paths)
+                try:
+                    pages = [load_page_image(p) for p in page_paths[first_page - 1:last_page]]
+                except FileNotFoundError:
+                    logger.warning(f"Cached pages of document {document_id} were evicted, rendering pages "
+                                   f"{first_page}-{last_page} instead")
+                    return convert_from_path(pdf_path, first_page=first_page, last_page=last_page)
+                record_usage(pageCacheHits=len(pages))
+                return pages
+        else:
+            logger.info(f"Converting PDF to images: {pdf_path}")
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+
+            def load_pages(first_page, last_page):
+                return convert_from_path(pdf_path, first_page=first_page, last_page=last_page)
+
+        range_start, range_end = page_range or (1, page_count)
+        range_end = min(range_end, page_count)
+
+        def pairs():
+            for first_page in range(range_start, range_end + 1, 2):
+                pages = load_pages(first_page, min(first_page + 1, range_end))
+                yield (first_page - 1) // 2, pages[0], pages[1] if len(pages) > 1 else None
+
+        return page_count, pairs()
+
+    def analyze_page(self, image):
+        """
+        OCR one page with a single Vision request.
+
+        Returns:
+            tuple: (is_front, text, region_text); with ROI OCR, region_text is the text
+            of the key check regions, found from the block positions of the same response
+        """
+        if not self.roi_ocr:
+            is_front, text = self.ocr_image(image)
+            return is_front, text, None
+        page = crop_to_content(image)
+        is_front, text, blocks = self.ocr_image(page, analyze_check_layout)
+        return is_front, text, region_text(blocks, page.width, page.height)
+
+    def ocr_image(self, image, analyze=analyze_check_image):
+        """OCR one image with rate limiting, a deadline and optional hedging"""
+        start = time.monotonic()
+        try:
+            return self.vision_limiter.call_hedged(
+                self.vision_hedger, analyze, image, self.vision_client,
+                timeout=self.vision_hedger.timeout
+            )
+        finally:
+            record_usage(ocrSeconds=time.monotonic() - start)
+
+    def ocr_page(self, image, page_filter=None):
+        """OCR one page, skipping blank pages and reusing results of duplicate pages"""
+        if page_filter is None:
+            return self.analyze_page(image)
+        fingerprint, reused = page_filter.inspect(image)
+        if reused is not None:
+            if reused is not BLANK_PAGE_RESULT:
+                record_usage(ocrCacheHits=1)
+            return reused
+        result = self.analyze_page(image)
+        page_filter.remember(fingerprint, result)
+        return result
+
+    def create_chat_completion(self, messages, model=None, max_tokens=EXTRACTION_MAX_TOKENS, **kwargs):
+        """Send a chat completion with rate limiting, a deadline and optional hedging"""
+        model = model or self.model_router.primary_model
+        start = time.monotonic()
+        response = self.openai_limiter.call_hedged(
+            self.openai_hedger,
+            self.openai_client.chat.completions.create,
+            model=model,
+            messages=messages,
+            temperature=0.0,
+            max_tokens=max_tokens,
+            timeout=self.openai_hedger.timeout,
+            token_cost=estimate_request_tokens(messages, max_tokens),
+            token_usage=lambda r: r.usage.total_tokens,
+            **kwargs
+        )
+        record_completion_usage(response, time.monotonic() - start, model == self.model_router.fast_model)
+        return response
+
+    def pair_check_images(self, first_image, second_image, check_number, page_filter=None):
+        """OCR a pair of pages and decide which one is the check front (None for a blank sheet)"""
+        if second_image is not None:
+            # Get text from both images in one pass
+            first_result = self.ocr_page(first_image, page_filter)
+            second_result = self.ocr_page(second_image, page_filter)
+            if first_result is BLANK_PAGE_RESULT and second_result is BLANK_PAGE_RESULT:
+                logger.debug("Check %s: Both pages are blank, skipping", check_number)
+                return None
+            is_first_front, first_text, first_regions = first_result
+            _, second_text, second_regions = second_result
+            
+            if is_first_front:
+                check_pair = {
+                    'front': first_image,
+                    'back': second_image,
+                    'front_text': first_regions or first_text,
+                    'front_raw_text': first_text,
+                    'back_text': second_text
+                }
+                logger.debug("Check %s: First page is front", check_number)
             else:
-                # Handle unpaired page
-                single_image = images[i]
-                is_front, text = analyze_check_image(single_image, self.vision_client)
                 check_pair = {
-                    'front': single_image,
-                    'back': None,
-                    'front_text': text,
-                    'back_text': None
+                    'front': second_image,
+                    'back': first_image,
+                    'front_text': second_regions or second_text,
+                    'front_raw_text': second_text,
+                    'back_text': first_text
                 }
-                if is_front:
-                    logger.info(f"Check {len(check_images)+1}: Single page identified as front")
-                else:
-                    logger.warning(f"Check {len(check_images)+1}: Single page appears to be a back - might miss front information")
-            
-            check_images.append(check_pair)
+                logger.debug("Check %s: Second page is front", check_number)
+        else:
+            # Handle unpaired page
+            result = self.ocr_page(first_image, page_filter)
+            if result is BLANK_PAGE_RESULT:
+                logger.debug("Check %s: Single page is blank, skipping", check_number)
+                return None
+            is_front, text, regions = result
+            check_pair = {
+                'front': first_image,
+                'back': None,
+                'front_text': regions or text,
+                'front_raw_text': text,
+                'back_text': None
+            }
+            if is_front:
+                logger.debug("Check %s: Single page identified as front", check_number)
+            else:
+                logger.warning("Check %s: Single page appears to be a back - might miss front information", check_number)
+        
+        return check_pair
+
+    def extract_images_from_pdf(self, pdf_path, document_id=None):
+        """Extract images from PDF and determine front/back for each check"""
+        _, page_pairs = self.iter_page_pairs(pdf_path, document_id)
+        page_filter = PageFilter.from_env()
+        
+        check_images = [
+            self.pair_check_images(first_image, second_image, pair_index + 1, page_filter)
+            for pair_index, first_image, second_image in page_pairs
+        ]
+        check_images = [check_pair for check_pair in check_images if check_pair is not None]
         
         logger.info(f"Found {len(check_images)} checks in PDF")
         return check_images
 
     def clean_image(self, image):
-        """Clean and enhance the check image"""
-        # Convert PIL Image to OpenCV format
-        opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        
-        # Apply basic image processing
-        gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
-        denoised = cv2.fastNlMeansDenoising(gray)
-        _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        
-        return binary
+        """Clean and enhance the check image, in the page pool when one is configured"""
+        page = np.asarray(image.convert('RGB'))
+        if self.page_pool is not None:
+            return self.page_pool.run(clean_check_image, page)
+        return clean_check_image(page)
 
-    def save_check_image(self, front_image, back_image, check_id):
-        """Save both front and back images of the check"""
-        check_dir = self.checks_dir / check_id
-        check_dir.mkdir(exist_ok=True)
-        
-        # Save front image
-        front_path = check_dir / "front.png"
-        cv2.imwrite(str(front_path), front_image)
-        
-        # Save back image if available
-        back_path = None
-        if back_image is not None:
-            back_path = check_dir / "back.png"
-            cv2.imwrite(str(back_path), back_image)
-        
-        return front_path, back_path
+    def save_check_image(self, front_image, back_image, check_id, pack=None):
+        """
+        Save both front and back images of the check in the image store.
+
+        Returns:
+            tuple: (front_key, back_key_or_None) store keys, see ImageStore
+        """
+        front_key = self.image_store.put(front_image, pack)
+        back_key = self.image_store.put(back_image, pack) if back_image is not None else None
+        logger.debug("Stored images of check %s: %s, %s", check_id, front_key, back_key)
+        return front_key, back_key
+
+    def open_image_pack(self, document_id, page_range=None):
+        """Pack writer for one document (or page-range subtask), or None when packing is off"""
+        if not self.image_store.pack_enabled:
+            return None
+        # Subtasks of one document may run on different workers, so each gets its own pack
+        name = f"{document_id}-p{page_range[0]}-{page_range[1]}" if page_range else str(document_id)
+        return self.image_store.open_pack(name)
 
     def extract_text_from_image(self, image_path):
         """Extract text from image using Google Vision API"""
@@ -199,107 +580,16 @@ class CheckProcessor:
         response = self.vision_client.text_detection(image=image)
         return response.text_annotations[0].description if response.text_annotations else ""
 
-    def parse_check_details(self, front_text, back_text=None):
-        """Parse check details using ChatGPT and return a validated CheckDetails object"""        
-        # Clean up the text for the prompt
-        front_text_cleaned = front_text.replace('\n', ' ').replace('"', '\\"')
-        back_text_cleaned = back_text.replace('\n', ' ').replace('"', '\\"') if back_text else ""
-
-        # Combine front and back text for raw_text field
-        combined_text = front_text + ("\n" + back_text if back_text else "")
-   
-        prompt = (
-            "Extract the following fields from the provided check text. For each field, follow the specific extraction rules and return the result in a JSON object with these exact keys:\n\n"
-            '{"payee_name": "", "amount": "", "date": "", "check_number": "", "check_transit_number": "", "check_institution_number": "", "check_bank_account_number": "", "bank": "", "company_name_address": ""}'
-            "\n\n"
-            "Check Text:\n"
-            f"{front_text_cleaned}\n"
-            f"{back_text_cleaned}\n"
-            "\n\nExtraction Rules:\n"
-            "1. payee_name\n"
-            "   - The payee is the person or business being paid.\n"
-            "   - Look for the line(s) immediately following 'PAY TO THE ORDER OF' or 'PAY to the order of'.\n"
-            "   - If there are multiple lines (e.g., a numbered company and a service name), the payee is the last name or business before the address or amount.\n"
-            "   - If you see a numbered company (like '1894837 ONTARIO INC') followed by a service name (like 'ERIKA DIAZ SERVICE'), the service name is the payee.\n"
-            "   - Ignore lines that look like addresses, phone numbers, or company registration numbers.\n"
-            "   - Example:\n"
-            "     PAY to the order of\n"
-            "     1894837 ONTARIO INC\n"
-            "     523 GARDENVIEW SQUARE\n"
-            "     PICKERING ONTARIO L1V4R7\n"
-            "     T: 647 298 4145\n"
-            "     ERIKA DIAZ SERVICE\n"
-            "     payee_name: ERIKA DIAZ SERVICE\n"
-            "2. amount\n"
-            "   - Extract the amount in dollars and cents, e.g., '$1,234.56'.\n"
-            "   - Prefer the numeric value if both words and numbers are present.\n"
-            "   - Ignore any non-amount numbers.\n"
-            "   - Example: '$550.00'\n"
-            "3. date\n"
-            "   - Extract the date in DD/MM/YYYY format.\n"
-            "   - If a date format indicator is present (e.g., YYYYMMDD, MMDDYYYY), use it to interpret the date.\n"
-            "   - Example: '31/10/2024'\n"
-            "4. check_number\n"
-            "   - Extract from the MICR line, between the first pair of ⑈ symbols.\n"
-            "   - Example: '004921'\n"
-            "5. check_transit_number\n"
-            "   - Extract from the MICR line, between ⑆ and ⑉ symbols.\n"
-            "   - Example: '06222'\n"
-            "6. check_institution_number\n"
-            "   - Extract from the MICR line, between ⑉ and ⑆ symbols.\n"
-            "   - Example: '003'\n"
-            "7. check_bank_account_number\n"
-            "   - Extract from the MICR line, after the last ⑆, may contain ⑉ symbols (e.g., '102-813-3').\n"
-            "   - Example: '102-813-3'\n"
-            "8. bank\n"
-            "   - Extract the complete bank name and branch information.\n"
-            "   - Example: 'RBC ROYAL BANK 972 BLOOR STREET WEST TORONTO, ONTARIO M6H 1L6'\n"
-            "9. company_name_address\n"
-            "   - Extract the full company name, address, and contact information if available.\n"
-            "   - This is typically the detailed business information that follows the payee name.\n"
-            "   - Example: '523 GARDENVIEW SQUARE PICKERING ONTARIO L1V4R7 T: 647 298 4145'\n"
-            "\nSpecial Instructions:\n"
-            "- If a field is missing, return 'Not Found'.\n"
-            "- Do not include any line breaks in the field values; replace them with spaces.\n"
-            "- Return ONLY the JSON object, with no extra formatting or explanation.\n"
-            "\nReturn Format:\n"
-            "Return only the JSON object, e.g.:\n"
-            '{"payee_name": "ERIKA DIAZ SERVICE", "amount": "$550.00", "date": "31/10/2024", "check_number": "004921", "check_transit_number": "06222", "check_institution_number": "003", "check_bank_account_number": "102-813-3", "bank": "RBC ROYAL BANK 972 BLOOR STREET WEST TORONTO, ONTARIO M6H 1L6", "company_name_address": "523 GARDENVIEW SQUARE PICKERING ONTARIO L1V4R7 T: 647 298 4145"}'
-        )
+    def parse_check_details(self, front_text, back_text=None, front_raw_text=None):
+        """
+        Parse check details using ChatGPT and return a validated CheckDetails object.
 
-        response = self.openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a precise check parser that returns ONLY raw JSON objects. Never use markdown formatting or code blocks. Your response must start with { and end with } with no other characters."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.0,
-            max_tokens=300
-        )
-        
-        try:
-            response_text = response.choices[0].message.content.strip()
-            # Remove any markdown formatting if present
-            if response_text.startswith("```"):
-                response_text = response_text.split("```")[1]
-                if response_text.startswith("json"):
-                    response_text = response_text[4:]
-            response_text = response_text.strip()
-            
-            # Parse the JSON response
-            json_response = json.loads(response_text)
-            # Add the raw text to the response
-            json_response['raw_text'] = combined_text
-            # Create and validate CheckDetails object
-            check_details = CheckDetails(**json_response)
-            return check_details
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing error: {str(e)}")
-            logger.error(f"Raw response: {response.choices[0].message.content}")
-            raise
-        except Exception as e:
-            logger.error(f"Failed to parse check details: {str(e)}")
-            raise
+        The answer is constrained to the CheckDetails JSON schema; fields that still
+        come back invalid get one small repair request instead of failing the check.
+        Checks with clean OCR text may go to the fast model first, and are re-extracted
+        with the primary model when its answer fails validation (see extraction_steps).
+        """
+        return run_steps(self, extraction_steps(self.model_router, front_text, back_text, front_raw_text))
 
     def add_to_csv(self, check_id: str, check_details: CheckDetails):
         """Add processed check details to CSV file"""
@@ -307,44 +597,120 @@ class CheckProcessor:
             "check_id": check_id,
             **check_details.model_dump()  # Use model_dump() instead of dict()
         }])
-        df.to_csv(self.csv_file, mode='a', header=False, index=False)
+        with self._csv_lock:
+            df.to_csv(self.csv_file, mode='a', header=False, index=False)
 
-    def process_pdf(self, pdf_path):
-        """Main function to process PDF containing checks"""
+    def defer_extraction(self, batch_writer, check_id, document_id, check_pair, front_path, back_path):
+        """Queue a check's extraction request for offline batch extraction instead of calling the LLM"""
+        # A batch answer cannot be escalated, so it always goes to the primary model
+        batch_writer.add(
+            check_id,
+            build_extraction_request(check_pair['front_text'], check_pair['back_text'],
+                                     self.model_router.primary_model),
+            {
+                "documentId": document_id,
+                "front_path": str(front_path) if front_path else None,
+                "back_path": str(back_path) if back_path else None,
+                "front_text": check_pair['front_text'],
+                "front_raw_text": check_pair['front_raw_text'],
+                "back_text": check_pair['back_text']
+            }
+        )
+
+    def process_pdf(self, pdf_path, page_range=None, stats=None, batch_writer=None, on_check=None):
+        """
+        Main function to process PDF containing checks
+
+        Args:
+            pdf_path (str): Path to the PDF file
+            page_range (tuple): Optional 1-based inclusive (first_page, last_page) to process
+            stats (dict): Optional dict filled with processing statistics (e.g. numberOfChecks,
+                blankPagesSkipped, duplicatePagesReused)
+            batch_writer (BatchRequestWriter): When set, LLM extraction is deferred to a batch file
+                and checks are persisted later by batch_ingest.py
+            on_check (callable): Called with each CheckDetails right after it is persisted, and
+                with None for a page pair that produced no check (blank sheet)
+        """
+        stats = stats if stats is not None else {}
         try:
             document_id = extract_document_id_from_path(pdf_path)
-            # Extract images from PDF
-            check_images = self.extract_images_from_pdf(pdf_path)
-            logger.info(f"Found {len(check_images)} checks in PDF")
+            page_count, page_pairs = self.iter_page_pairs(pdf_path, document_id, page_range)
+            total_checks = (page_count + 1) // 2
+            logger.info(f"Found {total_checks} checks in PDF")
+            if page_range:
+                logger.info(f"Processing pages {page_range[0]}-{page_range[1]}")
+            page_filter = PageFilter.from_env()
+            pack = self.open_image_pack(document_id, page_range)
+
+            def ocr_stage(item):
+                pair_index, first_image, second_image = item
+                check_pair = self.pair_check_images(first_image, second_image, pair_index + 1, page_filter)
+                # Blank sheets produce no check
+                if check_pair is None:
+                    if on_check is not None:
+                        on_check(None)
+                    return None
+                return pair_index, check_pair
 
-            for idx, check_pair in enumerate(check_images):
+            def clean_stage(item):
+                pair_index, check_pair = item
                 # Generate unique ID for this check
                 check_id = str(uuid.uuid4())
-                logger.info(f"Processing check {idx + 1}/{len(check_images)} (ID: {check_id})")
+                logger.info("Processing check %s/%s (ID: %s)", pair_index + 1, total_checks, check_id,
+                    extra={"documentId": document_id, "checkId": check_id})
 
                 # Clean both front and back images
                 cleaned_front = self.clean_image(check_pair['front'])
                 cleaned_back = self.clean_image(check_pair['back']) if check_pair['back'] is not None else None
                 
                 # Save both images
-                front_path, back_path = self.save_check_image(cleaned_front, cleaned_back, check_id)
-                logger.info(f"Saved check images to {front_path} and {back_path}")
+                front_path, back_path = self.save_check_image(cleaned_front, cleaned_back, check_id, pack)
+                logger.debug("Saved check images to %s and %s", front_path, back_path)
+                return check_id, check_pair, front_path, back_path
+
+            def extract_stage(item):
+                check_id, check_pair, front_path, back_path = item
+                if batch_writer is not None:
+                    self.defer_extraction(batch_writer, check_id, document_id, check_pair, front_path, back_path)
+                    return None
 
                 # Parse check details using cached text
-                check_details = self.parse_check_details(check_pair['front_text'], check_pair['back_text'])
-                logger.info("Check details parsed successfully")
+                check_details = self.parse_check_details(check_pair['front_text'], check_pair['back_text'],
+                                                         check_pair['front_raw_text'])
+                logger.debug("Check details parsed successfully")
                 check_details.id = check_id
                 check_details.documentId = document_id
                 # Convert PosixPath objects to strings for MongoDB storage
                 check_details.front_path = str(front_path) if front_path else None
                 check_details.back_path = str(back_path) if back_path else None
+                return check_details
 
+            def persist_stage(check_details):
                 # create check in mongo
                 self.create_check(check_details)
 
                 # Add to CSV
-                self.add_to_csv(check_id, check_details)
-                logger.info(f"Added check {check_id} to CSV")
+                self.add_to_csv(check_details.id, check_details)
+                logger.debug("Added check %s to CSV", check_details.id)
+                if on_check is not None:
+                    on_check(check_details)
+                return check_details
+
+            # Rendering happens lazily in the source iterator; each later stage has its own workers
+            pipeline = Pipeline([
+                Stage.from_env("ocr", ocr_stage, default_workers=4),
+                Stage.from_env("clean", clean_stage, default_workers=2),
+                Stage.from_env("extract", extract_stage, default_workers=4),
+                Stage.from_env("persist", persist_stage, default_workers=1),
+            ])
+            persisted = pipeline.run(page_pairs)
+            stats["numberOfChecks"] = len(persisted)
+            if batch_writer is not None:
+                stats["deferredChecks"] = batch_writer.count
+            if page_filter is not None:
+                stats.update(page_filter.stats())
+            if self.model_router.enabled:
+                logger.info(f"Model routing in this process so far: {self.model_router.stats()}")
 
             logger.info("PDF processing completed successfully")
             return True
@@ -355,9 +721,99 @@ class CheckProcessor:
             logger.error(f"Full traceback: {traceback.format_exc()}")
             return False
 
+# CheckProcessor of a batch worker process, created once by _init_batch_worker
+_batch_processor = None
+
+def _init_batch_worker():
+    """Process pool initializer: build the Vision, OpenAI and Mongo clients once per worker"""
+    global _batch_processor
+    # Batch workers are already one process per document; no nested page pool
+    _batch_processor = CheckProcessor(use_page_pool=False)
+
+def _process_batch_document(pdf_path):
+    """Process one PDF in a batch worker; returns (pdf_path, success, numberOfChecks, error)"""
+    stats = {}
+    try:
+        success = _batch_processor.process_pdf(pdf_path, stats=stats)
+        return pdf_path, success, stats.get("numberOfChecks", 0), None if success else "PDF processing failed"
+    except Exception as e:
+        return pdf_path, False, 0, str(e)
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+def run_batch(sources, workers=None, resume_file=None):
+    """
+    Process many PDFs through a process pool.
+
+    Args:
+        sources (list): Directories, glob patterns, manifest files or PDF paths
+        workers (int): Worker processes (defaults to BATCH_WORKERS, 4)
+        resume_file (str): Progress file; successfully processed PDFs listed there are skipped
+
+    Returns:
+        list: (pdf_path, error) of the documents that failed
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from utils.batch_inputs import resolve_inputs, BatchProgress
+
+    workers = workers or int(os.getenv('BATCH_WORKERS', '4'))
+    progress = BatchProgress(resume_file or os.getenv('BATCH_RESUME_FILE', 'data/batch_progress.jsonl'))
+
+    pdf_paths = resolve_inputs(sources)
+    done = progress.completed()
+    pending = [path for path in pdf_paths if path not in done]
+    logger.info(f"Batch: {len(pdf_paths)} documents, {len(pdf_paths) - len(pending)} already done, "
+                f"{len(pending)} to process with {workers} workers")
+
+    failures = []
+    total_checks = 0
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as pool:
+        futures = [pool.submit(_process_batch_document, path) for path in pending]
+        for finished, future in enumerate(as_completed(futures), start=1):
+            pdf_path, success, number_of_checks, error = future.result()
+            progress.record(pdf_path, success, number_of_checks, error)
+            total_checks += number_of_checks
+            if not success:
+                failures.append((pdf_path, error))
+
+            elapsed = time.monotonic() - start
+            rate = finished / elapsed if elapsed else 0.0
+            eta = (len(pending) - finished) / rate if rate else 0.0
+            logger.info(f"Batch: {finished}/{len(pending)} documents ({len(failures)} failed), "
+                        f"{total_checks} checks, {rate * 60:.1f} docs/min, ETA {_format_duration(eta)}")
+
+    logger.info(f"Batch finished in {_format_duration(time.monotonic() - start)}: "
+                f"{len(pending) - len(failures)} succeeded, {len(failures)} failed, {total_checks} checks")
+    for pdf_path, error in failures:
+        logger.error(f"Failed: {pdf_path}: {error}")
+    return failures
+
+def batch_main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='process_checks.py batch',
+                                     description='Process checks from many PDF files in parallel.')
+    parser.add_argument('sources', nargs='+',
+                        help='Directories, glob patterns, manifest files (one path per line, or JSONL with "path") or PDFs')
+    parser.add_argument('--workers', type=int,
+                        help='Worker processes (overrides BATCH_WORKERS env var)')
+    parser.add_argument('--resume-file',
+                        help='Progress file used to skip finished documents (overrides BATCH_RESUME_FILE env var)')
+    args = parser.parse_args(argv)
+
+    failures = run_batch(args.sources, args.workers, args.resume_file)
+    sys.exit(1 if failures else 0)
+
 def main():
     import argparse
-    parser = argparse.ArgumentParser(description='Process checks from a PDF file.')
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        return batch_main(sys.argv[2:])
+
+    parser = argparse.ArgumentParser(description='Process checks from a PDF file. '
+                                                 'Use "process_checks.py batch --help" for many files.')
     parser.add_argument('pdf_path', help='Path to the PDF file containing checks')
     args = parser.parse_args()
 
@@ -0,0 +1,212 @@
+import os
+import sys
+import gzip
+import time
+import logging
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from bson import json_util
+from pymongo import ReplaceOne
+from utils.logger import configure_logging
+from utils.mongo_utils import TERMINAL_STATUSES, ARCHIVE_COLLECTION
+from base_service import BaseMongoService
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+configure_logging('logs/task_archiver.log')
+
+class TaskArchiver(BaseMongoService):
+    """
+    Moves finished tasks out of the `task` collection so it only holds live work.
+
+    Terminal tasks (COMPLETED, FAILED, VALIDATION_FAILED) finished more than
+    ARCHIVE_AFTER_DAYS ago are copied in batches to the task_archive collection
+    or to gzipped JSON Lines files in ARCHIVE_DIR, then deleted from `task`.
+    Copy happens before delete. A task re-queued in between is not deleted,
+    and its archived copy is dropped. A batch file keeps a .partial suffix
+    until its delete is done; the next run finishes partial files left by an
+    interrupted one, so every task ends up in exactly one archive file.
+    ARCHIVE_TTL_DAYS adds a TTL index expiring archived tasks from task_archive.
+    """
+
+    def __init__(self, mongo_uri=None, db_name=None, target=None, archive_dir=None, client=None):
+        super().__init__(mongo_uri, db_name, "TaskArchiver", client)
+        self.target = target or os.getenv('ARCHIVE_TARGET', 'collection')
+        if self.target not in ('collection', 'file'):
+            raise ValueError(f"ARCHIVE_TARGET must be 'collection' or 'file', got '{self.target}'")
+        self.archive_collection = self.db[ARCHIVE_COLLECTION]
+        self.archive_dir = Path(archive_dir or os.getenv('ARCHIVE_DIR', 'data/task_archive'))
+
+    def ensure_indexes(self):
+        """Index for finding archivable tasks, and the optional TTL on the archive"""
+        self.task_collection.create_index([("status", 1), ("finishedAt", 1)])
+        ttl_days = int(os.getenv('ARCHIVE_TTL_DAYS', '0'))
+        if self.target == 'collection' and ttl_days > 0:
+            self.archive_collection.create_index(
+                [("archivedAt", 1)], expireAfterSeconds=ttl_days * 86400, name="archivedAt_ttl"
+            )
+
+    def archivable_query(self, cutoff):
+        """Terminal tasks finished before cutoff (tasks from before finishedAt existed fall back to updatedAt)"""
+        return {
+            "status": {"$in": list(TERMINAL_STATUSES)},
+            "$or": [
+                {"finishedAt": {"$lt": cutoff}},
+                {"finishedAt": {"$exists": False}, "updatedAt": {"$lt": cutoff}}
+            ]
+        }
+
+    def _copy_to_collection(self, tasks):
+        # Upserts, so tasks copied by an interrupted earlier run are simply refreshed
+        self.archive_collection.bulk_write(
+            [ReplaceOne({"_id": task["_id"]}, task, upsert=True) for task in tasks], ordered=False
+        )
+
+    def _still_queued(self, task_ids):
+        """IDs among task_ids that are still in the task collection"""
+        return {task["_id"] for task in self.task_collection.find({"_id": {"$in": list(task_ids)}}, {"_id": 1})}
+
+    def _drop_requeued_copies(self, task_ids):
+        """Remove archived copies of tasks that were re-queued before their delete"""
+        requeued = self._still_queued(task_ids)
+        if requeued:
+            self.archive_collection.delete_many({"_id": {"$in": list(requeued)}})
+
+    def _write_file(self, tasks, path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for task in tasks:
+                f.write(json_util.dumps(task) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _finish_file(self, partial_path):
+        """
+        Give a batch file its final name once its delete is done, keeping only
+        the tasks that are gone from `task`; the others are archived again later.
+
+        Returns:
+            int: Number of tasks in the final file
+        """
+        with gzip.open(partial_path, 'rt', encoding='utf-8') as f:
+            tasks = [json_util.loads(line) for line in f if line.strip()]
+        remaining = self._still_queued(task["_id"] for task in tasks)
+        kept = [task for task in tasks if task["_id"] not in remaining]
+        if not kept:
+            partial_path.unlink()
+            return 0
+        if len(kept) < len(tasks):
+            self._write_file(kept, partial_path)
+        # Dropping the .partial suffix is atomic
+        os.replace(partial_path, partial_path.with_suffix(''))
+        return len(kept)
+
+    def archive(self, older_than_days=None, batch_size=None):
+        """
+        Archive every eligible task in batches.
+
+        Returns:
+            int: Number of tasks removed from the task collection
+        """
+        older_than_days = older_than_days if older_than_days is not None else float(os.getenv('ARCHIVE_AFTER_DAYS', '7'))
+        batch_size = batch_size or int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+        cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+        query = self.archivable_query(cutoff)
+        run_name = f"tasks-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}"
+
+        if self.target == 'file':
+            # Batches of an interrupted run that were copied but maybe not deleted
+            for partial_path in sorted(self.archive_dir.glob("*.jsonl.gz.partial")):
+                self.logger.info(f"Finishing interrupted archive file {partial_path}")
+                self._finish_file(partial_path)
+
+        archived = 0
+        batch = 0
+        while True:
+            tasks = list(self.task_collection.find(query).sort("_id", 1).limit(batch_size))
+            if not tasks:
+                break
+
+            archived_at = datetime.now(timezone.utc)
+            for task in tasks:
+                task["archivedAt"] = archived_at
+            task_ids = [task["_id"] for task in tasks]
+            batch += 1
+            partial_path = self.archive_dir / f"{run_name}-{batch:05d}.jsonl.gz.partial"
+            if self.target == 'collection':
+                self._copy_to_collection(tasks)
+            else:
+                self._write_file(tasks, partial_path)
+
+            # The status guard keeps a task that was re-queued meanwhile
+            result = self.task_collection.delete_many({
+                "_id": {"$in": task_ids},
+                "status": {"$in": list(TERMINAL_STATUSES)}
+            })
+            if self.target == 'collection':
+                self._drop_requeued_copies(task_ids)
+            else:
+                self._finish_file(partial_path)
+            archived += result.deleted_count
+            self.logger.info(f"Archived {result.deleted_count} tasks to "
+                             f"{ARCHIVE_COLLECTION if self.target == 'collection' else partial_path.with_suffix('')}")
+            if len(tasks) < batch_size:
+                break
+
+        return archived
+
+    def run_continuous_process(self, interval=None, older_than_days=None, batch_size=None):
+        """Archive on a fixed interval until interrupted"""
+        interval = interval or int(os.getenv('ARCHIVE_INTERVAL', '3600'))
+        self.logger.info(f"Starting continuous {self.service_name} (every {interval} seconds, target: {self.target})")
+        try:
+            while True:
+                try:
+                    archived = self.archive(older_than_days, batch_size)
+                    self.logger.info(f"Archive run finished: {archived} tasks archived")
+                    time.sleep(interval)
+                except KeyboardInterrupt:
+                    self.logger.info("Received interrupt signal, shutting down...")
+                    break
+                except Exception as e:
+                    self.logger.error(f"Error archiving tasks: {str(e)}")
+                    time.sleep(interval)
+        finally:
+            self.client.close()
+            self.logger.info("MongoDB connection closed")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Move finished tasks out of the task collection')
+    parser.add_argument('--once', action='store_true',
+                       help='Archive once and exit instead of running continuously')
+    parser.add_argument('--older-than-days', type=float,
+                       help='Archive tasks finished more than this many days ago (overrides ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--target', choices=['collection', 'file'],
+                       help='Archive to the task_archive collection or to gzipped files (overrides ARCHIVE_TARGET)')
+    parser.add_argument('--batch-size', type=int,
+                       help='Tasks moved per bulk operation (overrides ARCHIVE_BATCH_SIZE)')
+    parser.add_argument('--mongo-uri',
+                       help='MongoDB connection URI (overrides MONGO_URI env var)')
+    parser.add_argument('--db-name',
+                       help='MongoDB database name (overrides MONGO_DB_NAME env var)')
+    args = parser.parse_args()
+
+    try:
+        archiver = TaskArchiver(args.mongo_uri, args.db_name, args.target)
+        archiver.ensure_indexes()
+        if args.once:
+            archived = archiver.archive(args.older_than_days, args.batch_size)
+            print(f"Archived {archived} tasks")
+        else:
+            archiver.run_continuous_process(older_than_days=args.older_than_days, batch_size=args.batch_size)
+    except Exception as e:
+        logging.error(f"Failed to archive tasks: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
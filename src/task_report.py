@@ -0,0 +1,253 @@
+import sys
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+from pymongo.errors import OperationFailure
+from utils.logger import configure_logging
+from utils.mongo_utils import TERMINAL_STATUSES, ARCHIVE_COLLECTION
+from base_service import BaseMongoService
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+configure_logging()
+
+PERCENTILES = [0.5, 0.95, 0.99]
+
+def _including_archive(match):
+    """$match over both the live task collection and task_archive (see task_archiver.py)"""
+    return [
+        {"$match": match},
+        {"$unionWith": {"coll": ARCHIVE_COLLECTION, "pipeline": [{"$match": match}]}}
+    ]
+
+def _seconds_between(start_field, end_field):
+    """Aggregation expression: seconds between two date fields, or null if either is missing"""
+    return {"$cond": [
+        {"$and": [{"$ifNull": [f"${start_field}", False]}, {"$ifNull": [f"${end_field}", False]}]},
+        {"$divide": [{"$subtract": [f"${end_field}", f"${start_field}"]}, 1000]},
+        None
+    ]}
+
+def _percentile_accumulators(field):
+    """$group accumulators for the percentiles of a field ($percentile needs MongoDB 7.0)"""
+    return {
+        f"{field}Percentiles": {"$percentile": {"input": f"${field}", "p": PERCENTILES, "method": "approximate"}},
+        f"{field}Avg": {"$avg": f"${field}"},
+        f"{field}Max": {"$max": f"${field}"}
+    }
+
+def _legacy_percentile_stages(fields):
+    """Percentiles via $sortArray (MongoDB 5.2+) for servers without $percentile"""
+    group = {}
+    project = {}
+    for field in fields:
+        group[f"{field}Values"] = {"$push": f"${field}"}
+        group[f"{field}Avg"] = {"$avg": f"${field}"}
+        group[f"{field}Max"] = {"$max": f"${field}"}
+        values = {"$sortArray": {"input": {"$filter": {"input": f"${field}Values", "cond": {"$ne": ["$$this", None]}}},
+                                 "sortBy": 1}}
+        project[f"{field}Percentiles"] = {"$let": {
+            "vars": {"sorted": values},
+            "in": {"$cond": [
+                {"$eq": [{"$size": "$$sorted"}, 0]},
+                [],
+                [{"$arrayElemAt": ["$$sorted", {"$floor": {"$multiply": [p, {"$subtract": [{"$size": "$$sorted"}, 1]}]}}]}
+                 for p in PERCENTILES]
+            ]}
+        }}
+    return group, project
+
+class TaskReport(BaseMongoService):
+    """Queue wait, processing time, throughput, failure and backlog statistics from the task collection"""
+
+    def __init__(self, mongo_uri=None, db_name=None):
+        super().__init__(mongo_uri, db_name, "TaskReport")
+
+    def ensure_indexes(self):
+        """Indexes the report's $match stages rely on"""
+        self.task_collection.create_index([("finishedAt", 1)])
+        self.task_collection.create_index([("createdAt", 1)])
+        self.task_collection.create_index([("status", 1), ("type", 1)])
+
+    def latency_by_type(self, since):
+        """Queue wait (createdAt -> claimedAt) and processing time (startedAt -> finishedAt) per task type"""
+        match = _including_archive({"finishedAt": {"$gte": since}}) + [
+            {"$project": {
+                "type": 1,
+                "waitSeconds": _seconds_between("createdAt", "claimedAt"),
+                "processingSeconds": _seconds_between("startedAt", "finishedAt")
+            }}
+        ]
+        fields = ["waitSeconds", "processingSeconds"]
+        try:
+            group = {"_id": "$type", "count": {"$sum": 1}}
+            for field in fields:
+                group.update(_percentile_accumulators(field))
+            return list(self.task_collection.aggregate(match + [{"$group": group}, {"$sort": {"_id": 1}}]))
+        except OperationFailure:
+            self.logger.info("$percentile not supported by this server, using $sortArray")
+            group, project = _legacy_percentile_stages(fields)
+            group = {"_id": "$type", "count": {"$sum": 1}, **group}
+            keep = {name: 1 for name in group if name != "_id" and not name.endswith("Values")}
+            return list(self.task_collection.aggregate(
+                match + [{"$group": group}, {"$project": {**keep, **project}}, {"$sort": {"_id": 1}}]
+            ))
+
+    def throughput_per_hour(self, since):
+        """Finished and failed tasks per type and hour"""
+        return list(self.task_collection.aggregate(_including_archive({"finishedAt": {"$gte": since}}) + [
+            {"$group": {
+                "_id": {"type": "$type", "hour": {"$dateTrunc": {"date": "$finishedAt", "unit": "hour"}}},
+                "finished": {"$sum": 1},
+                "failed": {"$sum": {"$cond": [{"$in": ["$status", ["FAILED", "VALIDATION_FAILED"]]}, 1, 0]}}
+            }},
+            {"$sort": {"_id.hour": 1, "_id.type": 1}}
+        ]))
+
+    def failures_by_error(self, since, limit=20):
+        """Failure rate per type and the most frequent error messages"""
+        return list(self.task_collection.aggregate(_including_archive({"finishedAt": {"$gte": since}}) + [
+            {"$facet": {
+                "rates": [
+                    {"$group": {
+                        "_id": "$type",
+                        "finished": {"$sum": 1},
+                        "failed": {"$sum": {"$cond": [{"$in": ["$status", ["FAILED", "VALIDATION_FAILED"]]}, 1, 0]}}
+                    }},
+                    {"$project": {"finished": 1, "failed": 1, "failureRate": {"$divide": ["$failed", "$finished"]}}},
+                    {"$sort": {"_id": 1}}
+                ],
+                "errors": [
+                    {"$match": {"status": {"$in": ["FAILED", "VALIDATION_FAILED"]}}},
+                    {"$project": {"type": 1, "error": {"$substrCP": [{"$ifNull": [
+                        "$processingResult.error", "$validationResult.error",
+                        "$processingResult.message", "$validationResult.message",
+                        "$result.error", "unknown"
+                    ]}, 0, 120]}}},
+                    {"$group": {"_id": {"type": "$type", "error": "$error"}, "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1}},
+                    {"$limit": limit}
+                ]
+            }}
+        ]))[0]
+
+    def backlog(self, since, step_hours=1):
+        """
+        Tasks waiting to be claimed, per type, at each step of the window, plus the
+        current count per non-terminal status.
+        """
+        now = datetime.now(timezone.utc)
+        points = []
+        point = since
+        while point <= now:
+            points.append(point)
+            point += timedelta(hours=step_hours)
+
+        facets = {}
+        for index, point in enumerate(points):
+            facets[f"t{index}"] = [
+                {"$match": {
+                    "createdAt": {"$lte": point},
+                    "$or": [
+                        {"claimedAt": {"$gt": point}},
+                        {"claimedAt": {"$exists": False}, "status": "NOT_STARTED"}
+                    ]
+                }},
+                {"$group": {"_id": "$type", "waiting": {"$sum": 1}}}
+            ]
+        facets["current"] = [
+            {"$match": {"status": {"$nin": list(TERMINAL_STATUSES)}}},
+            {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}},
+            {"$sort": {"_id.type": 1, "_id.status": 1}}
+        ]
+        # Tasks archived since may still have been waiting at earlier points
+        result = list(self.task_collection.aggregate(
+            _including_archive({"createdAt": {"$lte": now}, "$or": [{"finishedAt": {"$exists": False}}, {"finishedAt": {"$gte": since}}]})
+            + [{"$facet": facets}]
+        ))[0]
+
+        over_time = [{
+            "at": point,
+            "waiting": {entry["_id"]: entry["waiting"] for entry in result[f"t{index}"]}
+        } for index, point in enumerate(points)]
+        return {"overTime": over_time, "current": result["current"]}
+
+    def build(self, hours=24):
+        """Run every aggregation for the last `hours` hours"""
+        since = datetime.now(timezone.utc) - timedelta(hours=hours)
+        return {
+            "since": since,
+            "latency": self.latency_by_type(since),
+            "throughput": self.throughput_per_hour(since),
+            "failures": self.failures_by_error(since),
+            "backlog": self.backlog(since)
+        }
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+def print_report(report):
+    print(f"Task report since {report['since'].isoformat()}\n")
+
+    print("Latency (seconds)           count   wait p50/p95/p99        processing p50/p95/p99")
+    for row in report["latency"]:
+        wait = row.get("waitSecondsPercentiles") or [None] * 3
+        processing = row.get("processingSecondsPercentiles") or [None] * 3
+        print(f"  {str(row['_id']):<24} {row['count']:>6}   "
+              f"{'/'.join(_fmt(v) for v in wait):<22}  {'/'.join(_fmt(v) for v in processing)}")
+
+    print("\nThroughput (finished per hour)")
+    for row in report["throughput"]:
+        print(f"  {row['_id']['hour'].strftime('%Y-%m-%d %H:00')}  {str(row['_id']['type']):<10} "
+              f"{row['finished']:>6} finished, {row['failed']:>4} failed")
+
+    print("\nFailure rates")
+    for row in report["failures"]["rates"]:
+        print(f"  {str(row['_id']):<10} {row['failed']}/{row['finished']} ({row['failureRate'] * 100:.1f}%)")
+    print("\nTop errors")
+    for row in report["failures"]["errors"]:
+        print(f"  {row['count']:>5}  {row['_id']['type']}: {row['_id']['error']}")
+
+    print("\nBacklog (tasks waiting to be claimed)")
+    for point in report["backlog"]["overTime"]:
+        waiting = ", ".join(f"{task_type}={count}" for task_type, count in sorted(point["waiting"].items())) or "0"
+        print(f"  {point['at'].strftime('%Y-%m-%d %H:%M')}  {waiting}")
+    print("\nCurrently open")
+    for row in report["backlog"]["current"]:
+        print(f"  {row['_id']['type']:<10} {row['_id']['status']:<22} {row['count']}")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Throughput and latency report from the task collection')
+    parser.add_argument('--hours', type=float, default=24,
+                       help='Size of the reporting window in hours (default: 24)')
+    parser.add_argument('--json', action='store_true',
+                       help='Print the report as JSON')
+    parser.add_argument('--create-indexes', action='store_true',
+                       help='Create the indexes the report relies on before running it')
+    parser.add_argument('--mongo-uri',
+                       help='MongoDB connection URI (overrides MONGO_URI env var)')
+    parser.add_argument('--db-name',
+                       help='MongoDB database name (overrides MONGO_DB_NAME env var)')
+    args = parser.parse_args()
+
+    try:
+        reporter = TaskReport(args.mongo_uri, args.db_name)
+        if args.create_indexes:
+            reporter.ensure_indexes()
+        report = reporter.build(args.hours)
+    except Exception as e:
+        logging.error(f"Failed to build task report: {str(e)}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(report, default=str, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from models.check import EXTRACTION_FIELDS
+
+logger = logging.getLogger('vision_flow')
+
+def batch_writer_for(task):
+    """BatchRequestWriter deferring a REPORT task's LLM extraction, or None unless it is low priority and BATCH_EXTRACTION_ENABLED"""
+    if task.get("priority") == "low" and os.getenv('BATCH_EXTRACTION_ENABLED', 'false').lower() in ('1', 'true', 'yes'):
+        return BatchRequestWriter(task["_id"])
+    return None
+
+def batch_directory():
+    """Directory holding batch request, pending and result files"""
+    return Path(os.getenv('BATCH_DIR', 'data/batch_requests'))
+
+class BatchRequestWriter:
+    """
+    Collects deferred LLM extraction requests for one REPORT task.
+
+    Writes two JSONL files: {task_id}.requests.jsonl in the OpenAI Batch API
+    input format, and {task_id}.pending.jsonl with what the ingestion step
+    needs to build and persist the CheckDetails once results arrive.
+    """
+
+    def __init__(self, task_id, directory=None):
+        self.task_id = task_id
+        self.directory = Path(directory or batch_directory())
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.requests_path = self.directory / f"{task_id}.requests.jsonl"
+        self.pending_path = self.directory / f"{task_id}.pending.jsonl"
+        self.count = 0
+        self._lock = threading.Lock()
+
+        # A retried task starts over instead of appending duplicates
+        for path in (self.requests_path, self.pending_path):
+            if path.exists():
+                path.unlink()
+
+    def add(self, custom_id, request_body, pending_entry):
+        """Append one chat completion request and its pending check metadata"""
+        request_line = {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": request_body
+        }
+        with self._lock:
+            with open(self.requests_path, 'a') as f:
+                f.write(json.dumps(request_line) + "\n")
+            with open(self.pending_path, 'a') as f:
+                f.write(json.dumps({"custom_id": custom_id, "taskId": self.task_id, **pending_entry}) + "\n")
+            self.count += 1
+
+def read_jsonl(path):
+    """Read a JSONL file into a list of dicts, skipping blank lines"""
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def read_batch_results(results_path):
+    """
+    Read an OpenAI Batch API output file.
+
+    Returns:
+        dict: custom_id -> (message_content or None, error or None, usage dict or None)
+    """
+    results = {}
+    for line in read_jsonl(results_path):
+        custom_id = line.get("custom_id")
+        response = line.get("response") or {}
+        body = response.get("body") or {}
+        if line.get("error") or response.get("status_code", 200) != 200:
+            results[custom_id] = (None, line.get("error") or body.get("error") or "request failed", None)
+            continue
+        try:
+            content = body["choices"][0]["message"]["content"]
+            results[custom_id] = (content, None, body.get("usage"))
+        except (KeyError, IndexError, TypeError):
+            results[custom_id] = (None, "malformed result line", None)
+    return results
+
+def write_stub_results(requests_path, results_path, content=None):
+    """
+    Write a local stand-in for a Batch API output file, answering every request
+    in requests_path. Lets the ingestion step run without calling OpenAI.
+    """
+    content = content or json.dumps({field: "Not Found" for field in EXTRACTION_FIELDS})
+    with open(results_path, 'w') as out:
+        for request in read_jsonl(requests_path):
+            out.write(json.dumps({
+                "id": f"batch_req_{request['custom_id']}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                    }
+                },
+                "error": None
+            }) + "\n")
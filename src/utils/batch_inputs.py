@@ -0,0 +1,95 @@
+import os
+import glob
+import json
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+
+def read_manifest(manifest_path):
+    """
+    Read PDF paths from a manifest file.
+
+    JSONL manifests need a "path" key per line; any other file is read as one
+    path per line, ignoring blank lines and # comments.
+    """
+    paths = []
+    with open(manifest_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if str(manifest_path).endswith('.jsonl'):
+                paths.append(json.loads(line)["path"])
+            else:
+                paths.append(line)
+    return paths
+
+def resolve_inputs(sources):
+    """
+    Expand directories, glob patterns, manifest files and PDF paths into a
+    de-duplicated, ordered list of PDF paths.
+    """
+    paths = []
+    for source in sources:
+        source_path = Path(source)
+        if source_path.is_dir():
+            paths.extend(str(p) for p in sorted(source_path.rglob("*.pdf")))
+        elif source_path.is_file() and source_path.suffix.lower() == '.pdf':
+            paths.append(str(source_path))
+        elif source_path.is_file():
+            paths.extend(read_manifest(source_path))
+        else:
+            paths.extend(sorted(glob.glob(source, recursive=True)))
+
+    seen = set()
+    unique = []
+    for path in paths:
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+class BatchProgress:
+    """
+    Append-only record of finished documents, used to resume an interrupted run.
+
+    Each line is a JSON object with path, success, numberOfChecks, error and
+    finishedAt. Documents that finished successfully are skipped on the next run;
+    failed ones are retried.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def completed(self):
+        """Paths that already finished successfully"""
+        done = set()
+        if not self.path.exists():
+            return done
+        with open(self.path, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("success"):
+                    done.add(entry["path"])
+                else:
+                    done.discard(entry["path"])
+        return done
+
+    def record(self, path, success, number_of_checks=0, error=None):
+        """Append the outcome of one document and flush it to disk"""
+        entry = {
+            "path": path,
+            "success": success,
+            "numberOfChecks": number_of_checks,
+            "error": error,
+            "finishedAt": datetime.now(timezone.utc).isoformat()
+        }
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
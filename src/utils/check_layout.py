@@ -0,0 +1,81 @@
+import os
+import cv2
+import numpy as np
+
+# Key regions as (top, bottom, left, right) fractions of the check, in reading order.
+# Left out: the signature block and printed lines around it, which extraction never reads.
+CHECK_REGIONS = [
+    ("header", 0.0, 0.30, 0.0, 1.0),        # payer name/address, bank, check number, date
+    ("payee_amount", 0.30, 0.60, 0.0, 1.0), # pay to the order of, amount in figures and words
+    ("bank", 0.60, 0.82, 0.0, 0.5),         # bank name/address on the left; the signature is on the right
+    ("micr", 0.82, 1.0, 0.0, 1.0),          # MICR line: check, transit, institution and account numbers
+]
+
+def roi_ocr_enabled():
+    """Whether check fronts are read from their key regions only (ROI_OCR_ENABLED)"""
+    return os.getenv('ROI_OCR_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+def find_content_bounds(gray, min_blob_ratio=0.0005, padding=10):
+    """
+    Find the bounding box of the printed content on a scanned page.
+
+    Dark content is closed into blobs; specks are ignored and the union of the
+    rest is taken, so margins go but no text of a sparse check back is lost.
+    Falls back to the whole page when nothing is found.
+
+    Returns:
+        tuple: (x, y, width, height) in pixels
+    """
+    height, width = gray.shape
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 25))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = [cv2.boundingRect(c) for c in contours if cv2.contourArea(c) >= min_blob_ratio * width * height]
+    if not boxes:
+        return 0, 0, width, height
+
+    x0 = max(0, min(x for x, _, _, _ in boxes) - padding)
+    y0 = max(0, min(y for _, y, _, _ in boxes) - padding)
+    x1 = min(width, max(x + w for x, _, w, _ in boxes) + padding)
+    y1 = min(height, max(y + h for _, y, _, h in boxes) + padding)
+    return x0, y0, x1 - x0, y1 - y0
+
+def crop_to_content(image):
+    """
+    Crop a page to its printed content at full resolution, so the single OCR
+    request of the page uploads no blank margins.
+
+    Args:
+        image: PIL Image of a rendered page
+
+    Returns:
+        PIL.Image: The cropped page (the page itself when there is nothing to crop)
+    """
+    x, y, width, height = find_content_bounds(np.asarray(image.convert('L')))
+    if (width, height) == image.size:
+        return image
+    return image.crop((x, y, x + width, y + height))
+
+def region_text(blocks, width, height):
+    """
+    Text of the OCR blocks whose center lies in one of CHECK_REGIONS.
+
+    Args:
+        blocks: Blocks from utils.image_analyzer.text_blocks(), in reading order
+        width, height: Size of the image the blocks were read from
+
+    Returns:
+        str: The kept blocks one per line, or None when none were kept
+    """
+    kept = []
+    for block in blocks:
+        xs = [x for x, _ in block['vertices']]
+        ys = [y for _, y in block['vertices']]
+        cx = (min(xs) + max(xs)) / 2 / width
+        cy = (min(ys) + max(ys)) / 2 / height
+        if any(top <= cy < bottom and left <= cx < right for _, top, bottom, left, right in CHECK_REGIONS):
+            kept.append(block['text'])
+    return "\n".join(kept) or None
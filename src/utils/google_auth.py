@@ -15,6 +15,33 @@ def setup_google_vision_auth():
         FileNotFoundError: If credentials file is not found
         ValueError: If credentials environment variable is not set
     """
+    credentials = _load_vision_credentials()
+    
+    try:
+        # Create and return authenticated client
+        return vision.ImageAnnotatorClient(credentials=credentials)
+    
+    except Exception as e:
+        raise Exception(f"Failed to initialize Google Vision client: {str(e)}")
+
+def setup_google_vision_async_auth():
+    """
+    Same as setup_google_vision_auth, but returns the asyncio Vision client.
+    Must be called from within a running event loop.
+    
+    Returns:
+        vision.ImageAnnotatorAsyncClient: Authenticated async Google Vision client
+    """
+    credentials = _load_vision_credentials()
+    
+    try:
+        return vision.ImageAnnotatorAsyncClient(credentials=credentials)
+    
+    except Exception as e:
+        raise Exception(f"Failed to initialize Google Vision async client: {str(e)}")
+
+def _load_vision_credentials():
+    """Load service account credentials from GOOGLE_APPLICATION_CREDENTIALS"""
     # Check if credentials path is set
     credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
     if not credentials_path:
@@ -33,13 +60,10 @@ def setup_google_vision_auth():
     
     try:
         # Create credentials object
-        credentials = service_account.Credentials.from_service_account_file(
+        return service_account.Credentials.from_service_account_file(
             str(credentials_path),
             scopes=['https://www.googleapis.com/auth/cloud-vision']
         )
-        
-        # Create and return authenticated client
-        return vision.ImageAnnotatorClient(credentials=credentials)
     
     except Exception as e:
-        raise Exception(f"Failed to initialize Google Vision client: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to initialize Google Vision client: {str(e)}")
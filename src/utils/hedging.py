@@ -0,0 +1,253 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from utils.usage import record_usage
+
+logger = logging.getLogger('vision_flow')
+
+class LatencyTracker:
+    """Rolling window of call latencies with percentile lookup"""
+
+    def __init__(self, window=500, min_samples=20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        """Latency at percentile p (0-100), or None until enough samples exist"""
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+class HedgedCaller:
+    """
+    Per-call deadline plus optional request hedging for one call type.
+
+    If a call has not returned by the tracked latency percentile, a duplicate
+    is sent and whichever answers first wins. Hedges are capped at
+    max_hedge_rate of all calls so a slow backend is not hit twice as hard.
+    With a limiter (RateLimiter.call_hedged()), a hedge is only sent if the
+    limiter admits it right away, and a timeout retry waits for admission.
+    """
+
+    def __init__(self, name, timeout=60.0, hedge_enabled=False, hedge_percentile=95.0,
+                 max_hedge_rate=0.05, timeout_retries=1, executor=None):
+        self.name = name
+        self.timeout = timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_rate = max_hedge_rate
+        self.timeout_retries = timeout_retries
+        self.latency = LatencyTracker()
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=int(os.getenv('HEDGE_POOL_SIZE', '32')), thread_name_prefix=f"{name}-call"
+        )
+        self.calls = 0
+        self.hedges = 0
+        self._lock = threading.Lock()
+
+    def _hedge_delay(self):
+        """Seconds to wait before hedging, or None when this call must not be hedged"""
+        if not self.hedge_enabled:
+            return None
+        delay = self.latency.percentile(self.hedge_percentile)
+        if delay is None:
+            return None
+        with self._lock:
+            if self.hedges + 1 > self.max_hedge_rate * max(self.calls, 1):
+                return None
+        return delay
+
+    def _count_hedge(self):
+        with self._lock:
+            self.hedges += 1
+        record_usage(hedges=1)
+        logger.debug("Hedging slow %s call (%d hedges / %d calls)", self.name, self.hedges, self.calls)
+
+    def stats(self):
+        """Current latency percentiles and hedge counters for this call type"""
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "p50": self.latency.percentile(50),
+            "p95": self.latency.percentile(95),
+            "p99": self.latency.percentile(99)
+        }
+
+    @staticmethod
+    def _admitted(release, func, args, kwargs):
+        """Run one request, giving back its rate limiter admission when it finishes"""
+        if release is None:
+            return func(*args, **kwargs)
+        error = None
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            release(error)
+
+    def _submit(self, release, func, args, kwargs):
+        return self.executor.submit(contextvars.copy_context().run, self._admitted, release, func, args, kwargs)
+
+    def _call_once(self, func, args, kwargs, limiter=None, admit_cost=0, release=None):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        futures = [self._submit(release, func, args, kwargs)]
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None and hedge_delay < self.timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and self._hedge_delay() is not None:
+                hedge_release = limiter.try_admit(admit_cost) if limiter else None
+                if limiter is None or hedge_release is not None:
+                    self._count_hedge()
+                    futures.append(self._submit(hedge_release, func, args, kwargs))
+
+        # Take the first successful answer; only fail once every attempt failed
+        error = None
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.latency.record(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not pending:
+            raise error
+        # Record the timeout as a sample so percentiles reflect the tail we actually see
+        self.latency.record(self.timeout)
+        raise TimeoutError(f"{self.name} call did not complete within {self.timeout:.0f}s")
+
+    def call(self, func, *args, limiter=None, admit_cost=0, **kwargs):
+        """
+        Call func with the deadline (retried on timeout) and hedging applied.
+
+        Args:
+            limiter (RateLimiter): Admits the requests sent after the first one, which the caller admitted
+            admit_cost (int): Token cost of one request for the limiter
+        """
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        release = None
+        while True:
+            try:
+                return self._call_once(func, args, kwargs, limiter, admit_cost, release)
+            except TimeoutError:
+                if attempt >= self.timeout_retries:
+                    raise
+                attempt += 1
+                record_usage(retries=1)
+                logger.warning(f"{self.name} call timed out, retrying ({attempt}/{self.timeout_retries})")
+                # The timed out request may still be running, so the retry needs its own admission
+                release = limiter.admit(admit_cost) if limiter else None
+
+    @staticmethod
+    async def _admitted_async(release, func, args, kwargs):
+        """Asyncio variant of _admitted()"""
+        if release is None:
+            return await func(*args, **kwargs)
+        error = None
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            release(error)
+
+    async def _call_once_async(self, func, args, kwargs, limiter=None, admit_cost=0, release=None):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        tasks = [asyncio.ensure_future(self._admitted_async(release, func, args, kwargs))]
+
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None and hedge_delay < self.timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self._hedge_delay() is not None:
+                    hedge_release = await limiter.try_admit_async(admit_cost) if limiter else None
+                    if limiter is None or hedge_release is not None:
+                        self._count_hedge()
+                        tasks.append(asyncio.ensure_future(self._admitted_async(hedge_release, func, args, kwargs)))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.latency.record(time.monotonic() - start)
+                        return task.result()
+                    error = task.exception()
+
+            if error is not None and not pending:
+                raise error
+            self.latency.record(self.timeout)
+            raise TimeoutError(f"{self.name} call did not complete within {self.timeout:.0f}s")
+        finally:
+            # Unlike threads, losing coroutines can actually be cancelled
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call_async(self, func, *args, limiter=None, admit_cost=0, **kwargs):
+        """Asyncio variant of call() for coroutine functions"""
+        with self._lock:
+            self.calls += 1
+        attempt = 0
+        release = None
+        while True:
+            try:
+                return await self._call_once_async(func, args, kwargs, limiter, admit_cost, release)
+            except TimeoutError:
+                if attempt >= self.timeout_retries:
+                    raise
+                attempt += 1
+                record_usage(retries=1)
+                logger.warning(f"{self.name} call timed out, retrying ({attempt}/{self.timeout_retries})")
+                release = await limiter.admit_async(admit_cost) if limiter else None
+
+_callers = {}
+_callers_lock = threading.Lock()
+
+def get_hedged_caller(name, default_timeout=60.0):
+    """
+    Return the process-wide HedgedCaller for a call type, configured from the
+    environment: {NAME}_TIMEOUT, {NAME}_TIMEOUT_RETRIES, HEDGE_ENABLED,
+    HEDGE_PERCENTILE and HEDGE_MAX_RATE.
+    """
+    with _callers_lock:
+        if name not in _callers:
+            prefix = name.upper()
+            _callers[name] = HedgedCaller(
+                name,
+                timeout=float(os.getenv(f'{prefix}_TIMEOUT', str(default_timeout))),
+                hedge_enabled=os.getenv('HEDGE_ENABLED', 'false').lower() in ('1', 'true', 'yes'),
+                hedge_percentile=float(os.getenv('HEDGE_PERCENTILE', '95')),
+                max_hedge_rate=float(os.getenv('HEDGE_MAX_RATE', '0.05')),
+                timeout_retries=int(os.getenv(f'{prefix}_TIMEOUT_RETRIES', '1'))
+            )
+        return _callers[name]
@@ -1,10 +1,12 @@
+import asyncio
 import cv2
 import numpy as np
 from PIL import Image
 from google.cloud import vision
 from typing import Tuple, Optional
+from utils.usage import record_usage
 
-def analyze_check_image(image, vision_client) -> Tuple[bool, Optional[str]]:
+def analyze_check_image(image, vision_client, timeout=None) -> Tuple[bool, Optional[str]]:
     """
     Analyze image to determine if it's front of check and return extracted text.
     Uses text_detection for basic text extraction.
@@ -12,22 +14,55 @@ def analyze_check_image(image, vision_client) -> Tuple[bool, Optional[str]]:
     Args:
         image: PIL Image object
         vision_client: Authenticated Google Vision client
+        timeout: Deadline in seconds for the Vision request (optional)
     
     Returns:
         Tuple[bool, Optional[str]]: (is_front, extracted_text)
     """
     # Convert PIL image to bytes
     img_byte_arr = image_to_bytes(image)
+    record_usage(ocrRequests=1, ocrBytesUploaded=len(img_byte_arr))
     
     # Get text annotations using text_detection
     vision_image = vision.Image(content=img_byte_arr)
-    response = vision_client.text_detection(image=vision_image)
+    response = vision_client.text_detection(image=vision_image, timeout=timeout)
     
     if not response.text_annotations:
         return False, None
     
     # Get the full text from the first annotation
     full_text = response.text_annotations[0].description
+    return is_check_front(full_text), full_text
+
+async def analyze_check_image_async(image, vision_client, executor=None, timeout=None) -> Tuple[bool, Optional[str]]:
+    """
+    Async variant of analyze_check_image for vision.ImageAnnotatorAsyncClient.
+    PNG encoding is CPU work, so it runs in the given executor.
+    
+    Args:
+        image: PIL Image object
+        vision_client: Authenticated async Google Vision client
+        executor: concurrent.futures executor for encoding (default loop executor if None)
+        timeout: Deadline in seconds for the Vision request (optional)
+    
+    Returns:
+        Tuple[bool, Optional[str]]: (is_front, extracted_text)
+    """
+    loop = asyncio.get_running_loop()
+    img_byte_arr = await loop.run_in_executor(executor, image_to_bytes, image)
+    record_usage(ocrRequests=1, ocrBytesUploaded=len(img_byte_arr))
+    
+    vision_image = vision.Image(content=img_byte_arr)
+    response = await vision_client.text_detection(image=vision_image, timeout=timeout)
+    
+    if not response.text_annotations:
+        return False, None
+    
+    full_text = response.text_annotations[0].description
+    return is_check_front(full_text), full_text
+
+def is_check_front(full_text) -> bool:
+    """Score OCR text against front/back keywords to decide if it is a check front"""
     lower_text = full_text.lower()
     
     # Keywords typically found on check fronts
@@ -45,46 +80,82 @@ def analyze_check_image(image, vision_client) -> Tuple[bool, Optional[str]]:
     front_score = sum(1 for word in front_indicators if word in lower_text)
     back_score = sum(1 for word in back_indicators if word in lower_text)
     
-    return front_score > back_score, full_text
+    return front_score > back_score
 
-def get_text_with_positions(image, vision_client) -> list:
+def analyze_check_layout(image, vision_client, timeout=None) -> Tuple[bool, Optional[str], list]:
     """
-    Get text with their positions in reading order.
+    Analyze image like analyze_check_image, also returning the text blocks with
+    their positions from the same document_text_detection request.
     
     Args:
         image: PIL Image object
         vision_client: Authenticated Google Vision client
+        timeout: Deadline in seconds for the Vision request (optional)
     
     Returns:
-        list: List of dicts containing text and their bounding boxes
+        Tuple[bool, Optional[str], list]: (is_front, extracted_text, text_blocks)
     """
     img_byte_arr = image_to_bytes(image)
+    record_usage(ocrRequests=1, ocrBytesUploaded=len(img_byte_arr))
+    vision_image = vision.Image(content=img_byte_arr)
+    response = vision_client.document_text_detection(image=vision_image, timeout=timeout)
+    return layout_result(response)
+
+async def analyze_check_layout_async(image, vision_client, executor=None, timeout=None) -> Tuple[bool, Optional[str], list]:
+    """Async variant of analyze_check_layout (see analyze_check_image_async)"""
+    loop = asyncio.get_running_loop()
+    img_byte_arr = await loop.run_in_executor(executor, image_to_bytes, image)
+    record_usage(ocrRequests=1, ocrBytesUploaded=len(img_byte_arr))
+    
     vision_image = vision.Image(content=img_byte_arr)
-    response = vision_client.document_text_detection(image=vision_image)
+    response = await vision_client.document_text_detection(image=vision_image, timeout=timeout)
+    return layout_result(response)
+
+def layout_result(response) -> Tuple[bool, Optional[str], list]:
+    """(is_front, extracted_text, text_blocks) of a document_text_detection response"""
+    annotation = response.full_text_annotation
+    if not annotation or not annotation.text:
+        return False, None, []
+    return is_check_front(annotation.text), annotation.text, text_blocks(annotation)
+
+def get_text_with_positions(image, vision_client, timeout=None) -> list:
+    """
+    Get text with their positions in reading order.
     
+    Args:
+        image: PIL Image object
+        vision_client: Authenticated Google Vision client
+        timeout: Deadline in seconds for the Vision request (optional)
+    
+    Returns:
+        list: List of dicts containing text and their bounding boxes
+    """
+    return analyze_check_layout(image, vision_client, timeout)[2]
+
+def text_blocks(full_text_annotation) -> list:
+    """Blocks of a full_text_annotation with their text and bounding boxes, in reading order"""
     text_blocks = []
-    if response.full_text_annotation:
-        for page in response.full_text_annotation.pages:
-            for block in page.blocks:
-                # Get bounding box vertices
-                vertices = [(vertex.x, vertex.y) for vertex in block.bounding_box.vertices]
-                
-                # Calculate top-left corner (for sorting)
-                top_left_x = min(v[0] for v in vertices)
-                top_left_y = min(v[1] for v in vertices)
-                
-                # Extract text from block
-                block_text = ''
-                for paragraph in block.paragraphs:
-                    for word in paragraph.words:
-                        word_text = ''.join([symbol.text for symbol in word.symbols])
-                        block_text += word_text + ' '
-                
-                text_blocks.append({
-                    'text': block_text.strip(),
-                    'position': (top_left_x, top_left_y),
-                    'vertices': vertices
-                })
+    for page in full_text_annotation.pages:
+        for block in page.blocks:
+            # Get bounding box vertices
+            vertices = [(vertex.x, vertex.y) for vertex in block.bounding_box.vertices]
+            
+            # Calculate top-left corner (for sorting)
+            top_left_x = min(v[0] for v in vertices)
+            top_left_y = min(v[1] for v in vertices)
+            
+            # Extract text from block
+            block_text = ''
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    word_text = ''.join([symbol.text for symbol in word.symbols])
+                    block_text += word_text + ' '
+            
+            text_blocks.append({
+                'text': block_text.strip(),
+                'position': (top_left_x, top_left_y),
+                'vertices': vertices
+            })
     
     # Sort blocks by y-coordinate first (top to bottom), then x-coordinate (left to right)
     return sorted(text_blocks, key=lambda b: (b['position'][1], b['position'][0]))
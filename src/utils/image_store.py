@@ -0,0 +1,164 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from pathlib import Path
+import cv2
+import numpy as np
+
+logger = logging.getLogger('vision_flow')
+
+PACK_PREFIX = "pack:"
+
+# OpenCV encoder flag carrying the compression level / quality for each codec
+CODEC_PARAMS = {
+    "png": cv2.IMWRITE_PNG_COMPRESSION,
+    "webp": cv2.IMWRITE_WEBP_QUALITY,
+    "jpg": cv2.IMWRITE_JPEG_QUALITY,
+}
+DEFAULT_LEVELS = {"png": 3, "webp": 90, "jpg": 90}
+
+class ImageStore:
+    """
+    Content-addressed store for processed check images.
+
+    Loose images live at {root}/objects/ab/cd/<sha256>.<codec>, sharded by hash
+    prefix so no directory grows past a few thousand entries; the key is the
+    path relative to {root}. Identical images are stored once.
+
+    With packing enabled, the images of one document (or page-range subtask) are
+    appended to {root}/packs/<name>.pack instead, with a JSONL offset index next
+    to it. Packed keys look like 'pack:<name>:<sha256>.<codec>'. Reads of either
+    kind are a single seek/open.
+    """
+
+    def __init__(self, root=None, codec=None, level=None, pack_enabled=None):
+        self.root = Path(root or os.getenv('IMAGE_STORE_DIR', 'repository/processed_checks'))
+        self.codec = (codec or os.getenv('IMAGE_STORE_CODEC', 'png')).lower()
+        if self.codec not in CODEC_PARAMS:
+            raise ValueError(f"Unsupported image codec: {self.codec}")
+        if level is None:
+            level = int(os.getenv('IMAGE_STORE_LEVEL', str(DEFAULT_LEVELS[self.codec])))
+        self.level = level
+        if pack_enabled is None:
+            pack_enabled = os.getenv('IMAGE_STORE_PACK', 'false').lower() in ('1', 'true', 'yes')
+        self.pack_enabled = pack_enabled
+        self._indexes = {}
+        self._indexes_lock = threading.Lock()
+        (self.root / "objects").mkdir(parents=True, exist_ok=True)
+
+    def encode(self, image):
+        """Encode an image array with the configured codec and level"""
+        ok, buffer = cv2.imencode(f".{self.codec}", image, [CODEC_PARAMS[self.codec], self.level])
+        if not ok:
+            raise ValueError(f"Could not encode image as {self.codec}")
+        return buffer.tobytes()
+
+    def _object_key(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        return f"objects/{digest[:2]}/{digest[2:4]}/{digest}.{self.codec}"
+
+    def put(self, image, pack=None):
+        """
+        Store an image and return its key.
+
+        Args:
+            image: Image array as produced by OpenCV
+            pack (PackWriter): Append to this pack instead of writing a loose file
+        """
+        data = self.encode(image)
+        if pack is not None:
+            return pack.append(data, self.codec)
+
+        key = self._object_key(data)
+        path = self.root / key
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f".{uuid.uuid4().hex}.tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return key
+
+    def open_pack(self, name):
+        """Start (or continue) the pack file with the given name"""
+        return PackWriter(self.root / "packs", name)
+
+    def _pack_index(self, name):
+        with self._indexes_lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = read_pack_index(self.root / "packs" / f"{name}.idx")
+                self._indexes[name] = index
+            return index
+
+    def get_bytes(self, key):
+        """Read the encoded bytes stored under a key"""
+        if key.startswith(PACK_PREFIX):
+            name, blob = key[len(PACK_PREFIX):].rsplit(":", 1)
+            index = self._pack_index(name)
+            if blob not in index:
+                # The pack may have grown since the index was cached
+                with self._indexes_lock:
+                    self._indexes.pop(name, None)
+                index = self._pack_index(name)
+            offset, length = index[blob]
+            with open(self.root / "packs" / f"{name}.pack", 'rb') as f:
+                f.seek(offset)
+                return f.read(length)
+
+        with open(self.root / key, 'rb') as f:
+            return f.read()
+
+    def load(self, key):
+        """Decode the image stored under a key"""
+        data = np.frombuffer(self.get_bytes(key), dtype=np.uint8)
+        return cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+
+    def delete_pack(self, name):
+        """Remove a pack and its index, e.g. when a document is deleted"""
+        for suffix in (".pack", ".idx"):
+            path = self.root / "packs" / f"{name}{suffix}"
+            if path.exists():
+                path.unlink()
+        with self._indexes_lock:
+            self._indexes.pop(name, None)
+
+class PackWriter:
+    """Appends encoded images to one pack file and records their offsets"""
+
+    def __init__(self, directory, name):
+        self.name = name
+        directory.mkdir(parents=True, exist_ok=True)
+        self.pack_path = directory / f"{name}.pack"
+        self.index_path = directory / f"{name}.idx"
+        self._known = read_pack_index(self.index_path)
+        self._lock = threading.Lock()
+
+    def append(self, data, codec):
+        """Append one encoded image and return its key"""
+        blob = f"{hashlib.sha256(data).hexdigest()}.{codec}"
+        with self._lock:
+            if blob not in self._known:
+                with open(self.pack_path, 'ab') as f:
+                    offset = f.tell()
+                    f.write(data)
+                # One index line per blob, written after the data so a crash never indexes a partial write
+                with open(self.index_path, 'a') as f:
+                    f.write(json.dumps({"blob": blob, "offset": offset, "length": len(data)}) + "\n")
+                self._known[blob] = (offset, len(data))
+        return f"{PACK_PREFIX}{self.name}:{blob}"
+
+def read_pack_index(index_path):
+    """Load a pack index: blob name -> (offset, length)"""
+    index = {}
+    if not Path(index_path).exists():
+        return index
+    with open(index_path, 'r') as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                index[entry["blob"]] = (entry["offset"], entry["length"])
+    return index
@@ -1,28 +1,128 @@
+import os
+import json
+import queue
+import atexit
 import logging
+import threading
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 
-def setup_logger():
-    # Create logs directory if it doesn't exist
-    log_dir = Path("logs")
-    log_dir.mkdir(exist_ok=True)
+# Attributes every LogRecord has; anything else was passed through extra={...}
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_log_files = set()
+_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, including any fields passed through extra={...}"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "thread": record.threadName,
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def _make_formatter():
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'json':
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+class _LocalQueueHandler(QueueHandler):
+    """
+    Enqueue the record with its message and traceback rendered in the calling
+    thread; only the JSON/text formatting and the I/O happen on the listener thread.
+    """
+
+    def prepare(self, record):
+        # Merge args into the message once, so records stay valid across threads
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_text = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(log_file=None, level=None):
+    """
+    Route all logging through a queue to a background listener thread.
 
-    # Create a logger
-    logger = logging.getLogger('vision_flow')
-    logger.setLevel(logging.INFO)
+    Callers only pay for putting a record on the queue; console and file I/O
+    happen on the listener thread. The queue handler is installed once per
+    process on the root logger; later calls only add log files not yet attached.
+    Records are written as JSON lines unless LOG_FORMAT=text.
 
-    # Create handlers
-    log_file = log_dir / f"vision_flow_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    file_handler = logging.FileHandler(log_file)
-    console_handler = logging.StreamHandler()
+    Args:
+        log_file (str): Optional file to also write records to
+        level (str): Root log level (defaults to LOG_LEVEL, INFO)
 
-    # Create formatters and add it to handlers
-    log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    file_handler.setFormatter(log_format)
-    console_handler.setFormatter(log_format)
+    Returns:
+        logging.Logger: The 'vision_flow' logger
+    """
+    global _listener
+    with _lock:
+        if _listener is None:
+            log_queue = queue.SimpleQueue()
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(_make_formatter())
 
-    # Add handlers to the logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+            root = logging.getLogger()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            root.addHandler(_LocalQueueHandler(log_queue))
+            root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
 
-    return logger 
\ No newline at end of file
+            _listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+            _listener.start()
+            # Drain the queue before the interpreter exits
+            atexit.register(_listener.stop)
+
+        if log_file and str(log_file) not in _log_files:
+            Path(log_file).parent.mkdir(parents=True, exist_ok=True)
+            file_handler = logging.FileHandler(log_file)
+            file_handler.setFormatter(_make_formatter())
+            # The listener reads this tuple for every record, so swapping it is safe
+            _listener.handlers = _listener.handlers + (file_handler,)
+            _log_files.add(str(log_file))
+
+    return logging.getLogger('vision_flow')
+
+def _restart_after_fork():
+    """Forked children (e.g. process pool workers) get their own listener thread"""
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is None:
+        return
+    log_files = list(_log_files)
+    _listener = None
+    _log_files.clear()
+    configure_logging()
+    for log_file in log_files:
+        configure_logging(log_file)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+_default_log_file = None
+
+def setup_logger():
+    """Return the 'vision_flow' logger, configuring queue-based logging on first use"""
+    global _default_log_file
+    if _default_log_file is None:
+        # One timestamped file per process, however often this is called
+        _default_log_file = Path("logs") / f"vision_flow_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    return configure_logging(_default_log_file)
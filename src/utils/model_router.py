@@ -0,0 +1,99 @@
+import os
+import re
+import logging
+import threading
+from utils.usage import record_usage
+
+logger = logging.getLogger('vision_flow')
+
+# Evidence in the OCR text that the key fields were read cleanly
+AMOUNT_PATTERN = re.compile(r"\$\s?\d{1,3}(?:[ ,]?\d{3})*[.,]\d{2}\b|\b\d{1,3}(?:,\d{3})*\.\d{2}\b")
+DATE_PATTERN = re.compile(r"\b\d{1,4}[/\-.]\d{1,2}[/\-.]\d{2,4}\b")
+# Transit and institution numbers on the MICR line, e.g. "12345-003" or "⑆12345⑆003⑆"
+MICR_PATTERN = re.compile(r"\d{5}\D{1,3}\d{3}\b")
+
+# Fields whose 'Not Found' from the fast model is treated as a failed extraction
+KEY_FIELDS = ["amount", "check_number", "check_transit_number", "check_institution_number", "check_bank_account_number"]
+
+def score_ocr_text(text):
+    """
+    Score how clean and complete the OCR text of a check front is, from 0 to 1.
+
+    Checks for a readable amount, date and MICR line, and for how much of the
+    text is plain characters rather than OCR noise.
+    """
+    if not text or len(text.strip()) < 40:
+        return 0.0
+    plain = sum(1 for c in text if c.isalnum() or c.isspace() or c in "$.,/-:#&'()")
+    # 70% plain characters scores 0, 95% and above scores 1
+    cleanliness = min(1.0, max(0.0, (plain / len(text) - 0.70) / 0.25))
+    return round(
+        0.3 * bool(AMOUNT_PATTERN.search(text))
+        + 0.3 * bool(MICR_PATTERN.search(text))
+        + 0.15 * bool(DATE_PATTERN.search(text))
+        + 0.25 * cleanliness,
+        3
+    )
+
+def _digits(value):
+    return re.sub(r"\D", "", value or "")
+
+class ModelRouter:
+    """
+    Sends checks with clean OCR text to a smaller, faster model and everything
+    else to the primary model; fast answers that fail validation are escalated.
+
+    Configured with MODEL_ROUTING_ENABLED, LLM_MODEL, LLM_FAST_MODEL and
+    MODEL_ROUTING_MIN_SCORE. Counters are per process; per-task counts go to
+    the usage stats (fastExtractions, escalations).
+    """
+
+    def __init__(self, enabled=None, primary_model=None, fast_model=None, min_score=None):
+        if enabled is None:
+            enabled = os.getenv('MODEL_ROUTING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        self.enabled = enabled
+        self.primary_model = primary_model or os.getenv('LLM_MODEL', 'gpt-4o')
+        self.fast_model = fast_model or os.getenv('LLM_FAST_MODEL', 'gpt-4o-mini')
+        self.min_score = min_score if min_score is not None else float(os.getenv('MODEL_ROUTING_MIN_SCORE', '0.8'))
+        self.counts = {"primary": 0, "fast": 0, "escalated": 0}
+        self._lock = threading.Lock()
+
+    def choose(self, front_text):
+        """Pick the model for a check: (model, score), score None when routing is off"""
+        if not self.enabled:
+            return self.primary_model, None
+        score = score_ocr_text(front_text)
+        model = self.fast_model if score >= self.min_score else self.primary_model
+        logger.debug("OCR score %.2f, routing check to %s", score, model)
+        return model, score
+
+    def escalation_reason(self, fields, invalid_fields, front_text, not_found="Not Found"):
+        """Why a fast-model answer cannot be kept, or None when it passes validation"""
+        if invalid_fields:
+            return f"invalid fields: {', '.join(invalid_fields)}"
+        missing = [name for name in KEY_FIELDS if fields.get(name) == not_found]
+        if missing:
+            return f"missing fields: {', '.join(missing)}"
+        # The amount must be readable in the OCR text, not guessed by the model
+        if _digits(fields.get("amount")) not in _digits(front_text):
+            return "amount not found in OCR text"
+        return None
+
+    def record(self, model, escalated=False):
+        """Count one routing decision"""
+        with self._lock:
+            if model == self.fast_model:
+                self.counts["fast"] += 1
+                if escalated:
+                    self.counts["escalated"] += 1
+            else:
+                self.counts["primary"] += 1
+        if model == self.fast_model:
+            record_usage(fastExtractions=1, escalations=int(escalated))
+
+    def stats(self):
+        """Routing counters and the share of fast-model answers that were escalated"""
+        with self._lock:
+            counts = dict(self.counts)
+        counts["escalationRate"] = round(counts["escalated"] / counts["fast"], 3) if counts["fast"] else 0.0
+        return counts
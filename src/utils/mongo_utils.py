@@ -0,0 +1,53 @@
+import os
+from urllib.parse import quote_plus
+
+def get_mongo_connection_settings(mongo_uri=None, db_name=None):
+    """
+    Resolve the MongoDB connection URI and database name from arguments or environment.
+
+    Credentials come from MONGO_USERNAME and MONGO_PASSWORD, or MONGO_PASSWORD_FILE
+    (Docker secrets), and are embedded into the returned URI when both are present.
+
+    Returns:
+        tuple: (connection_uri, base_uri, db_name) where base_uri has no credentials and is safe to log
+    """
+    base_uri = mongo_uri or os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+    db_name = db_name or os.getenv('MONGO_DB_NAME', 'pan-ocr')
+
+    mongo_username = os.getenv('MONGO_USERNAME')
+    mongo_password = os.getenv('MONGO_PASSWORD')
+
+    # Check for password file (Docker secrets)
+    mongo_password_file = os.getenv('MONGO_PASSWORD_FILE')
+    if mongo_password_file and os.path.exists(mongo_password_file):
+        with open(mongo_password_file, 'r') as f:
+            mongo_password = f.read().strip()
+
+    if mongo_username and mongo_password:
+        # Create authenticated connection string
+        connection_uri = base_uri.replace('mongodb://', f'mongodb://{quote_plus(mongo_username)}:{quote_plus(mongo_password)}@') + db_name
+    else:
+        connection_uri = base_uri
+
+    return connection_uri, base_uri, db_name
+
+# Task statuses after which a task is never picked up again
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "VALIDATION_FAILED")
+
+# Where task_archiver.py moves finished tasks
+ARCHIVE_COLLECTION = "task_archive"
+
+def transition_timestamps(status, now):
+    """
+    Lifecycle timestamps to set on a task moving to the given status.
+
+    claimedAt marks when a worker claimed the task and finishedAt when it
+    reached a terminal status; startedAt is set separately once processing
+    begins (see task_started_update). task_report.py derives queue wait and
+    processing time from them.
+    """
+    if status == "IN_PROGRESS":
+        return {"claimedAt": now}
+    if status in TERMINAL_STATUSES:
+        return {"finishedAt": now}
+    return {}
@@ -0,0 +1,103 @@
+import os
+import logging
+import hashlib
+import threading
+import cv2
+import numpy as np
+
+logger = logging.getLogger('vision_flow')
+
+# OCR result (is_front, text, region_text) used for pages that are not worth sending to Vision
+BLANK_PAGE_RESULT = (False, "", None)
+
+def clean_check_image(page):
+    """
+    Denoise and binarize an RGB page array for storage.
+
+    Module-level so it can run in a PagePool worker.
+    """
+    opencv_image = cv2.cvtColor(page, cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+    denoised = cv2.fastNlMeansDenoising(gray)
+    _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+def to_grayscale(image):
+    """Return a page (PIL image or array) as a 2-D uint8 array"""
+    array = np.asarray(image)
+    if array.ndim == 3:
+        array = cv2.cvtColor(array, cv2.COLOR_RGB2GRAY)
+    return array
+
+def ink_coverage(gray, dark_threshold=160):
+    """Fraction of dark pixels, sampled on every other row and column"""
+    return float(np.count_nonzero(gray[::2, ::2] < dark_threshold)) / gray[::2, ::2].size
+
+def page_digest(gray):
+    """Digest of a page's exact pixels and size"""
+    digest = hashlib.blake2b(gray.tobytes(), digest_size=16)
+    digest.update(repr(gray.shape).encode())
+    return digest.digest()
+
+class PageFilter:
+    """
+    Per-document pre-pass that avoids paying Vision OCR for pages that carry
+    no new information.
+
+    Pages with almost no ink are treated as blank and get BLANK_PAGE_RESULT.
+    Only pages whose rendered pixels are identical to an earlier page of the
+    same PDF (the same scan embedded twice) reuse that page's OCR result. A
+    rescan of a check is never pixel-identical, so it is OCR'd again: similar
+    looking pages are not safe to merge, as checks from the same book can
+    differ only in the amount, number and date.
+    """
+
+    def __init__(self, blank_threshold=0.002):
+        self.blank_threshold = blank_threshold
+        self.blank_pages = 0
+        self.duplicate_pages = 0
+        # Page digest -> OCR result of the pages OCR'd so far
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Create a filter from environment variables, or None when disabled"""
+        if os.getenv('PAGE_FILTER_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+        return cls(blank_threshold=float(os.getenv('PAGE_BLANK_INK_THRESHOLD', '0.002')))
+
+    def inspect(self, image):
+        """
+        Fingerprint a page and look for a result that makes OCR unnecessary.
+
+        Returns:
+            tuple: (fingerprint to pass to remember(), OCR result to reuse or None)
+        """
+        gray = to_grayscale(image)
+        if ink_coverage(gray) < self.blank_threshold:
+            with self._lock:
+                self.blank_pages += 1
+            return None, BLANK_PAGE_RESULT
+
+        digest = page_digest(np.ascontiguousarray(gray))
+        with self._lock:
+            result = self._seen.get(digest)
+            if result is not None:
+                self.duplicate_pages += 1
+                return None, result
+        return digest, None
+
+    def remember(self, fingerprint, result):
+        """Store the OCR result of an inspected page for later duplicates"""
+        if fingerprint is None:
+            return
+        with self._lock:
+            self._seen.setdefault(fingerprint, result)
+
+    def stats(self):
+        """Counters reported in the task's processingResult"""
+        return {
+            "blankPagesSkipped": self.blank_pages,
+            "duplicatePagesReused": self.duplicate_pages
+        }
@@ -0,0 +1,179 @@
+import os
+import json
+import shutil
+import logging
+import threading
+import time
+import uuid
+from pathlib import Path
+from datetime import datetime, timezone
+from pdf2image import convert_from_path
+from PIL import Image
+from utils.hashing import file_sha256
+
+logger = logging.getLogger('vision_flow')
+
+MANIFEST_NAME = "manifest.json"
+
+class PageCache:
+    """
+    On-disk cache of rendered PDF pages shared between the VALIDATE and REPORT stages.
+
+    Layout: {root}/{document_id}/{pdf_hash}/page-*.png plus a manifest.json.
+    Entries are keyed by document id and PDF content hash, so a re-uploaded file
+    under the same document id never serves stale pages. Readers touch the
+    manifest while they load pages; entries touched within pin_seconds are in
+    use, possibly by another worker, and are never evicted to meet the size cap.
+    """
+
+    def __init__(self, root=None, max_bytes=None, pin_seconds=None):
+        self.root = Path(root or os.getenv('PAGE_CACHE_DIR', 'repository/page_cache'))
+        if max_bytes is None:
+            max_bytes = int(os.getenv('PAGE_CACHE_MAX_MB', '2048')) * 1024 * 1024
+        self.max_bytes = max_bytes
+        if pin_seconds is None:
+            pin_seconds = float(os.getenv('PAGE_CACHE_PIN_SECONDS', '600'))
+        self.pin_seconds = pin_seconds
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """Create a cache from environment variables, or None when disabled"""
+        if os.getenv('PAGE_CACHE_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+            return None
+        try:
+            return cls()
+        except Exception as e:
+            logger.warning(f"Page cache disabled: {str(e)}")
+            return None
+
+    def _entry_dir(self, document_id, pdf_hash):
+        return self.root / str(document_id) / pdf_hash
+
+    def _read_manifest(self, entry_dir):
+        manifest_path = entry_dir / MANIFEST_NAME
+        if not manifest_path.exists():
+            return None
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    def render(self, pdf_path, document_id, pdf_hash=None):
+        """
+        Render a PDF straight to page files in the cache.
+
+        Returns:
+            list: Paths of the cached page files in page order
+        """
+        pdf_hash = pdf_hash or file_sha256(pdf_path)
+        entry_dir = self._entry_dir(document_id, pdf_hash)
+        tmp_dir = entry_dir.parent / f".tmp-{uuid.uuid4().hex}"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+
+        try:
+            # Let pdftoppm write the PNGs directly instead of round-tripping through PIL
+            page_paths = convert_from_path(
+                pdf_path, output_folder=str(tmp_dir), fmt='png',
+                output_file='page', paths_only=True
+            )
+            pages = [Path(p).name for p in page_paths]
+            manifest = {
+                "documentId": str(document_id),
+                "pdfHash": pdf_hash,
+                "pageCount": len(pages),
+                "pages": pages,
+                "bytes": sum((tmp_dir / p).stat().st_size for p in pages),
+                "createdAt": datetime.now(timezone.utc).isoformat()
+            }
+            with open(tmp_dir / MANIFEST_NAME, 'w') as f:
+                json.dump(manifest, f)
+
+            if entry_dir.exists():
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        logger.info(f"Cached {len(pages)} rendered pages for document {document_id}")
+        self.enforce_size_cap(keep=document_id)
+        return [entry_dir / p for p in pages]
+
+    def get_page_paths(self, pdf_path, document_id, pdf_hash=None):
+        """Return cached page file paths for a document, or None on a cache miss"""
+        try:
+            pdf_hash = pdf_hash or file_sha256(pdf_path)
+            entry_dir = self._entry_dir(document_id, pdf_hash)
+            manifest = self._read_manifest(entry_dir)
+            if not manifest:
+                return None
+
+            page_paths = [entry_dir / p for p in manifest["pages"]]
+            if not all(p.exists() for p in page_paths):
+                logger.warning(f"Incomplete page cache entry for document {document_id}, ignoring")
+                return None
+
+            # Touch the manifest so size-cap eviction is least-recently-used
+            os.utime(entry_dir / MANIFEST_NAME)
+            return page_paths
+        except Exception as e:
+            logger.warning(f"Page cache lookup failed for document {document_id}: {str(e)}")
+            return None
+
+    def mark_in_use(self, page_paths):
+        """Touch the manifest of the entry holding page_paths, pinning it for another pin_seconds"""
+        try:
+            os.utime(Path(page_paths[0]).parent / MANIFEST_NAME)
+        except (OSError, IndexError):
+            pass
+
+    def load_pages(self, pdf_path, document_id, pdf_hash=None):
+        """Return cached pages as RGB PIL images, or None on a cache miss"""
+        page_paths = self.get_page_paths(pdf_path, document_id, pdf_hash)
+        if page_paths is None:
+            return None
+        return [load_page_image(p) for p in page_paths]
+
+    def evict(self, document_id):
+        """Remove all cached pages for a document"""
+        document_dir = self.root / str(document_id)
+        if document_dir.exists():
+            shutil.rmtree(document_dir, ignore_errors=True)
+            logger.info(f"Evicted cached pages for document {document_id}")
+
+    def enforce_size_cap(self, keep=None):
+        """Evict least-recently-used documents, except pinned ones, until the cache fits in max_bytes"""
+        if not self.max_bytes or self.max_bytes <= 0:
+            return
+
+        with self._lock:
+            documents = {}
+            total_bytes = 0
+            for manifest_path in self.root.glob(f"*/*/{MANIFEST_NAME}"):
+                try:
+                    with open(manifest_path, 'r') as f:
+                        size = json.load(f).get("bytes", 0)
+                    mtime = manifest_path.stat().st_mtime
+                except (OSError, ValueError):
+                    continue
+                document_id = manifest_path.parent.parent.name
+                last_used, document_size = documents.get(document_id, (0, 0))
+                documents[document_id] = (max(last_used, mtime), document_size + size)
+                total_bytes += size
+
+            if total_bytes <= self.max_bytes:
+                return
+
+            pinned_since = time.time() - self.pin_seconds
+            for document_id, (last_used, size) in sorted(documents.items(), key=lambda item: item[1][0]):
+                if total_bytes <= self.max_bytes:
+                    break
+                if (keep is not None and document_id == str(keep)) or last_used >= pinned_since:
+                    continue
+                self.evict(document_id)
+                total_bytes -= size
+
+def load_page_image(page_path):
+    """Load a cached page file fully into memory as an RGB PIL image"""
+    with Image.open(page_path) as image:
+        return image.convert('RGB')
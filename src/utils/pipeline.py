@@ -0,0 +1,133 @@
+import os
+import queue
+import logging
+import threading
+import contextvars
+from utils.profiling import run_profiled
+
+logger = logging.getLogger('vision_flow')
+
+_STOP = object()
+
+class Stage:
+    """A pipeline stage: a function applied to each item by a fixed number of worker threads"""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+    @classmethod
+    def from_env(cls, name, func, default_workers=1):
+        """Create a stage whose worker count comes from PIPELINE_{NAME}_WORKERS"""
+        workers = int(os.getenv(f"PIPELINE_{name.upper()}_WORKERS", str(default_workers)))
+        return cls(name, func, workers)
+
+class Pipeline:
+    """
+    Staged producer/consumer pipeline with bounded queues between stages.
+
+    Each stage runs in its own worker threads, so CPU-bound stages (which release
+    the GIL inside OpenCV/poppler) overlap with network-bound stages. A stage
+    function returns the item for the next stage, or None to drop it. The first
+    exception raised by any stage cancels the run and is re-raised from run().
+    """
+
+    def __init__(self, stages, queue_size=None):
+        self.stages = stages
+        self.queue_size = queue_size or int(os.getenv('PIPELINE_QUEUE_SIZE', '4'))
+        self._cancelled = threading.Event()
+        self._error = None
+        self._error_lock = threading.Lock()
+
+    def _fail(self, stage, error):
+        with self._error_lock:
+            if self._error is None:
+                self._error = error
+                logger.error(f"Pipeline stage '{stage.name}' failed: {str(error)}")
+        self._cancelled.set()
+
+    def _put(self, target_queue, item):
+        """Blocking put that gives up once the pipeline is cancelled"""
+        while True:
+            try:
+                target_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if self._cancelled.is_set() and item is not _STOP:
+                    return
+
+    def _worker(self, stage, in_queue, out_queue, remaining, remaining_lock, next_workers, results):
+        while True:
+            item = in_queue.get()
+            if item is _STOP:
+                break
+            if self._cancelled.is_set():
+                # Keep draining so upstream producers never block on a full queue
+                continue
+            try:
+                output = stage.func(item)
+            except Exception as e:
+                self._fail(stage, e)
+                continue
+            if output is None:
+                continue
+            if out_queue is None:
+                results.append(output)
+            else:
+                self._put(out_queue, output)
+
+        # The last worker of a stage to finish shuts down the next stage
+        with remaining_lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and out_queue is not None:
+            for _ in range(next_workers):
+                self._put(out_queue, _STOP)
+
+    def run(self, items):
+        """
+        Feed items through all stages.
+
+        Args:
+            items: Iterable consumed lazily in the calling thread (the source stage)
+
+        Returns:
+            list: Outputs of the final stage, in completion order
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        results = []
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            out_queue = queues[index + 1] if index + 1 < len(self.stages) else None
+            next_workers = self.stages[index + 1].workers if out_queue is not None else 0
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+            for n in range(stage.workers):
+                # Each worker runs in a copy of the caller's context (e.g. per-task usage tracking and profiling)
+                thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(run_profiled, self._worker, stage, queues[index], out_queue, remaining, remaining_lock, next_workers, results),
+                    name=f"{stage.name}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                if self._cancelled.is_set():
+                    break
+                self._put(queues[0], item)
+        except Exception as e:
+            self._fail(Stage("source", None), e)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(queues[0], _STOP)
+            for thread in threads:
+                thread.join()
+
+        if self._error is not None:
+            raise self._error
+        return results
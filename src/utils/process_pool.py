@@ -0,0 +1,151 @@
+import os
+import queue
+import atexit
+import logging
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+logger = logging.getLogger('vision_flow')
+
+class PageRing:
+    """
+    A fixed number of equally sized page slots in one shared memory segment.
+
+    The owning process creates the segment and hands out free slots; pool
+    workers attach to it by name and read and write pages in the slots.
+    """
+
+    def __init__(self, slots, slot_bytes, name=None):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+            self._free = queue.Queue()
+            for slot in range(slots):
+                self._free.put(slot)
+        else:
+            # Pool workers share the owner's resource tracker, which unlinks the segment only once
+            self.shm = shared_memory.SharedMemory(name=name)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def view(self, slot, shape, dtype):
+        """NumPy array backed directly by a slot's memory"""
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=self.shm.buf, offset=slot * self.slot_bytes)
+
+    def acquire(self):
+        """Take a free slot, blocking while all of them are in use"""
+        return self._free.get()
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+# Ring attached by each pool worker in _init_worker
+_worker_ring = None
+
+def _init_worker(ring_name, slots, slot_bytes, warm_up):
+    """Pool initializer: attach the page ring once and run the warm-up hook"""
+    global _worker_ring
+    _worker_ring = PageRing(slots, slot_bytes, ring_name)
+    if warm_up is not None:
+        warm_up()
+
+def _run_in_slot(func, slot, shape, dtype):
+    """
+    Apply func to the page in a slot and write the result back into the same slot.
+
+    Returns:
+        tuple: (shape, dtype) of the result, plus the result itself only when it does not fit the slot
+    """
+    result = np.ascontiguousarray(func(_worker_ring.view(slot, shape, dtype)))
+    if result.nbytes > _worker_ring.slot_bytes:
+        return result.shape, result.dtype.str, result
+    _worker_ring.view(slot, result.shape, result.dtype)[...] = result
+    return result.shape, result.dtype.str, None
+
+def _warm_opencv():
+    """Default warm-up: import OpenCV and keep it to one thread per worker process"""
+    import cv2
+    cv2.setNumThreads(1)
+
+class PagePool:
+    """
+    Long-lived process pool for CPU-heavy page work (e.g. check image cleaning).
+
+    Pages travel through a PageRing instead of being pickled: the caller copies
+    the page into a free slot, the worker reads it there and writes its result
+    back, and the caller copies the result out. That is two memory copies per
+    page but no serialization; only the slot index, shape and dtype go through
+    the pool's pipe. The warm_up hook runs once per worker (by default it only
+    loads OpenCV). Workers start from a forkserver, which is safe in a process
+    that already runs threads.
+
+    Configured with CPU_POOL_WORKERS, CPU_POOL_SLOTS and CPU_POOL_SLOT_MB.
+    """
+
+    def __init__(self, workers=None, slots=None, slot_mb=None, warm_up=_warm_opencv):
+        workers = workers or int(os.getenv('CPU_POOL_WORKERS', str(os.cpu_count() or 2)))
+        slots = slots or int(os.getenv('CPU_POOL_SLOTS', str(workers * 2)))
+        slot_mb = slot_mb or float(os.getenv('CPU_POOL_SLOT_MB', '16'))
+        self.ring = PageRing(slots, int(slot_mb * 1024 * 1024))
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('forkserver'),
+            initializer=_init_worker,
+            initargs=(self.ring.name, slots, self.ring.slot_bytes, warm_up)
+        )
+        self._closed = False
+        atexit.register(self.close)
+        logger.info(f"Started page pool with {workers} processes and {slots} x {slot_mb:g} MB page slots")
+
+    def run(self, func, page):
+        """
+        Run func(page) in a worker and return its array result.
+
+        func must be a picklable module-level function taking and returning a NumPy
+        array. Pages larger than a slot are pickled as a fallback.
+        """
+        page = np.ascontiguousarray(page)
+        if page.nbytes > self.ring.slot_bytes:
+            logger.debug("Page of %d bytes does not fit a %d byte slot, pickling it", page.nbytes, self.ring.slot_bytes)
+            return self.executor.submit(func, page).result()
+
+        slot = self.ring.acquire()
+        try:
+            self.ring.view(slot, page.shape, page.dtype)[...] = page
+            shape, dtype, oversized = self.executor.submit(_run_in_slot, func, slot, page.shape, page.dtype.str).result()
+            if oversized is not None:
+                return oversized
+            # Copy out so the slot can be reused as soon as this call returns
+            return self.ring.view(slot, shape, dtype).copy()
+        finally:
+            self.ring.release(slot)
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        if self._closed:
+            return
+        self._closed = True
+        self.executor.shutdown(wait=True)
+        self.ring.close()
+
+_page_pool = None
+
+def get_page_pool():
+    """Process-wide PagePool, or None unless CPU_POOL_ENABLED is set"""
+    global _page_pool
+    if os.getenv('CPU_POOL_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    if _page_pool is None:
+        _page_pool = PagePool()
+    return _page_pool
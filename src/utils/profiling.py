@@ -0,0 +1,178 @@
+import os
+import time
+import pstats
+import random
+import logging
+import cProfile
+import threading
+import contextvars
+import tracemalloc
+from pathlib import Path
+
+logger = logging.getLogger('vision_flow')
+
+def profiling_configured():
+    """Whether PROFILE_TASKS or PROFILE_SAMPLE_RATE asks for tasks to be profiled"""
+    return (os.getenv('PROFILE_TASKS', 'false').lower() in ('1', 'true', 'yes')
+            or int(os.getenv('PROFILE_SAMPLE_RATE', '0')) > 0)
+
+def should_profile(task):
+    """
+    Whether a task should run under the profiler: PROFILE_TASKS=true profiles
+    every task, a truthy 'profile' field on the task document profiles that task,
+    and PROFILE_SAMPLE_RATE=N profiles about one task in N.
+    """
+    if os.getenv('PROFILE_TASKS', 'false').lower() in ('1', 'true', 'yes'):
+        return True
+    if task.get("profile"):
+        return True
+    sample_rate = int(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+    return sample_rate > 0 and random.randrange(sample_rate) == 0
+
+# Profiler of the task running in this context; threads started in a copy of it inherit it
+_current_profiler = contextvars.ContextVar("profiler", default=None)
+
+# tracemalloc is process-wide, so it runs while any task is being profiled
+_tracemalloc_users = 0
+_tracemalloc_started = False
+_tracemalloc_lock = threading.Lock()
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '10')))
+                _tracemalloc_started = True
+            tracemalloc.reset_peak()
+        _tracemalloc_users += 1
+
+def _release_tracemalloc():
+    """Stop tracemalloc when the last profiled task finishes, if a profiler started it"""
+    global _tracemalloc_users, _tracemalloc_started
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_started:
+            tracemalloc.stop()
+            _tracemalloc_started = False
+
+def run_profiled(func, *args):
+    """Run func(*args), profiling this thread when it works for a task under a TaskProfiler"""
+    profiler = _current_profiler.get()
+    if profiler is None:
+        return func(*args)
+    profile = profiler._profile_thread()
+    try:
+        return func(*args)
+    finally:
+        if profile is not None:
+            profile.disable()
+
+class TaskProfiler:
+    """
+    Context manager capturing a CPU profile and tracemalloc statistics for one task.
+
+    The calling thread and the threads it starts through run_profiled() in a
+    copy of its context (e.g. pipeline stage workers) get their own cProfile
+    profiler; the results are merged when the task finishes. Threads of other
+    tasks running in the same worker are not profiled. tracemalloc is
+    process-wide, so while profiled tasks overlap their peak memory covers all
+    of them. Writes {task_id}.prof (pstats format) and {task_id}.memory.txt
+    under PROFILE_DIR, and builds a summary for the task.
+    """
+
+    def __init__(self, task_id, directory=None, top=10):
+        self.task_id = task_id
+        self.directory = Path(directory or os.getenv('PROFILE_DIR', 'logs/profiles'))
+        self.top = top
+        self.summary = None
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def _profile_thread(self):
+        """Start a cProfile profiler for the current thread, or return None if one cannot run"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active (interpreter-wide since Python 3.12)
+            logger.debug(f"Not profiling thread {threading.current_thread().name} of task {self.task_id}")
+            return None
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def __enter__(self):
+        _acquire_tracemalloc()
+        self._profile_thread()
+        self._context_token = _current_profiler.set(self)
+
+        self._wall_start = time.monotonic()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall_seconds = time.monotonic() - self._wall_start
+        cpu_seconds = time.process_time() - self._cpu_start
+        _current_profiler.reset(self._context_token)
+        with self._lock:
+            profiles = list(self._profiles)
+        for profile in profiles:
+            profile.disable()
+
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        _release_tracemalloc()
+
+        try:
+            self.summary = self._write_results(profiles, snapshot, wall_seconds, cpu_seconds, peak_bytes)
+        except Exception as e:
+            logger.error(f"Could not write profile of task {self.task_id}: {str(e)}")
+        return False
+
+    def _write_results(self, profiles, snapshot, wall_seconds, cpu_seconds, peak_bytes):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        profile_file = self.directory / f"{self.task_id}.prof"
+        memory_file = self.directory / f"{self.task_id}.memory.txt"
+
+        top_functions = []
+        ordered = []
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(str(profile_file))
+            ordered = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        for (filename, line, name), (_, calls, _, cumulative, _) in ordered[:self.top]:
+            top_functions.append({
+                "function": f"{os.path.basename(filename)}:{line}({name})",
+                "calls": calls,
+                "cumulativeSeconds": round(cumulative, 3)
+            })
+
+        allocation_stats = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]).statistics('lineno')
+        with open(memory_file, 'w') as f:
+            f.write(f"Peak traced memory: {peak_bytes / 1024 / 1024:.1f} MiB\n\n")
+            for stat in allocation_stats[:50]:
+                f.write(f"{stat}\n")
+        top_allocations = [{
+            "location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+            "sizeKB": round(stat.size / 1024, 1),
+            "count": stat.count
+        } for stat in allocation_stats[:self.top]]
+
+        logger.info(f"Profiled task {self.task_id}: {wall_seconds:.1f}s wall, {cpu_seconds:.1f}s CPU, "
+                    f"peak {peak_bytes / 1024 / 1024:.1f} MiB ({profile_file})")
+        return {
+            "wallSeconds": round(wall_seconds, 3),
+            "cpuSeconds": round(cpu_seconds, 3),
+            "threadsProfiled": len(profiles),
+            "peakMemoryMB": round(peak_bytes / 1024 / 1024, 1),
+            "topFunctions": top_functions,
+            "topAllocations": top_allocations,
+            "profileFile": str(profile_file) if profiles else None,
+            "memoryFile": str(memory_file)
+        }
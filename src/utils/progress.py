@@ -0,0 +1,135 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger('vision_flow')
+
+def expected_checks(task, file_doc):
+    """Checks a REPORT task should produce: its page range's pairs, else the document's numberOfChecks"""
+    page_range = task.get("pageRange")
+    if page_range:
+        return (page_range["lastPage"] - page_range["firstPage"]) // 2 + 1
+    return file_doc.get("numberOfChecks")
+
+class ProgressPublisher:
+    """
+    Live progress of a REPORT task, written to its `progress` field with throttled updates.
+
+    progress = {checksDone, checksTotal, checkIds, updatedAt}: checkIds lists the
+    checks already persisted, so consumers can fetch them while the rest of the
+    document is still processing. Subtasks also add to their parent's progress.
+    Writes happen at most every PROGRESS_MIN_INTERVAL seconds, plus once at the end.
+    They are best-effort: a failed write is logged and never fails the task.
+    done continues from progress already published for the task, e.g. when
+    batch_ingest.py finishes the checks a processor deferred.
+    """
+
+    def __init__(self, task_collection, task, total, min_interval=None, done=0):
+        self.task_collection = task_collection
+        self.task_id = task["_id"]
+        self.parent_task_id = task.get("parentTaskId")
+        self.total = total
+        self.min_interval = min_interval if min_interval is not None else float(os.getenv('PROGRESS_MIN_INTERVAL', '2'))
+        self.done = done
+        self._written_done = done
+        self._pending_ids = []
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def _count(self, check_id):
+        with self._lock:
+            self.done += 1
+            if check_id:
+                self._pending_ids.append(check_id)
+
+    def _take_updates(self, force=False):
+        """Collect unwritten progress as (filter, update) pairs, or None when throttled"""
+        with self._lock:
+            now = time.monotonic()
+            if self.done == self._written_done and not force:
+                return None
+            # The first and the last check are published right away
+            first = self._written_done == 0
+            finished = self.total is not None and self.done >= self.total
+            if not force and not first and not finished and now - self._last_write < self.min_interval:
+                return None
+            delta = self.done - self._written_done
+            check_ids, self._pending_ids = self._pending_ids, []
+            self._written_done = self.done
+            self._last_write = now
+            done = self.done
+
+        updated_at = datetime.now(timezone.utc)
+        updates = [({"_id": self.task_id}, {
+            # $max keeps the count monotonic if two writers race
+            "$max": {"progress.checksDone": done},
+            "$set": {"progress.checksTotal": self.total, "progress.updatedAt": updated_at},
+            "$push": {"progress.checkIds": {"$each": check_ids}}
+        })]
+        if self.parent_task_id and (delta or check_ids):
+            updates.append(({"_id": self.parent_task_id}, {
+                "$inc": {"progress.checksDone": delta},
+                "$set": {"progress.updatedAt": updated_at},
+                "$push": {"progress.checkIds": {"$each": check_ids}}
+            }))
+        return updates
+
+    def _write(self, updates):
+        try:
+            for query, update in updates:
+                self.task_collection.update_one(query, update)
+        except Exception as e:
+            logger.warning(f"Error publishing progress of task {self.task_id}: {str(e)}")
+
+    def _reset_update(self):
+        """Initial 0/total progress, replacing anything left by an earlier attempt"""
+        self._last_write = time.monotonic()
+        return [({"_id": self.task_id}, {"$set": {"progress": {
+            "checksDone": 0,
+            "checksTotal": self.total,
+            "checkIds": [],
+            "updatedAt": datetime.now(timezone.utc)
+        }}})]
+
+    def start(self):
+        """Publish the initial 0/total progress"""
+        self._write(self._reset_update())
+
+    def check_done(self, check_details=None):
+        """Count one finished page pair; check_details is None when it produced no check (blank sheet)"""
+        self._count(check_details.id if check_details is not None else None)
+        updates = self._take_updates()
+        if updates:
+            self._write(updates)
+
+    def flush(self):
+        """Write whatever the throttling held back"""
+        updates = self._take_updates(force=self.done != self._written_done)
+        if updates:
+            self._write(updates)
+
+class AsyncProgressPublisher(ProgressPublisher):
+    """ProgressPublisher for a motor collection; the public methods are coroutines"""
+
+    async def _write(self, updates):
+        try:
+            for query, update in updates:
+                await self.task_collection.update_one(query, update)
+        except Exception as e:
+            logger.warning(f"Error publishing progress of task {self.task_id}: {str(e)}")
+
+    async def start(self):
+        await self._write(self._reset_update())
+
+    async def check_done(self, check_details=None):
+        self._count(check_details.id if check_details is not None else None)
+        updates = self._take_updates()
+        if updates:
+            await self._write(updates)
+
+    async def flush(self):
+        updates = self._take_updates(force=self.done != self._written_done)
+        if updates:
+            await self._write(updates)
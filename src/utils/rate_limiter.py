@@ -0,0 +1,396 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+from utils.usage import record_usage
+
+logger = logging.getLogger('vision_flow')
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at capacity tokens per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """
+        Take tokens, letting the balance go negative, and return how long the
+        caller must wait before the reservation is covered.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_reserve(self, amount=1):
+        """Take tokens only if the balance covers them; returns a callback giving them back, or None"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < amount:
+                return None
+            self.tokens -= amount
+        return lambda: self.adjust(amount)
+
+    def adjust(self, amount):
+        """Return (positive) or charge (negative) tokens after the real cost is known"""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: grows by ~1 per window of successes, shrinks multiplicatively on throttling"""
+
+    def __init__(self, initial=8, minimum=1, maximum=64, decrease_factor=0.5, decrease_interval=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        # A burst of 429s from one overload event should only shrink the limit once
+        self.decrease_interval = decrease_interval
+        self._last_decrease = 0.0
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+class MongoBudget:
+    """
+    Per-minute budget shared by every worker through a MongoDB collection.
+
+    Each window is one document whose counter is incremented atomically; a
+    TTL index removes old windows. A request that does not fit is counted in
+    the next window with room, where it is sent, not in the full one.
+    """
+
+    def __init__(self, collection, name, per_minute):
+        self.collection = collection
+        self.name = name
+        self.per_minute = per_minute
+        try:
+            self.collection.create_index("expiresAt", expireAfterSeconds=0)
+        except Exception as e:
+            logger.warning(f"Could not create TTL index for shared rate limit budget: {str(e)}")
+
+    def _take(self, window, amount):
+        """Count amount in a window unless it is full; returns its key, or None"""
+        key = f"{self.name}:{window.isoformat()}"
+        doc = self.collection.find_one_and_update(
+            {"_id": key},
+            {"$inc": {"used": amount}, "$setOnInsert": {"expiresAt": window + timedelta(minutes=2)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        # A single request larger than the whole budget still gets an empty window to itself
+        if doc["used"] <= self.per_minute or doc["used"] == amount:
+            return key
+        # Give it back, so a window only counts the requests actually sent in it
+        self.collection.update_one({"_id": key}, {"$inc": {"used": -amount}})
+        return None
+
+    def try_reserve(self, amount=1):
+        """Consume budget only if the current window has room; returns a callback giving it back, or None"""
+        key = self._take(datetime.now(timezone.utc).replace(second=0, microsecond=0), amount)
+        if key is None:
+            return None
+        return lambda: self.collection.update_one({"_id": key}, {"$inc": {"used": -amount}})
+
+    def reserve(self, amount=1):
+        """
+        Consume budget in the first window with room and return seconds until
+        that window starts (0 when it is the current one).
+        """
+        now = datetime.now(timezone.utc)
+        window = now.replace(second=0, microsecond=0)
+        while self._take(window, amount) is None:
+            window += timedelta(minutes=1)
+        return max(0.0, (window - now).total_seconds())
+
+def is_throttling_error(error):
+    """True for 429 / quota errors from the OpenAI or Google client libraries"""
+    if getattr(error, 'status_code', None) == 429:
+        return True
+    try:
+        if int(getattr(error, 'code', 0) or 0) == 429:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return type(error).__name__ in ('RateLimitError', 'TooManyRequests', 'ResourceExhausted')
+
+def is_transient_error(error):
+    """True for connection failures and 5xx server errors, which are worth retrying after a pause"""
+    if type(error).__name__ in ('APIConnectionError', 'APITimeoutError', 'InternalServerError',
+                                'ServiceUnavailable', 'BadGateway', 'GatewayTimeout', 'ConnectionError'):
+        return True
+    for attribute in ('status_code', 'code'):
+        try:
+            if int(getattr(error, attribute, 0) or 0) >= 500:
+                return True
+        except (TypeError, ValueError):
+            pass
+    return False
+
+def get_retry_after(error):
+    """Seconds requested by a Retry-After (or retry-after-ms) header, if any"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+class RateLimiter:
+    """
+    Client-side limiter for one remote API.
+
+    Combines request/min and token/min buckets, an AIMD concurrency limit and a
+    shared cool-off honoring Retry-After. Throttled calls, connection failures
+    and 5xx errors are retried with backoff instead of failing the caller; the
+    OpenAI clients are created with their own retries disabled.
+
+    Every request sent holds its own admission (budget and a concurrency
+    slot); call_hedged() extends this to the extra requests of a HedgedCaller.
+    """
+
+    def __init__(self, name, requests_per_minute=0, tokens_per_minute=0, initial_concurrency=8,
+                 max_concurrency=64, max_retries=5, shared_collection=None):
+        self.name = name
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.shared_requests = None
+        self.shared_tokens = None
+        if shared_collection is not None:
+            if requests_per_minute:
+                self.shared_requests = MongoBudget(shared_collection, f"{name}:requests", requests_per_minute)
+            if tokens_per_minute:
+                self.shared_tokens = MongoBudget(shared_collection, f"{name}:tokens", tokens_per_minute)
+        self._paused_until = 0.0
+        self._pause_lock = threading.Lock()
+
+    def _pause(self, seconds):
+        with self._pause_lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _admission_delay(self, token_cost):
+        """Reserve budget for one request and return how long to wait before sending it"""
+        delay = max(0.0, self._paused_until - time.monotonic())
+        if self.request_bucket:
+            delay = max(delay, self.request_bucket.reserve(1))
+        if self.token_bucket and token_cost:
+            delay = max(delay, self.token_bucket.reserve(token_cost))
+        if self.shared_requests:
+            delay = max(delay, self.shared_requests.reserve(1))
+        if self.shared_tokens and token_cost:
+            delay = max(delay, self.shared_tokens.reserve(token_cost))
+        return delay
+
+    def _backoff(self, error, attempt, throttled):
+        retry_after = get_retry_after(error)
+        if retry_after is None:
+            retry_after = min(60.0, (2 ** attempt) + random.uniform(0, 1))
+        record_usage(retries=1)
+        if throttled:
+            # Throttling applies to every caller, a failed request only to this one
+            self._pause(retry_after)
+            logger.warning(f"{self.name} throttled (attempt {attempt + 1}/{self.max_retries + 1}), "
+                           f"backing off {retry_after:.1f}s, concurrency limit now {int(self.concurrency.limit)}")
+        else:
+            logger.warning(f"{self.name} call failed (attempt {attempt + 1}/{self.max_retries + 1}), "
+                           f"retrying in {retry_after:.1f}s: {str(error)}")
+        return retry_after
+
+    def _settle_tokens(self, result, token_cost, token_usage):
+        if self.token_bucket and token_usage is not None and token_cost:
+            try:
+                self.token_bucket.adjust(token_cost - token_usage(result))
+            except Exception:
+                pass
+
+    def _release(self, error=None):
+        """Give back the concurrency slot of one finished request"""
+        self.concurrency.release(throttled=error is not None and is_throttling_error(error))
+
+    def admit(self, token_cost=0):
+        """Wait until one request fits the limits and return the callback releasing its slot"""
+        delay = self._admission_delay(token_cost)
+        if delay > 0:
+            time.sleep(delay)
+        self.concurrency.acquire()
+        return self._release
+
+    async def admit_async(self, token_cost=0):
+        """Asyncio variant of admit()"""
+        if self.shared_requests or self.shared_tokens:
+            # The shared budget uses blocking pymongo calls
+            delay = await asyncio.to_thread(self._admission_delay, token_cost)
+        else:
+            delay = self._admission_delay(token_cost)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        while not self.concurrency.try_acquire():
+            await asyncio.sleep(0.05)
+        return self._release
+
+    def try_admit(self, token_cost=0):
+        """
+        Admit one optional request (a hedge) only if it fits every limit right
+        now, without waiting.
+
+        Returns:
+            callable: Releases the request's slot, or None when it was not admitted
+        """
+        if time.monotonic() < self._paused_until:
+            return None
+        refunds = []
+        for budget, amount in ((self.request_bucket, 1), (self.token_bucket, token_cost),
+                               (self.shared_requests, 1), (self.shared_tokens, token_cost)):
+            if budget is None or not amount:
+                continue
+            refund = budget.try_reserve(amount)
+            if refund is None:
+                break
+            refunds.append(refund)
+        else:
+            if self.concurrency.try_acquire():
+                return self._release
+        for refund in refunds:
+            refund()
+        return None
+
+    async def try_admit_async(self, token_cost=0):
+        """Asyncio variant of try_admit()"""
+        if self.shared_requests or self.shared_tokens:
+            return await asyncio.to_thread(self.try_admit, token_cost)
+        return self.try_admit(token_cost)
+
+    def call(self, func, *args, token_cost=0, token_usage=None, **kwargs):
+        """
+        Call func(*args, **kwargs) within the limits, retrying throttled and transient failures.
+
+        Args:
+            token_cost (int): Estimated tokens the call consumes (for tokens/min limits)
+            token_usage (callable): Maps the result to the real token count, to correct the estimate
+        """
+        attempt = 0
+        while True:
+            release = self.admit(token_cost)
+            error = None
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                release(error)
+
+            if error is None:
+                self._settle_tokens(result, token_cost, token_usage)
+                return result
+            throttled = is_throttling_error(error)
+            if not (throttled or is_transient_error(error)) or attempt >= self.max_retries:
+                raise error
+
+            time.sleep(self._backoff(error, attempt, throttled))
+            attempt += 1
+
+    async def call_async(self, func, *args, token_cost=0, token_usage=None, **kwargs):
+        """Asyncio variant of call() for coroutine functions"""
+        attempt = 0
+        while True:
+            release = await self.admit_async(token_cost)
+            error = None
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                error = e
+            finally:
+                release(error)
+
+            if error is None:
+                self._settle_tokens(result, token_cost, token_usage)
+                return result
+            throttled = is_throttling_error(error)
+            if not (throttled or is_transient_error(error)) or attempt >= self.max_retries:
+                raise error
+
+            await asyncio.sleep(self._backoff(error, attempt, throttled))
+            attempt += 1
+
+    def call_hedged(self, hedger, func, *args, token_cost=0, token_usage=None, **kwargs):
+        """
+        call() through a HedgedCaller whose hedges and timeout retries are
+        admitted by this limiter like any other request.
+        """
+        return self.call(hedger.call, func, *args, limiter=self, admit_cost=token_cost,
+                         token_cost=token_cost, token_usage=token_usage, **kwargs)
+
+    async def call_hedged_async(self, hedger, func, *args, token_cost=0, token_usage=None, **kwargs):
+        """Asyncio variant of call_hedged()"""
+        return await self.call_async(hedger.call_async, func, *args, limiter=self, admit_cost=token_cost,
+                                     token_cost=token_cost, token_usage=token_usage, **kwargs)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(name, db=None):
+    """
+    Return the process-wide limiter for an API, configured from the environment:
+    {NAME}_RPM, {NAME}_TPM, {NAME}_MAX_CONCURRENCY, RATE_LIMIT_MAX_RETRIES and
+    RATE_LIMIT_SHARED (use a MongoDB-backed budget shared by all workers; needs db).
+    """
+    with _limiters_lock:
+        if name not in _limiters:
+            prefix = name.upper()
+            shared_collection = None
+            if db is not None and os.getenv('RATE_LIMIT_SHARED', 'false').lower() in ('1', 'true', 'yes'):
+                shared_collection = db['rate_limit_budget']
+            _limiters[name] = RateLimiter(
+                name,
+                requests_per_minute=int(os.getenv(f'{prefix}_RPM', '0')),
+                tokens_per_minute=int(os.getenv(f'{prefix}_TPM', '0')),
+                initial_concurrency=int(os.getenv(f'{prefix}_INITIAL_CONCURRENCY', '8')),
+                max_concurrency=int(os.getenv(f'{prefix}_MAX_CONCURRENCY', '64')),
+                max_retries=int(os.getenv('RATE_LIMIT_MAX_RETRIES', '5')),
+                shared_collection=shared_collection
+            )
+        return _limiters[name]
@@ -0,0 +1,60 @@
+from utils.mongo_utils import transition_timestamps
+
+def subtask_result_update(success, number_of_checks, now):
+    """Update counting one finished subtask on its parent task"""
+    return {
+        "$inc": {
+            "completedSubtasks": 1 if success else 0,
+            "failedSubtasks": 0 if success else 1,
+            "numberOfChecks": number_of_checks
+        },
+        "$set": {"updatedAt": now}
+    }
+
+def parent_completion(parent, now):
+    """
+    Final status and update of a parent task whose subtasks have all finished.
+
+    Returns:
+        tuple: (status, update), or None while subtasks are still running
+    """
+    if parent["completedSubtasks"] + parent["failedSubtasks"] < parent["subtaskCount"]:
+        return None
+    status = "COMPLETED" if parent["failedSubtasks"] == 0 else "FAILED"
+    result = {
+        "success": status == "COMPLETED",
+        "numberOfChecks": parent["numberOfChecks"],
+        "completedSubtasks": parent["completedSubtasks"],
+        "failedSubtasks": parent["failedSubtasks"],
+        "processedAt": now.isoformat()
+    }
+    return status, {"$set": {
+        "status": status,
+        "processingResult": result,
+        "updatedAt": now,
+        **transition_timestamps(status, now)
+    }}
+
+def finish_report_steps(task, success, number_of_checks=0):
+    """
+    Steps of finishing a REPORT (sub)task, for utils.steps.run_steps().
+
+    A subtask is rolled into its parent; once the whole document succeeded it is
+    registered under its content hash.
+
+    Returns:
+        bool: True when the document is finished (successfully or not), so its cached pages can go
+    """
+    document_id = task["documentId"]
+    parent_task_id = task.get("parentTaskId")
+    if parent_task_id:
+        parent = yield "record_subtask_result", (parent_task_id, success, number_of_checks), {}
+        if parent is None:
+            return False
+        number_of_checks = parent["numberOfChecks"]
+        yield "update_file_document", (document_id, number_of_checks), {}
+        success = parent["status"] == "COMPLETED"
+
+    if success:
+        yield "register_document_hash", (document_id, number_of_checks), {}
+    return True
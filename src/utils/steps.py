@@ -0,0 +1,36 @@
+def run_steps(target, steps):
+    """
+    Drive a generator of I/O steps with target's blocking methods.
+
+    Logic shared by the threaded and asyncio services is written once as a
+    generator that yields (method_name, args, kwargs) and receives the result
+    of target.method_name(*args, **kwargs), or has its exception thrown in.
+    The generator's return value is returned.
+    """
+    try:
+        step = next(steps)
+        while True:
+            name, args, kwargs = step
+            try:
+                result = getattr(target, name)(*args, **kwargs)
+            except Exception as e:
+                step = steps.throw(e)
+            else:
+                step = steps.send(result)
+    except StopIteration as done:
+        return done.value
+
+async def run_steps_async(target, steps):
+    """run_steps() for a target whose methods are coroutines"""
+    try:
+        step = next(steps)
+        while True:
+            name, args, kwargs = step
+            try:
+                result = await getattr(target, name)(*args, **kwargs)
+            except Exception as e:
+                step = steps.throw(e)
+            else:
+                step = steps.send(result)
+    except StopIteration as done:
+        return done.value
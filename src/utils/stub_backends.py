@@ -0,0 +1,224 @@
+import re
+import json
+import time
+import zlib
+import random
+import logging
+from types import SimpleNamespace
+import numpy as np
+
+logger = logging.getLogger('vision_flow')
+
+# Pages with more ink than this are treated as check fronts by the stub OCR
+FRONT_INK_THRESHOLD = 0.1
+
+PAYEES = ["Jane Doe", "Northwind Traders", "Contoso Ltd", "Fabrikam Inc", "A. Smith", "Tailspin Toys"]
+BANKS = ["ROYAL BANK OF CANADA MAIN BRANCH", "TD CANADA TRUST KING ST", "BANK OF MONTREAL YONGE ST"]
+
+class StubBackendError(Exception):
+    """Injected failure of a stub backend; status_code 429 is retried by the rate limiter as throttling"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.status_code = status_code
+
+class StubBackend:
+    """Latency and failure injection shared by the stub OCR and LLM clients"""
+
+    def __init__(self, name, latency=0.2, jitter=0.3, error_rate=0.0, throttle_rate=0.0):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.random = random.Random()
+
+    def wait(self):
+        """Sleep for one call's latency, then fail it with the configured error and throttle rates"""
+        time.sleep(max(0.0, self.random.gauss(self.latency, self.latency * self.jitter)))
+        roll = self.random.random()
+        if roll < self.throttle_rate:
+            raise StubBackendError(f"{self.name}: rate limit exceeded", status_code=429)
+        if roll < self.throttle_rate + self.error_rate:
+            raise StubBackendError(f"{self.name}: injected server error")
+
+def stub_check_text(seed):
+    """OCR text of a check front that the stub LLM can read all fields back from"""
+    rng = random.Random(seed)
+    return "\n".join([
+        "LOAD TEST SUPPLIES 12 MAIN ST TORONTO ON",
+        f"DATE {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2020, 2025)}",
+        f"PAY TO THE ORDER OF {rng.choice(PAYEES)}  ${rng.randint(1, 9999):,}.{rng.randint(0, 99):02d}",
+        "DOLLARS",
+        rng.choice(BANKS),
+        f"NO {rng.randint(100, 999999):06d}",
+        f"{rng.randint(10000, 99999)}-{rng.randint(0, 999):03d} "
+        f"{rng.randint(100, 999)}-{rng.randint(100, 999)}-{rng.randint(0, 9)}",
+        "SIGNATURE"
+    ])
+
+STUB_BACK_TEXT = "ENDORSE HERE\nDO NOT WRITE BELOW THIS LINE\nFOR DEPOSIT ONLY"
+
+# Top-left corners (x, y), as fractions of the page, of the lines of stub_check_text() on a check front;
+# the signature sits in the lower right like on a real check
+FRONT_LINE_POSITIONS = [(0.04, 0.04), (0.60, 0.16), (0.04, 0.34), (0.04, 0.46),
+                        (0.04, 0.64), (0.04, 0.74), (0.04, 0.88), (0.60, 0.74)]
+BACK_LINE_POSITIONS = [(0.30, 0.10), (0.30, 0.40), (0.30, 0.70)]
+
+def _text_annotation(text, positions, width, height):
+    """full_text_annotation of a document_text_detection response, one block per line of text"""
+    blocks = []
+    for line, (x, y) in zip(text.split("\n"), positions):
+        x0, y0 = int(x * width), int(y * height)
+        x1, y1 = x0 + int(0.3 * width), y0 + int(0.06 * height)
+        words = [SimpleNamespace(symbols=[SimpleNamespace(text=c) for c in word]) for word in line.split()]
+        blocks.append(SimpleNamespace(
+            bounding_box=SimpleNamespace(vertices=[SimpleNamespace(x=vx, y=vy) for vx, vy in
+                                                   ((x0, y0), (x1, y0), (x1, y1), (x0, y1))]),
+            paragraphs=[SimpleNamespace(words=words)]
+        ))
+    return SimpleNamespace(text=text, pages=[SimpleNamespace(blocks=blocks)])
+
+class StubVisionClient:
+    """
+    Stand-in for vision.ImageAnnotatorClient.
+
+    Pages with enough ink (the fronts drawn by write_synthetic_pdf) get a check
+    front text derived from their pixels, so the same page always reads the
+    same; the others get a check back text. document_text_detection() lays
+    the lines out as blocks roughly where they sit on a real check.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def _read(self, content):
+        """(text, is_front, gray page) of an uploaded image"""
+        import cv2
+        self.backend.wait()
+        gray = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_GRAYSCALE)
+        is_front = gray is not None and float((gray < 160).mean()) > FRONT_INK_THRESHOLD
+        text = stub_check_text(zlib.crc32(content)) if is_front else STUB_BACK_TEXT
+        return text, is_front, gray
+
+    def text_detection(self, image, timeout=None):
+        text, _, _ = self._read(image.content)
+        return SimpleNamespace(text_annotations=[SimpleNamespace(description=text)])
+
+    def document_text_detection(self, image, timeout=None):
+        text, is_front, gray = self._read(image.content)
+        height, width = gray.shape if gray is not None else (1, 1)
+        positions = FRONT_LINE_POSITIONS if is_front else BACK_LINE_POSITIONS
+        return SimpleNamespace(full_text_annotation=_text_annotation(text, positions, width, height))
+
+# Where the stub LLM finds each field in the text written by stub_check_text (line breaks become spaces in prompts)
+FIELD_EXTRACTORS = {
+    "payee_name": re.compile(r"PAY TO THE ORDER OF (.+?)\s+\$"),
+    "amount": re.compile(r"(\$[\d,]+\.\d{2})"),
+    "date": re.compile(r"DATE (\d{2}/\d{2}/\d{4})"),
+    "check_number": re.compile(r"\bNO (\d+)"),
+    "check_transit_number": re.compile(r"\b(\d{5})-\d{3} "),
+    "check_institution_number": re.compile(r"\b\d{5}-(\d{3}) "),
+    "check_bank_account_number": re.compile(r" (\d{3}-\d{3}-\d)\b"),
+    "bank": re.compile(r"DOLLARS (.+?) NO \d"),
+    "company_name_address": re.compile(r"^(LOAD TEST .+?) DATE"),
+}
+
+def _prompt_check_text(messages):
+    """The OCR text section of an extraction or repair prompt"""
+    prompt = str((messages or [{}])[-1].get("content", ""))
+    return prompt.partition("Check Text:\n")[2].split("\n\n", 1)[0]
+
+class _StubCompletions:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def create(self, model=None, messages=None, max_tokens=None, response_format=None, **kwargs):
+        self.backend.wait()
+        prompt = "\n".join(str(message.get("content", "")) for message in messages or [])
+        check_text = _prompt_check_text(messages)
+        fields = {}
+        for name, pattern in FIELD_EXTRACTORS.items():
+            match = pattern.search(check_text)
+            fields[name] = match.group(1).strip() if match else "Not Found"
+        # Answer only the fields asked for, like a strict response_format would
+        if response_format:
+            asked = response_format["json_schema"]["schema"]["required"]
+            fields = {name: fields.get(name, "Not Found") for name in asked}
+        content = json.dumps(fields)
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        return SimpleNamespace(
+            choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=content))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                                  total_tokens=prompt_tokens + completion_tokens),
+            model=model
+        )
+
+class StubOpenAIClient:
+    """Stand-in for the OpenAI client: chat.completions.create() reads the fields back out of the prompt"""
+
+    def __init__(self, backend):
+        self.chat = SimpleNamespace(completions=_StubCompletions(backend))
+
+def install_stub_backends(ocr=None, llm=None):
+    """
+    Make CheckProcessor use the stub OCR and LLM clients in this process.
+
+    Args:
+        ocr (dict): StubBackend settings for OCR (latency, jitter, error_rate, throttle_rate)
+        llm (dict): StubBackend settings for the LLM
+    """
+    import process_checks
+    ocr_backend = StubBackend("ocr", **(ocr or {}))
+    llm_backend = StubBackend("llm", **(llm or {}))
+    process_checks.setup_google_vision_auth = lambda: StubVisionClient(ocr_backend)
+    process_checks.OpenAI = lambda **kwargs: StubOpenAIClient(llm_backend)
+    logger.info(f"Using stub backends: OCR {ocr or {}}, LLM {llm or {}}")
+
+def _page_stream(rng, front, width, height):
+    """Filled bars standing in for the printed lines of a check front, or a few marks on a back"""
+    bars = []
+    if front:
+        for line in range(14):
+            y = height - 24 - line * 18
+            x = rng.randint(20, 120)
+            bars.append((x, y, rng.randint(150, width - x - 20), 12))
+    else:
+        for _ in range(4):
+            bars.append((rng.randint(20, width - 220), rng.randint(20, height - 30), rng.randint(80, 200), 6))
+    return ("0 g\n" + "".join(f"{x} {y} {w} {h} re f\n" for x, y, w, h in bars)).encode()
+
+def write_synthetic_pdf(path, pages, seed=0, width=612, height=288):
+    """
+    Write a PDF of check-sized pages alternating fronts and backs.
+
+    Pages are vector drawings unique per seed, so they render quickly and are
+    neither blank nor duplicates of each other for the page filter.
+    """
+    rng = random.Random(seed)
+    streams = [_page_stream(rng, index % 2 == 0, width, height) for index in range(pages)]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>"
+         % (" ".join(f"{3 + 2 * i} 0 R" for i in range(pages)), pages)).encode()
+    ]
+    for index, stream in enumerate(streams):
+        objects.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width} {height}] "
+                        f"/Contents {4 + 2 * index} 0 R /Resources << >> >>").encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(bytes(out))
+    return path
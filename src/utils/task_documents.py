@@ -0,0 +1,86 @@
+import uuid
+from utils.mongo_utils import transition_timestamps
+
+def handoff_task_id(source_task_id, name):
+    """Task ID derived from the task that queues it, so queueing it again is a duplicate; random without a source"""
+    if source_task_id is None:
+        return None
+    return uuid.uuid5(uuid.NAMESPACE_URL, f"{source_task_id}/{name}").hex
+
+def service_result_field(service_name):
+    """Task field holding a service's result"""
+    # Use different field names based on service type
+    if service_name == "CheckValidator":
+        return "validationResult"
+    elif service_name == "CheckProcessor":
+        return "processingResult"
+    return "result"
+
+def pending_tasks_query(task_type, document_category):
+    """Query of the NOT_STARTED tasks of a queue"""
+    return {
+        "documentCategory": document_category,
+        "type": task_type,
+        "status": "NOT_STARTED"
+    }
+
+def claim_task_update(worker_id, now):
+    """Update moving a claimed task to IN_PROGRESS"""
+    return {"$set": {
+        "status": "IN_PROGRESS",
+        "updatedAt": now,
+        "claimedBy": worker_id,
+        **transition_timestamps("IN_PROGRESS", now)
+    }}
+
+def task_started_update(now):
+    """Update recording when processing of a claimed task began"""
+    return {"$set": {"startedAt": now}}
+
+def task_document(document_id, now, document_category="bank_checks", task_type="REPORT", status="NOT_STARTED",
+                  extra_fields=None, task_id=None):
+    """Task document, not yet inserted"""
+    return {
+        "createdAt": now,
+        "updatedAt": now,
+        "_id": task_id or uuid.uuid4().hex,
+        "documentId": document_id,
+        "documentCategory": document_category,
+        "type": task_type,
+        "status": status,
+        **transition_timestamps(status, now),
+        **(extra_fields or {})
+    }
+
+def task_status_fields(status, now, field=None, result=None):
+    """Fields to $set on a task moving to status, with its result stored under field"""
+    update_data = {
+        "status": status,
+        "updatedAt": now,
+        **transition_timestamps(status, now)
+    }
+    if result:
+        update_data[field] = result
+    return update_data
+
+def document_hash_update(document_id, number_of_checks, now):
+    """Upsert of a document_hash entry; the first document processed for a hash stays the canonical one"""
+    return {"$setOnInsert": {
+        "documentId": document_id,
+        "numberOfChecks": number_of_checks,
+        "createdAt": now
+    }}
+
+def document_usage_update(usage, now):
+    """Update adding a task's API usage counters to its file document"""
+    return {
+        "$inc": {f"usage.{name}": amount for name, amount in usage.items()},
+        "$set": {"updatedAt": now}
+    }
+
+def number_of_checks_update(number_of_checks, now):
+    """Update storing the number of checks of a file document"""
+    return {"$set": {
+        "numberOfChecks": number_of_checks,
+        "updatedAt": now
+    }}
@@ -0,0 +1,81 @@
+import os
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Counters accumulated per task; all start at zero
+USAGE_FIELDS = (
+    "ocrRequests",         # Vision requests sent, including retries and hedges
+    "ocrBytesUploaded",    # encoded image bytes sent to Vision
+    "ocrSeconds",          # wall time spent waiting for OCR results
+    "llmRequests",         # chat completion requests that returned
+    "promptTokens",        # tokens of the primary model
+    "completionTokens",
+    "fastPromptTokens",    # tokens of the fast model (see ModelRouter)
+    "fastCompletionTokens",
+    "fastExtractions",     # checks routed to the fast model
+    "escalations",         # fast-model answers re-extracted with the primary model
+    "llmSeconds",          # wall time spent waiting for chat completions
+    "retries",             # throttling and timeout retries of either API
+    "hedges",              # duplicate requests sent against slow responses
+    "pageCacheHits",       # pages loaded from the page cache instead of rendered
+    "ocrCacheHits",        # duplicate pages whose OCR result was reused
+)
+
+def _price(name, default):
+    return float(os.getenv(name, default))
+
+def estimate_cost(counts):
+    """
+    Estimated USD cost of the given counters.
+
+    Prices come from OCR_PRICE_PER_1000 (Vision text detection, per 1000 requests),
+    LLM_PROMPT_PRICE_PER_1M / LLM_COMPLETION_PRICE_PER_1M and their LLM_FAST_*
+    counterparts for the fast model (per million tokens).
+    """
+    return (
+        counts.get("ocrRequests", 0) * _price('OCR_PRICE_PER_1000', '1.50') / 1000
+        + counts.get("promptTokens", 0) * _price('LLM_PROMPT_PRICE_PER_1M', '2.50') / 1_000_000
+        + counts.get("completionTokens", 0) * _price('LLM_COMPLETION_PRICE_PER_1M', '10.00') / 1_000_000
+        + counts.get("fastPromptTokens", 0) * _price('LLM_FAST_PROMPT_PRICE_PER_1M', '0.15') / 1_000_000
+        + counts.get("fastCompletionTokens", 0) * _price('LLM_FAST_COMPLETION_PRICE_PER_1M', '0.60') / 1_000_000
+    )
+
+class UsageStats:
+    """Thread-safe API usage counters for one task"""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(USAGE_FIELDS, 0)
+        self._lock = threading.Lock()
+
+    def add(self, **amounts):
+        with self._lock:
+            for name, amount in amounts.items():
+                self.counts[name] = self.counts.get(name, 0) + amount
+
+    def as_dict(self):
+        """Counters with rounded durations and the estimated cost, ready to store"""
+        with self._lock:
+            counts = dict(self.counts)
+        counts["ocrSeconds"] = round(counts["ocrSeconds"], 3)
+        counts["llmSeconds"] = round(counts["llmSeconds"], 3)
+        counts["estimatedCostUsd"] = round(estimate_cost(counts), 6)
+        return counts
+
+# Usage of the task running in the current thread or asyncio task
+_current_usage = contextvars.ContextVar("usage", default=None)
+
+@contextmanager
+def track_usage(stats):
+    """Attribute every record_usage() call made in this context to stats"""
+    token = _current_usage.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_usage.reset(token)
+
+def record_usage(**amounts):
+    """Add to the current task's counters; a no-op outside track_usage()"""
+    stats = _current_usage.get()
+    if stats is not None:
+        stats.add(**amounts)
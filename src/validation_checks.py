@@ -1,7 +1,10 @@
 import os
 import sys
+import json
+import time
 import argparse
-from pdf2image import convert_from_path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pdf2image import convert_from_path, pdfinfo_from_path
 from dotenv import load_dotenv
 from utils.logger import setup_logger
 
@@ -12,15 +15,18 @@ load_dotenv()
 logger = setup_logger()
 
 class PDFValidator:
-    def __init__(self):
-        pass
+    def __init__(self, page_cache=None):
+        # Optional PageCache; when set, rendered pages are kept for the REPORT stage
+        self.page_cache = page_cache
     
-    def validate_pdf_images(self, pdf_path):
+    def validate_pdf_images(self, pdf_path, document_id=None, pdf_hash=None):
         """
         Validate that a PDF has an even number of images.
         
         Args:
             pdf_path (str): Path to the PDF file
+            document_id (str): Document ID used to key the page cache (optional)
+            pdf_hash (str): Precomputed content hash of the PDF (optional)
             
         Returns:
             tuple: (is_valid, image_count, error_message)
@@ -32,7 +38,7 @@ class PDFValidator:
             
             # Convert PDF to images
             logger.info(f"Converting PDF to images: {pdf_path}")
-            images = convert_from_path(pdf_path)
+            images = self._render_pages(pdf_path, document_id, pdf_hash)
             
             image_count = len(images)
             logger.info(f"Found {image_count} images in PDF")
@@ -51,9 +57,83 @@ class PDFValidator:
             logger.error(error_msg)
             return False, 0, error_msg
 
+    def validate_page_count(self, pdf_path):
+        """
+        Validate a PDF from its page count alone, without rendering any page.
+
+        Same rule as validate_pdf_images, but reads only the PDF metadata, which
+        makes it suitable for pre-screening many files.
+
+        Returns:
+            tuple: (is_valid, page_count, message)
+        """
+        try:
+            if not os.path.exists(pdf_path):
+                return False, 0, f"PDF file not found: {pdf_path}"
+
+            page_count = pdfinfo_from_path(pdf_path)["Pages"]
+            if page_count % 2 != 0:
+                return False, page_count, f"Invalid PDF: Found {page_count} images (odd number). Each check must have both front and back images."
+            return True, page_count, "PDF has valid number of images"
+
+        except Exception as e:
+            return False, 0, f"Error validating PDF: {str(e)}"
+
+    def _render_pages(self, pdf_path, document_id, pdf_hash=None):
+        """Render pages into the page cache when available, otherwise in memory"""
+        if self.page_cache is not None and document_id:
+            try:
+                return self.page_cache.render(pdf_path, document_id, pdf_hash)
+            except Exception as e:
+                logger.warning(f"Could not cache rendered pages for document {document_id}: {str(e)}")
+        return convert_from_path(pdf_path)
+
+def validate_bulk(sources, workers=None, output=None):
+    """
+    Validate many PDFs concurrently and write one JSON line per file as it finishes.
+
+    Args:
+        sources (list): Directories, glob patterns, manifest files or PDF paths
+        workers (int): Worker threads (each waits on a pdfinfo subprocess)
+        output: Text stream for the JSON lines (defaults to stdout)
+
+    Returns:
+        tuple: (number of files, number of invalid files)
+    """
+    from utils.batch_inputs import resolve_inputs
+
+    output = output or sys.stdout
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    validator = PDFValidator()
+
+    def validate(pdf_path):
+        start = time.monotonic()
+        is_valid, page_count, message = validator.validate_page_count(pdf_path)
+        return {
+            "path": pdf_path,
+            "valid": is_valid,
+            "pageCount": page_count,
+            "message": message,
+            "seconds": round(time.monotonic() - start, 4)
+        }
+
+    pdf_paths = resolve_inputs(sources)
+    invalid = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in as_completed([pool.submit(validate, path) for path in pdf_paths]):
+            result = future.result()
+            invalid += 0 if result["valid"] else 1
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+    return len(pdf_paths), invalid
+
 def main():
     parser = argparse.ArgumentParser(description='Validate PDF file for check processing.')
-    parser.add_argument('pdf_path', help='Path to the PDF file to validate')
+    parser.add_argument('pdf_path', nargs='+',
+                        help='PDF file to validate; with --bulk also directories, glob patterns or manifest files')
+    parser.add_argument('--bulk', action='store_true',
+                        help='Validate many files concurrently and print one JSON line per file')
+    parser.add_argument('--workers', type=int, help='Worker threads in bulk mode')
     parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose logging')
     
     args = parser.parse_args()
@@ -61,9 +141,16 @@ def main():
     # Set log level based on verbose flag
     if args.verbose:
         logger.setLevel('DEBUG')
+
+    if args.bulk or len(args.pdf_path) > 1:
+        if not args.verbose:
+            logger.setLevel('WARNING')
+        total, invalid = validate_bulk(args.pdf_path, args.workers)
+        logger.info(f"Validated {total} files, {invalid} invalid")
+        sys.exit(1 if invalid else 0)
     
     validator = PDFValidator()
-    is_valid, image_count, message = validator.validate_pdf_images(args.pdf_path)
+    is_valid, image_count, message = validator.validate_pdf_images(args.pdf_path[0])
     
     if is_valid:
         print(f"✅ VALIDATION PASSED: {message}")
@@ -0,0 +1,198 @@
+import os
+import sys
+import time
+import socket
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from utils.logger import configure_logging
+from base_service import BaseMongoService
+
+# Load environment variables
+load_dotenv()
+
+# Setup logging
+configure_logging('logs/worker.log')
+
+class TaskQueue:
+    """One (documentCategory, type) queue served by a handler service"""
+
+    def __init__(self, document_category, task_type, handler, weight=1.0, concurrency=1):
+        self.document_category = document_category
+        self.task_type = task_type
+        self.handler = handler
+        self.weight = max(float(weight), 0.01)
+        self.concurrency = max(1, int(concurrency))
+        self.running = 0
+        self.served = 0
+        # Virtual finish time of the last task dispatched from this queue
+        self.finish_tag = 0.0
+        # Set when a claim found nothing; cleared on the next poll or completion
+        self.empty = False
+
+    @property
+    def name(self):
+        return f"{self.document_category}/{self.task_type}"
+
+    def has_capacity(self):
+        return not self.empty and self.running < self.concurrency
+
+class MultiQueueWorker(BaseMongoService):
+    """
+    One worker process serving several task queues from a shared MongoDB client.
+
+    Handlers are services such as CheckValidator or CheckProcessorService and are
+    registered per (documentCategory, type). The worker runs up to max_tasks tasks
+    at once; each free slot goes to the queue with the lowest virtual start time, so
+    under load queues share the slots in proportion to their weights, while an idle
+    queue's share goes to whichever stage is backed up. Each queue can also be capped
+    with its own concurrency limit. Tasks are claimed atomically, so any number of
+    workers can serve the same queues.
+    """
+
+    def __init__(self, mongo_uri=None, db_name=None, max_tasks=None):
+        super().__init__(mongo_uri, db_name, "Worker")
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.max_tasks = max_tasks or int(os.getenv('WORKER_MAX_TASKS', '4'))
+        self.queues = []
+        self._virtual_time = 0.0
+
+    def register(self, document_category, task_type, handler, weight=None, concurrency=None):
+        """
+        Serve a queue with handler.run_task(); weight and concurrency default to
+        WORKER_{TYPE}_WEIGHT (1) and WORKER_{TYPE}_CONCURRENCY (all slots).
+        """
+        prefix = f"WORKER_{task_type.upper()}"
+        if weight is None:
+            weight = float(os.getenv(f'{prefix}_WEIGHT', '1'))
+        if concurrency is None:
+            concurrency = int(os.getenv(f'{prefix}_CONCURRENCY', str(self.max_tasks)))
+        queue = TaskQueue(document_category, task_type, handler, weight, concurrency)
+        self.queues.append(queue)
+        self.logger.info(f"Serving {queue.name} (weight {queue.weight:g}, concurrency {queue.concurrency})")
+        return queue
+
+    def ensure_indexes(self):
+        """Index used by claim_next_task()"""
+        self.task_collection.create_index([("documentCategory", 1), ("type", 1), ("status", 1), ("createdAt", 1)])
+
+    def _next_queue(self, running):
+        """Queue with spare capacity and the lowest virtual start time, or None when no slot is free"""
+        if len(running) >= self.max_tasks:
+            return None
+        candidates = [q for q in self.queues if q.has_capacity()]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda q: max(q.finish_tag, self._virtual_time))
+
+    def _dispatch(self, executor, running):
+        """Claim and start tasks until every queue is empty or at its concurrency limit"""
+        while True:
+            queue = self._next_queue(running)
+            if queue is None:
+                return
+            task = queue.handler.claim_next_task(queue.task_type, queue.document_category, self.worker_id)
+            if task is None:
+                queue.empty = True
+                continue
+
+            start_tag = max(queue.finish_tag, self._virtual_time)
+            queue.finish_tag = start_tag + 1.0 / queue.weight
+            self._virtual_time = start_tag
+            queue.running += 1
+            queue.served += 1
+            self.logger.debug("Dispatching %s task %s", queue.name, task["_id"])
+            running[executor.submit(queue.handler.run_task, task)] = queue
+
+    def _reset_empty(self):
+        for queue in self.queues:
+            queue.empty = False
+
+    def run(self, poll_interval=None):
+        """Serve all registered queues until interrupted"""
+        poll_interval = poll_interval or int(os.getenv('POLL_INTERVAL', '30'))
+        self.ensure_indexes()
+        self.logger.info(f"Starting worker {self.worker_id} on {len(self.queues)} queues with {self.max_tasks} "
+                         f"task slots (polling every {poll_interval} seconds when idle)")
+
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_tasks, thread_name_prefix="task")
+        next_poll = 0.0
+        try:
+            while True:
+                try:
+                    if time.monotonic() >= next_poll:
+                        self._reset_empty()
+                        next_poll = time.monotonic() + poll_interval
+                    self._dispatch(executor, running)
+
+                    # Sleep until a task finishes or the next poll is due
+                    timeout = max(0.0, next_poll - time.monotonic())
+                    if not running:
+                        time.sleep(timeout)
+                        continue
+                    done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        queue = running.pop(future)
+                        queue.running -= 1
+                        if future.exception() is not None:
+                            self.logger.error(f"Error processing {queue.name} task: {str(future.exception())}")
+                    if done:
+                        # A finished task may have queued work for another stage (e.g. VALIDATE -> REPORT)
+                        self._reset_empty()
+
+                except KeyboardInterrupt:
+                    self.logger.info("Received interrupt signal, shutting down...")
+                    break
+                except Exception as e:
+                    self.logger.error(f"Error in worker loop: {str(e)}")
+                    time.sleep(poll_interval)  # Continue despite errors
+
+        finally:
+            # Let claimed tasks finish their status updates before closing
+            executor.shutdown(wait=True)
+            self.logger.info("Served " + ", ".join(f"{q.served} {q.name}" for q in self.queues))
+            self.client.close()
+            self.logger.info("MongoDB connection closed")
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Worker serving VALIDATE and REPORT tasks from one process')
+    parser.add_argument('--types', nargs='+', default=['VALIDATE', 'REPORT'], choices=['VALIDATE', 'REPORT'],
+                       help='Task types to serve (default: VALIDATE REPORT)')
+    parser.add_argument('--mongo-uri',
+                       help='MongoDB connection URI (overrides MONGO_URI env var)')
+    parser.add_argument('--db-name',
+                       help='MongoDB database name (overrides MONGO_DB_NAME env var)')
+    parser.add_argument('--poll-interval', type=int,
+                       help='Polling interval in seconds (overrides POLL_INTERVAL env var)')
+    parser.add_argument('--max-tasks', type=int,
+                       help='Tasks processed at once across all queues (overrides WORKER_MAX_TASKS env var)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                       help='Enable verbose logging')
+
+    args = parser.parse_args()
+
+    # Set log level
+    log_level = os.getenv('LOG_LEVEL', 'INFO')
+    if args.verbose:
+        log_level = 'DEBUG'
+    logging.getLogger().setLevel(getattr(logging, log_level.upper()))
+
+    try:
+        worker = MultiQueueWorker(args.mongo_uri, args.db_name, args.max_tasks)
+        # Handlers share the worker's client and connection pool
+        if 'VALIDATE' in args.types:
+            from check_validator import CheckValidator
+            worker.register("bank_checks", "VALIDATE", CheckValidator(args.mongo_uri, args.db_name, worker.client))
+        if 'REPORT' in args.types:
+            from check_processor import CheckProcessorService
+            worker.register("bank_checks", "REPORT", CheckProcessorService(args.mongo_uri, args.db_name, worker.client))
+        worker.run(args.poll_interval)
+    except Exception as e:
+        logging.error(f"Failed to start worker: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
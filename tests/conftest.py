@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+from unittest import mock
+import pytest
+
+# Service modules import each other as top-level modules from src/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+@pytest.fixture
+def check_processor(tmp_path, monkeypatch):
+    """CheckProcessor with stub OCR/LLM clients, a mocked MongoDB and its output under tmp_path"""
+    import process_checks
+    from utils.stub_backends import StubBackend, StubVisionClient, StubOpenAIClient
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setenv("IMAGE_STORE_DIR", str(tmp_path / "processed_checks"))
+    monkeypatch.setenv("CPU_POOL_ENABLED", "false")
+    monkeypatch.setattr(process_checks, "setup_google_vision_auth",
+                        lambda: StubVisionClient(StubBackend("ocr", latency=0)))
+    monkeypatch.setattr(process_checks, "OpenAI", lambda **kwargs: StubOpenAIClient(StubBackend("llm", latency=0)))
+    with mock.patch("pymongo.MongoClient"):
+        yield process_checks.CheckProcessor()
+
+@pytest.fixture
+def mongo_client(monkeypatch):
+    """In-memory MongoDB client; complete_task() writes without transactions"""
+    import mongomock
+    monkeypatch.setenv("TASK_TRANSACTIONS", "false")
+    return mongomock.MongoClient()
+
+@pytest.fixture
+def check_validator(tmp_path, monkeypatch, mongo_client):
+    """CheckValidator on an in-memory MongoDB, without a page cache"""
+    monkeypatch.setenv("PAGE_CACHE_ENABLED", "false")
+    monkeypatch.setenv("DOCUMENT_DEDUP_ENABLED", "false")
+    import check_validator
+    return check_validator.CheckValidator(db_name="vision_flow_test", client=mongo_client)
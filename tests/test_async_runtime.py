@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from async_base_service import AsyncBaseMongoService
+from utils.batch_extraction import BatchRequestWriter, read_jsonl
+
+class RecordingCollection:
+    """Async task collection recording update_one() calls"""
+
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+        return type("UpdateResult", (), {"modified_count": 1})()
+
+def test_async_runtime_rejects_profiling_flags(monkeypatch):
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "10")
+
+    with pytest.raises(ValueError, match="PROFILE_SAMPLE_RATE"):
+        AsyncBaseMongoService(service_name="CheckProcessor")
+
+def test_async_status_update_uses_the_service_result_field():
+    service = AsyncBaseMongoService(service_name="CheckProcessor")
+    service.task_collection = RecordingCollection()
+
+    asyncio.run(service.update_task_status("task-1", "COMPLETED", {"success": True}))
+
+    (query, update), = service.task_collection.updates
+    assert query == {"_id": "task-1"}
+    assert update["$set"]["processingResult"] == {"success": True}
+    assert "finishedAt" in update["$set"]
+
+def test_async_runtime_defers_extraction_to_the_batch_file(check_processor, tmp_path):
+    from async_process_checks import AsyncCheckProcessor
+    processor = AsyncCheckProcessor()
+    check_pair = {"front": None, "back": None, "front_text": "PAY TO THE ORDER OF JANE DOE $12.00",
+                  "front_raw_text": "PAY TO THE ORDER OF JANE DOE $12.00 SIGNATURE", "back_text": None}
+
+    async def pair_check_images(*args):
+        return check_pair
+
+    processor.pair_check_images = pair_check_images
+    processor._clean_and_save = lambda *args: (None, None)
+    batch_writer = BatchRequestWriter("task-1", directory=tmp_path / "batch")
+
+    # No OpenAI client is connected, so any LLM call would fail
+    created = asyncio.run(processor._process_check((0, None, None), "doc-1", 1, batch_writer=batch_writer))
+    processor.executor.shutdown()
+
+    assert created is False
+    assert batch_writer.count == 1
+    pending, = read_jsonl(batch_writer.pending_path)
+    assert pending["front_raw_text"] == check_pair["front_raw_text"]
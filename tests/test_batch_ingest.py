@@ -0,0 +1,29 @@
+import json
+from unittest import mock
+from utils.stub_backends import stub_check_text
+
+def test_ingested_checks_are_added_to_task_progress(tmp_path, monkeypatch, mongo_client):
+    import batch_ingest
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    monkeypatch.setenv("PAGE_CACHE_ENABLED", "false")
+    with mock.patch("base_service.MongoClient", return_value=mongo_client):
+        service = batch_ingest.BatchIngestService(db_name="vision_flow_test")
+
+    pending_path = tmp_path / "task-1.pending.jsonl"
+    pending_path.write_text("".join(json.dumps({
+        "custom_id": check_id, "taskId": "task-1", "documentId": "doc-1",
+        "front_path": None, "back_path": None, "front_text": stub_check_text(seed), "back_text": None
+    }) + "\n" for seed, check_id in enumerate(["check-1", "check-2"])))
+    # One blank sheet was counted while the task processed; two checks were deferred
+    task = service.new_task("doc-1", "bank_checks", "REPORT", "WAITING_FOR_BATCH", task_id="task-1", extra_fields={
+        "processingResult": {"pendingFile": str(pending_path)},
+        "progress": {"checksDone": 1, "checksTotal": 3, "checkIds": []}
+    })
+    service.task_collection.insert_one(task)
+    results = {check_id: (json.dumps({"amount": "$1.00"}), None, None) for check_id in ["check-1", "check-2"]}
+
+    assert service.ingest_task(task, results)
+    progress = service.task_collection.find_one({"_id": "task-1"})["progress"]
+    assert progress["checksDone"] == 3
+    assert progress["checkIds"] == ["check-1", "check-2"]
@@ -0,0 +1,85 @@
+from unittest import mock
+from base_service import handoff_task_id
+
+def seed_validate_task(validator, tmp_path, priority=None, pages=4):
+    """Insert a file document and a claimed VALIDATE task for a PDF that validates with `pages` images"""
+    pdf_path = tmp_path / "doc-1.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4\n")
+    validator.file_document_collection.insert_one({"_id": "doc-1", "path": str(pdf_path)})
+    task = validator.new_task("doc-1", "bank_checks", "VALIDATE", "IN_PROGRESS", task_id="validate-1",
+                              extra_fields={"priority": priority} if priority else None)
+    validator.task_collection.insert_one(task)
+    validator.validator.validate_pdf_images = lambda *args, **kwargs: (True, pages, "ok")
+    return task
+
+def test_report_task_inherits_priority(check_validator, tmp_path):
+    task = seed_validate_task(check_validator, tmp_path, priority="low")
+
+    assert check_validator.process_task(task)
+    report = check_validator.task_collection.find_one({"_id": handoff_task_id("validate-1", "REPORT")})
+    assert report["status"] == "NOT_STARTED"
+    assert report["priority"] == "low"
+
+def test_report_subtasks_inherit_priority_from_file_document(check_validator, tmp_path, monkeypatch):
+    monkeypatch.setenv("REPORT_SPLIT_PAGES", "2")
+    task = seed_validate_task(check_validator, tmp_path)
+    check_validator.file_document_collection.update_one({"_id": "doc-1"}, {"$set": {"priority": "low"}})
+
+    assert check_validator.process_task(task)
+    reports = list(check_validator.task_collection.find({"type": "REPORT"}))
+    assert len(reports) == 3
+    assert all(report["priority"] == "low" for report in reports)
+
+def test_complete_task_retry_does_not_queue_handoff_twice(check_validator):
+    check_validator.task_collection.insert_one(check_validator.new_task("doc-1", "bank_checks", "VALIDATE",
+                                                                        "IN_PROGRESS", task_id="validate-1"))
+    check_validator.file_document_collection.insert_one({"_id": "doc-1"})
+    report = check_validator.new_task("doc-1", "bank_checks", "REPORT", "NOT_STARTED",
+                                      task_id=handoff_task_id("validate-1", "REPORT"))
+
+    for _ in range(2):
+        assert check_validator.complete_task("validate-1", "COMPLETED", {"isValid": True}, [dict(report)],
+                                             "doc-1", {"numberOfChecks": 2})
+
+    assert check_validator.task_collection.count_documents({"type": "REPORT"}) == 1
+    assert check_validator.task_collection.find_one({"_id": "validate-1"})["status"] == "COMPLETED"
+    assert check_validator.file_document_collection.find_one({"_id": "doc-1"})["numberOfChecks"] == 2
+
+def test_failed_completion_after_handoff_leaves_task_in_progress(check_validator, tmp_path, monkeypatch):
+    task = seed_validate_task(check_validator, tmp_path)
+    # The REPORT task is inserted, then the file document update fails
+    monkeypatch.setattr(check_validator.file_document_collection, "update_one", mock.Mock(side_effect=OSError("down")))
+
+    assert not check_validator.process_task(task)
+    assert check_validator.task_collection.find_one({"_id": "validate-1"})["status"] == "IN_PROGRESS"
+    assert check_validator.task_collection.count_documents({"type": "REPORT", "status": "NOT_STARTED"}) == 1
+
+def test_failed_completion_without_handoff_marks_task_failed(check_validator, tmp_path, monkeypatch):
+    task = seed_validate_task(check_validator, tmp_path)
+    monkeypatch.setattr(check_validator.task_collection, "insert_many", mock.Mock(side_effect=OSError("down")))
+
+    assert not check_validator.process_task(task)
+    assert check_validator.task_collection.find_one({"_id": "validate-1"})["status"] == "FAILED"
+
+def test_reused_checks_are_copied_once(check_validator, tmp_path):
+    task = seed_validate_task(check_validator, tmp_path)
+    check_validator.db["check"].insert_many([{"_id": f"original-{n}", "documentId": "doc-0"} for n in range(2)])
+    original = {"documentId": "doc-0"}
+
+    for _ in range(2):
+        assert check_validator.reuse_processed_document(task, "doc-1.pdf", "hash", original)
+
+    assert check_validator.db["check"].count_documents({"documentId": "doc-1"}) == 2
+    assert check_validator.task_collection.find_one({"_id": "validate-1"})["status"] == "COMPLETED"
+    report = check_validator.task_collection.find_one({"_id": handoff_task_id("validate-1", "REPORT")})
+    assert report["processingResult"]["numberOfChecks"] == 2
+
+def test_started_at_is_set_when_processing_begins_not_at_claim(check_validator, tmp_path):
+    seed_validate_task(check_validator, tmp_path)
+    check_validator.task_collection.update_one({"_id": "validate-1"}, {"$set": {"status": "NOT_STARTED"}})
+    task = check_validator.claim_next_task("VALIDATE")
+    assert "startedAt" not in task
+
+    assert check_validator.run_task(task)
+    task = check_validator.task_collection.find_one({"_id": "validate-1"})
+    assert task["claimedAt"] <= task["startedAt"] <= task["finishedAt"]
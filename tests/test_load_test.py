@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+def test_report_counts_failed_documents_separately(mongo_client, tmp_path):
+    import load_test
+    with mock.patch("base_service.MongoClient", return_value=mongo_client):
+        run = load_test.LoadTest(db_name="vision_flow_load_test", work_dir=tmp_path)
+    now = datetime.now(timezone.utc)
+    for document_id, status in [("doc-1", "COMPLETED"), ("doc-2", "COMPLETED"), ("doc-3", "FAILED")]:
+        run.task_collection.insert_one(run.new_task(document_id, "bank_checks", "VALIDATE", "COMPLETED"))
+        run.task_collection.insert_one(run.new_task(document_id, "bank_checks", "REPORT", status))
+        run.expected_checks[document_id] = 1
+    run.task_collection.insert_one(run.new_task("doc-4", "bank_checks", "VALIDATE", "VALIDATION_FAILED"))
+    run.expected_checks["doc-4"] = 1
+
+    report = run.report(now, 60)
+
+    assert report["documentsFinished"] == 4
+    assert report["documentsSucceeded"] == 2
+    assert report["documentsFailed"] == 2
+    assert report["failureRate"] == 0.5
+    assert run.documents_failed() == 2
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+from utils.page_analysis import PageFilter, BLANK_PAGE_RESULT
+
+def render_check(amount, number, date):
+    """1700x780 RGB check front that differs from others only in the given fields"""
+    page = np.full((780, 1700, 3), 255, np.uint8)
+    cv2.rectangle(page, (20, 20), (1680, 760), (0, 0, 0), 3)
+    cv2.putText(page, "NORTHWIND TRADERS 12 MAIN ST", (60, 100), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    cv2.putText(page, f"DATE {date}", (1200, 180), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 2)
+    cv2.putText(page, "PAY TO THE ORDER OF ERIKA DIAZ SERVICE", (60, 320), cv2.FONT_HERSHEY_SIMPLEX, 1.3, (0, 0, 0), 3)
+    cv2.putText(page, amount, (1300, 320), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    cv2.putText(page, f"{number} 06222-003 102-813-3", (300, 700), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    return page
+
+def ocr(page_filter, page, text):
+    """Inspect a page and, when nothing can be reused, store text as its OCR result"""
+    fingerprint, reused = page_filter.inspect(page)
+    if reused is not None:
+        return reused
+    result = (True, text)
+    page_filter.remember(fingerprint, result)
+    return result
+
+def test_checks_differing_only_in_amount_are_not_duplicates():
+    page_filter = PageFilter()
+    first = ocr(page_filter, render_check("$550.00", "004921", "31/10/2024"), "first")
+    second = ocr(page_filter, render_check("$850.00", "004921", "31/10/2024"), "second")
+    third = ocr(page_filter, render_check("$1,550.00", "004924", "02/11/2024"), "third")
+
+    assert [first[1], second[1], third[1]] == ["first", "second", "third"]
+    assert page_filter.stats()["duplicatePagesReused"] == 0
+
+def test_identical_page_reuses_ocr_result():
+    page_filter = PageFilter()
+    page = render_check("$550.00", "004921", "31/10/2024")
+    first = ocr(page_filter, page, "first")
+
+    assert ocr(page_filter, page.copy(), "again") is first
+    assert page_filter.stats()["duplicatePagesReused"] == 1
+
+def test_blank_page_skips_ocr():
+    page_filter = PageFilter()
+    fingerprint, reused = page_filter.inspect(np.full((780, 1700, 3), 255, np.uint8))
+
+    assert fingerprint is None
+    assert reused is BLANK_PAGE_RESULT
+    assert page_filter.stats()["blankPagesSkipped"] == 1
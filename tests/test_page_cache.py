@@ -0,0 +1,43 @@
+import os
+import json
+import time
+from unittest import mock
+from utils.page_cache import PageCache, MANIFEST_NAME
+
+def add_entry(cache, document_id, size, age):
+    """Write a cache entry of `size` bytes last used `age` seconds ago"""
+    entry_dir = cache.root / document_id / "hash"
+    entry_dir.mkdir(parents=True)
+    (entry_dir / "page-1.png").write_bytes(b"\0" * size)
+    manifest_path = entry_dir / MANIFEST_NAME
+    manifest_path.write_text(json.dumps({"pages": ["page-1.png"], "bytes": size}))
+    used = time.time() - age
+    os.utime(manifest_path, (used, used))
+    return [entry_dir / "page-1.png"]
+
+def test_size_cap_evicts_least_recently_used_unpinned_entries(tmp_path):
+    cache = PageCache(tmp_path, max_bytes=250, pin_seconds=60)
+    add_entry(cache, "old", 100, age=3600)
+    add_entry(cache, "older", 100, age=7200)
+    add_entry(cache, "in-use", 100, age=5)
+
+    cache.enforce_size_cap()
+
+    assert sorted(path.name for path in cache.root.iterdir()) == ["in-use", "old"]
+
+def test_reader_pins_entry_against_eviction(tmp_path):
+    cache = PageCache(tmp_path, max_bytes=50, pin_seconds=60)
+    page_paths = add_entry(cache, "being-read", 100, age=3600)
+
+    cache.mark_in_use(page_paths)
+    cache.enforce_size_cap(keep="another-document")
+
+    assert page_paths[0].exists()
+
+def test_failed_report_evicts_cached_pages(check_validator):
+    page_cache = mock.Mock()
+    task = {"_id": "report-1", "documentId": "doc-1"}
+
+    check_validator.finish_report(task, False, page_cache=page_cache)
+
+    page_cache.evict.assert_called_once_with("doc-1")
@@ -0,0 +1,97 @@
+import json
+import asyncio
+from types import SimpleNamespace
+from process_checks import (
+    build_extraction_messages, estimate_request_tokens, find_invalid_fields, load_extraction_fields,
+    REPAIR_MAX_TOKENS
+)
+from utils.image_analyzer import image_to_bytes
+from utils.stub_backends import StubBackend, StubOpenAIClient, stub_check_text
+from utils.usage import UsageStats, track_usage
+
+def test_create_chat_completion_returns_extraction_and_records_usage(check_processor):
+    messages = build_extraction_messages(stub_check_text(1))
+    usage = UsageStats()
+    with track_usage(usage):
+        response = check_processor.create_chat_completion(messages)
+
+    fields = load_extraction_fields(response.choices[0].message.content)
+    assert find_invalid_fields(fields) == []
+    counters = usage.as_dict()
+    assert counters["llmRequests"] == 1
+    assert counters["promptTokens"] > 0
+
+def test_estimate_request_tokens_counts_prompt_and_output_budget():
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert estimate_request_tokens(messages, 300) == 400
+
+class BadAmountFirst:
+    """Stub LLM completions whose first answer has a badly formatted amount"""
+
+    def __init__(self):
+        self.stub = StubOpenAIClient(StubBackend("llm", latency=0)).chat.completions
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        response = self.stub.create(**kwargs)
+        if len(self.requests) == 1:
+            fields = json.loads(response.choices[0].message.content)
+            fields["amount"] = "lots"
+            response.choices[0].message.content = json.dumps(fields)
+        return response
+
+class AsyncCompletions:
+    def __init__(self, completions):
+        self.completions = completions
+
+    async def create(self, **kwargs):
+        return self.completions.create(**kwargs)
+
+def test_sync_and_async_extraction_repair_invalid_fields_alike(check_processor):
+    from async_process_checks import AsyncCheckProcessor
+    text = stub_check_text(7)
+    sync_llm = BadAmountFirst()
+    check_processor.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=sync_llm))
+    async_llm = BadAmountFirst()
+    async_processor = AsyncCheckProcessor()
+    async_processor.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=AsyncCompletions(async_llm)))
+
+    sync_details = check_processor.parse_check_details(text)
+    async_details = asyncio.run(async_processor.parse_check_details(text))
+    async_processor.executor.shutdown()
+
+    timestamps = {"createdAt", "updatedAt"}
+    assert sync_details.model_dump(exclude=timestamps) == async_details.model_dump(exclude=timestamps)
+    assert sync_details.amount.startswith("$")
+    assert len(sync_llm.requests) == len(async_llm.requests) == 2
+    assert sync_llm.requests[1]["max_tokens"] == REPAIR_MAX_TOKENS
+
+def test_roi_ocr_reads_each_page_once_and_keeps_only_the_front_regions(check_processor):
+    from PIL import Image, ImageDraw
+    front, back = Image.new("RGB", (1700, 780), "white"), Image.new("RGB", (1700, 780), "white")
+    draw = ImageDraw.Draw(front)
+    for y in range(100, 700, 40):
+        draw.rectangle((100, y, 1600, y + 25), fill="black")
+    for x, y in ((200, 150), (1200, 400), (700, 600)):
+        ImageDraw.Draw(back).rectangle((x, y, x + 200, y + 6), fill="black")
+    vision = check_processor.vision_client
+    requests = []
+    detect = vision.document_text_detection
+    vision.document_text_detection = lambda image, timeout=None: requests.append(image) or detect(image, timeout)
+
+    check_processor.roi_ocr = True
+    check_pair = check_processor.pair_check_images(back, front, 1)
+
+    assert check_pair["front"] is front
+    assert len(requests) == 2
+    # Margins are cropped before upload
+    assert len(requests[0].content) < len(image_to_bytes(back))
+    assert "SIGNATURE" in check_pair["front_raw_text"]
+    assert "SIGNATURE" not in check_pair["front_text"]
+    assert "PAY TO THE ORDER OF" in check_pair["front_text"]
+
+    details = check_processor.parse_check_details(check_pair["front_text"], check_pair["back_text"],
+                                                  check_pair["front_raw_text"])
+    assert details.payee_name != "Not Found"
+    assert details.raw_text.startswith(check_pair["front_raw_text"])
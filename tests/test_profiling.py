@@ -0,0 +1,38 @@
+import threading
+import tracemalloc
+from utils.pipeline import Pipeline, Stage
+from utils.profiling import TaskProfiler, run_profiled
+
+def test_profiles_task_threads_but_not_other_tasks(tmp_path):
+    other_task_done = threading.Event()
+
+    def other_task():
+        # Another task's worker thread, started while the profiler is active
+        run_profiled(sum, range(1000))
+        other_task_done.set()
+
+    with TaskProfiler("task-1", tmp_path) as profiler:
+        threading.Thread(target=other_task).start()
+        other_task_done.wait(5)
+        Pipeline([Stage("square", lambda n: n * n, workers=2)]).run(range(10))
+
+    assert profiler.summary["threadsProfiled"] == 3
+    assert (tmp_path / "task-1.prof").exists()
+
+def test_overlapping_profilers_keep_tracemalloc_running(tmp_path):
+    assert not tracemalloc.is_tracing()
+    inner_done = threading.Event()
+
+    def inner_task():
+        with TaskProfiler("task-2", tmp_path):
+            pass
+        inner_done.set()
+
+    with TaskProfiler("task-1", tmp_path) as outer:
+        threading.Thread(target=inner_task).start()
+        inner_done.wait(5)
+        assert tracemalloc.is_tracing()
+        data = bytearray(2 * 1024 * 1024)
+
+    assert len(data) and outer.summary["peakMemoryMB"] >= 2
+    assert not tracemalloc.is_tracing()
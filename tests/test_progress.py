@@ -0,0 +1,41 @@
+import asyncio
+from types import SimpleNamespace
+from utils.progress import ProgressPublisher, AsyncProgressPublisher
+
+class FailingCollection:
+    """Task collection whose writes fail, like MongoDB during a failover"""
+
+    def __init__(self):
+        self.attempts = 0
+
+    def update_one(self, query, update):
+        self.attempts += 1
+        raise ConnectionError("not primary")
+
+class AsyncFailingCollection(FailingCollection):
+    async def update_one(self, query, update):
+        super().update_one(query, update)
+
+def test_failed_progress_writes_do_not_fail_the_task():
+    collection = FailingCollection()
+    progress = ProgressPublisher(collection, {"_id": "task-1", "parentTaskId": "parent-1"}, 2, min_interval=0)
+
+    progress.start()
+    progress.check_done(SimpleNamespace(id="check-1"))
+    progress.check_done(None)
+    progress.flush()
+
+    assert collection.attempts == 3
+    assert progress.done == 2
+
+def test_failed_async_progress_writes_do_not_fail_the_task():
+    collection = AsyncFailingCollection()
+    progress = AsyncProgressPublisher(collection, {"_id": "task-1"}, 1, min_interval=0)
+
+    async def publish():
+        await progress.start()
+        await progress.check_done(SimpleNamespace(id="check-1"))
+        await progress.flush()
+
+    asyncio.run(publish())
+    assert collection.attempts == 2
@@ -0,0 +1,115 @@
+import time
+import asyncio
+from types import SimpleNamespace
+import pytest
+from utils.hedging import HedgedCaller
+from utils.rate_limiter import MongoBudget, RateLimiter, is_transient_error, is_throttling_error
+
+class APIError(Exception):
+    """API error carrying an HTTP status and a short Retry-After, like the client libraries raise"""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after-ms": "1"})
+
+class APIConnectionError(Exception):
+    response = SimpleNamespace(headers={"retry-after-ms": "1"})
+
+def flaky(*errors):
+    """Callable raising the given errors in turn, then returning 'ok'"""
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+    return func, calls
+
+def test_transient_errors_are_retried():
+    func, calls = flaky(APIError(500), APIConnectionError("reset"), APIError(503))
+
+    assert RateLimiter("test").call(func) == "ok"
+    assert len(calls) == 4
+
+def test_transient_error_does_not_pause_other_callers():
+    limiter = RateLimiter("test")
+    func, _ = flaky(APIError(502))
+
+    limiter.call(func)
+    assert limiter._paused_until == 0.0
+
+def test_throttling_is_retried_and_pauses_the_limiter():
+    limiter = RateLimiter("test")
+    func, calls = flaky(APIError(429))
+
+    assert limiter.call(func) == "ok"
+    assert len(calls) == 2
+    assert limiter._paused_until > 0.0
+
+def test_client_errors_and_exhausted_retries_are_raised():
+    bad_request, calls = flaky(APIError(400))
+    with pytest.raises(APIError):
+        RateLimiter("test").call(bad_request)
+    assert len(calls) == 1
+
+    down, calls = flaky(*[APIError(500)] * 3)
+    with pytest.raises(APIError):
+        RateLimiter("test", max_retries=1).call(down)
+    assert len(calls) == 2
+
+def test_async_transient_errors_are_retried():
+    func, calls = flaky(APIError(500), APIConnectionError("reset"))
+
+    async def call():
+        return func()
+
+    assert asyncio.run(RateLimiter("test").call_async(call)) == "ok"
+    assert len(calls) == 3
+
+def test_error_classification():
+    assert is_transient_error(APIError(503)) and not is_throttling_error(APIError(503))
+    assert is_throttling_error(APIError(429)) and not is_transient_error(APIError(429))
+    assert not is_transient_error(ValueError("bad JSON"))
+
+def test_shared_budget_counts_overflow_in_the_window_it_is_sent_in(mongo_client):
+    budget = MongoBudget(mongo_client.db.rate_limit_budget, "test:requests", 2)
+
+    delays = [budget.reserve(1) for _ in range(5)]
+
+    assert delays[:2] == [0.0, 0.0]
+    assert all(delay > 0 for delay in delays[2:])
+    windows = sorted(mongo_client.db.rate_limit_budget.find(), key=lambda doc: doc["_id"])
+    assert [doc["used"] for doc in windows] == [2, 2, 1]
+
+def slow_hedger():
+    """HedgedCaller that hedges any call slower than 10ms"""
+    hedger = HedgedCaller("test", timeout=5.0, hedge_enabled=True, max_hedge_rate=1.0)
+    for _ in range(hedger.latency.min_samples):
+        hedger.latency.record(0.01)
+    return hedger
+
+def test_hedges_need_their_own_admission():
+    limiter = RateLimiter("test", initial_concurrency=1, max_concurrency=1)
+    hedger = slow_hedger()
+
+    assert limiter.call_hedged(hedger, time.sleep, 0.1) is None
+    assert hedger.hedges == 0
+    assert limiter.concurrency.in_flight == 0
+
+def test_admitted_hedges_hold_a_slot_and_budget():
+    limiter = RateLimiter("test", requests_per_minute=60)
+    hedger = slow_hedger()
+    in_flight = []
+
+    def call():
+        in_flight.append(limiter.concurrency.in_flight)
+        time.sleep(0.1)
+
+    limiter.call_hedged(hedger, call)
+    assert hedger.hedges == 1
+    assert in_flight == [1, 2]
+    assert limiter.request_bucket.tokens < 59
+    time.sleep(0.15)
+    assert limiter.concurrency.in_flight == 0
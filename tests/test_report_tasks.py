@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+from utils.report_tasks import parent_completion, finish_report_steps
+from utils.steps import run_steps
+
+def test_parent_completes_once_every_subtask_finished():
+    now = datetime.now(timezone.utc)
+    parent = {"subtaskCount": 3, "completedSubtasks": 2, "failedSubtasks": 0, "numberOfChecks": 8}
+    assert parent_completion(parent, now) is None
+
+    status, update = parent_completion({**parent, "failedSubtasks": 1}, now)
+    assert status == "FAILED"
+    assert update["$set"]["processingResult"]["numberOfChecks"] == 8
+    assert update["$set"]["finishedAt"] == now
+
+class Service:
+    """Records the calls made by finish_report_steps"""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.calls = []
+
+    def record_subtask_result(self, parent_task_id, success, number_of_checks):
+        self.calls.append(("record_subtask_result", success, number_of_checks))
+        return self.parent
+
+    def update_file_document(self, document_id, number_of_checks):
+        self.calls.append(("update_file_document", number_of_checks))
+
+    def register_document_hash(self, document_id, number_of_checks):
+        self.calls.append(("register_document_hash", number_of_checks))
+
+def test_last_subtask_finishes_the_document():
+    service = Service({"status": "COMPLETED", "numberOfChecks": 12})
+    task = {"documentId": "doc-1", "parentTaskId": "parent-1"}
+
+    assert run_steps(service, finish_report_steps(task, True, 4))
+    assert service.calls == [("record_subtask_result", True, 4), ("update_file_document", 12),
+                             ("register_document_hash", 12)]
+
+def test_document_is_not_finished_while_subtasks_run():
+    service = Service(None)
+
+    assert not run_steps(service, finish_report_steps({"documentId": "doc-1", "parentTaskId": "parent-1"}, True, 4))
+    assert len(service.calls) == 1
+
+def test_failed_report_is_finished_but_not_registered():
+    service = Service(None)
+
+    assert run_steps(service, finish_report_steps({"documentId": "doc-1"}, False))
+    assert service.calls == []
@@ -0,0 +1,59 @@
+import gzip
+from datetime import datetime, timezone, timedelta
+from bson import json_util
+from task_archiver import TaskArchiver
+
+def archiver_with_tasks(mongo_client, tmp_path, target, count=3):
+    archiver = TaskArchiver(db_name="vision_flow_test", target=target, archive_dir=tmp_path / "archive",
+                            client=mongo_client)
+    finished = datetime.now(timezone.utc) - timedelta(days=30)
+    for index in range(count):
+        task = archiver.new_task(f"doc-{index}", "bank_checks", "REPORT", "COMPLETED", task_id=f"task-{index}")
+        task["finishedAt"] = finished
+        archiver.task_collection.insert_one(task)
+    return archiver
+
+def archived_file_ids(archive_dir):
+    ids = []
+    for path in sorted(archive_dir.glob("*.jsonl.gz")):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            ids += [json_util.loads(line)["_id"] for line in f]
+    return ids
+
+def requeue_after_copy(archiver, method, task_id):
+    """Re-queue a task right after its batch was copied, before the delete"""
+    copy = getattr(archiver, method)
+
+    def copy_then_requeue(*args):
+        copy(*args)
+        archiver.task_collection.update_one({"_id": task_id}, {"$set": {"status": "NOT_STARTED"}})
+    setattr(archiver, method, copy_then_requeue)
+
+def test_interrupted_file_run_is_finished_without_duplicates(mongo_client, tmp_path):
+    archiver = archiver_with_tasks(mongo_client, tmp_path, "file")
+    # A run that copied its batch and stopped before the delete
+    tasks = list(archiver.task_collection.find())
+    archiver._write_file(tasks, tmp_path / "archive" / "tasks-20240101-000000-00001.jsonl.gz.partial")
+
+    assert archiver.archive(older_than_days=7) == 3
+    assert sorted(archived_file_ids(tmp_path / "archive")) == ["task-0", "task-1", "task-2"]
+    assert not list((tmp_path / "archive").glob("*.partial"))
+
+def test_requeued_task_is_not_left_in_the_file_archive(mongo_client, tmp_path):
+    archiver = archiver_with_tasks(mongo_client, tmp_path, "file")
+    requeue_after_copy(archiver, "_write_file", "task-1")
+
+    assert archiver.archive(older_than_days=7) == 2
+    assert archived_file_ids(tmp_path / "archive") == ["task-0", "task-2"]
+    assert archiver.task_collection.find_one({"_id": "task-1"})["status"] == "NOT_STARTED"
+
+def test_requeued_task_is_not_left_in_the_archive_collection(mongo_client, tmp_path):
+    archiver = archiver_with_tasks(mongo_client, tmp_path, "collection")
+    # mongomock cannot run the bulk ReplaceOne of this pymongo version
+    archiver._copy_to_collection = lambda tasks: [
+        archiver.archive_collection.replace_one({"_id": task["_id"]}, task, upsert=True) for task in tasks
+    ]
+    requeue_after_copy(archiver, "_copy_to_collection", "task-1")
+
+    assert archiver.archive(older_than_days=7) == 2
+    assert sorted(task["_id"] for task in archiver.archive_collection.find()) == ["task-0", "task-2"]